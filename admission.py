@@ -0,0 +1,194 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Admission control for the routes that call the LLM (/preview and
+# /slides/regenerate). Without it one heavy user can occupy every worker
+# thread and everyone else times out; with it, excess requests fail fast.
+#
+# - Token buckets per API key and per client address limit each caller's rate
+#   (429 with Retry-After).
+# - A global cap on in-flight LLM requests, with a bounded wait queue in front
+#   of it; when the queue is full, or a queued request waits too long, the
+#   request is shed (503 with Retry-After).
+# - A request that fans out into parallel LLM calls (two-stage generation)
+#   takes extra slots for them, as many as are free; it never waits for more.
+#
+# State is per process. Configuration (environment):
+#   RATE_KEY_PER_MIN / RATE_KEY_BURST        per API key (default 10/min, burst 5)
+#   RATE_CLIENT_PER_MIN / RATE_CLIENT_BURST  per client address (default 20/min, burst 10)
+#   MAX_IN_FLIGHT                            concurrent LLM requests (default 8)
+#   MAX_QUEUE / QUEUE_TIMEOUT                waiting requests and seconds they may wait (16, 10)
+# Image uploads make no LLM call; they only have their own per-client rate:
+#   RATE_UPLOAD_PER_MIN / RATE_UPLOAD_BURST  per client address (default 30/min, burst 10)
+# A rate or size of 0 disables that limit.
+
+MAX_TRACKED_BUCKETS = 10000
+
+class Rejected(Exception):
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.message = message
+
+class TokenBucket:
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, cost=1.0):
+        """Returns 0 if admitted, otherwise the seconds until cost tokens are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / self.rate
+
+class BucketSet:
+    """Token buckets by key, dropping the least recently used beyond MAX_TRACKED_BUCKETS."""
+
+    def __init__(self, per_minute, burst):
+        self.per_minute = per_minute
+        self.burst = burst
+        self._buckets = OrderedDict()
+
+    def take(self, key, cost=1.0):
+        if not self.per_minute:
+            return 0
+        bucket = self._buckets.pop(key, None) or TokenBucket(self.per_minute, self.burst)
+        self._buckets[key] = bucket
+        while len(self._buckets) > MAX_TRACKED_BUCKETS:
+            self._buckets.popitem(last=False)
+        return bucket.take(cost)
+
+class Admission:
+    def __init__(self, key_per_min=10, key_burst=5, client_per_min=20, client_burst=10,
+                 max_in_flight=8, max_queue=16, queue_timeout=10.0):
+        self.key_buckets = BucketSet(key_per_min, key_burst)
+        self.client_buckets = BucketSet(client_per_min, client_burst)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.counters = {"admitted": 0, "rejected_key_rate": 0, "rejected_client_rate": 0,
+                         "shed_queue_full": 0, "shed_queue_timeout": 0}
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+
+    def check_client_rate(self, client):
+        """Raises Rejected (429) when the client's bucket is empty."""
+        with self._lock:
+            wait = self.client_buckets.take(client)
+            if wait:
+                self.counters["rejected_client_rate"] += 1
+                raise Rejected(429, wait, "Too many requests from this client.")
+
+    def check_key_rate(self, api_key):
+        """Raises Rejected (429) when the key's bucket is empty."""
+        with self._lock:
+            wait = self.key_buckets.take(api_key)
+            if wait:
+                self.counters["rejected_key_rate"] += 1
+                raise Rejected(429, wait, "Too many requests for this API key.")
+
+    @contextmanager
+    def slot(self):
+        """Holds one of MAX_IN_FLIGHT slots for the duration; raises Rejected (503) when shedding."""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                if self.queued >= self.max_queue:
+                    self.counters["shed_queue_full"] += 1
+                    raise Rejected(503, self.queue_timeout, "The server is busy. Please try again shortly.")
+                self.queued += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters["shed_queue_timeout"] += 1
+                            raise Rejected(503, self.queue_timeout, "The server is busy. Please try again shortly.")
+                        self._slot_free.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._slot_free.notify()
+
+    @contextmanager
+    def extra_slots(self, wanted):
+        """
+        Takes up to wanted more slots for the duration, without waiting, and
+        yields how many it got. None are taken while requests are queued.
+        """
+        with self._lock:
+            if not self.max_in_flight:
+                extra = max(0, wanted)
+            elif self.queued:
+                extra = 0
+            else:
+                extra = max(0, min(wanted, self.max_in_flight - self.in_flight))
+            self.in_flight += extra
+        try:
+            yield extra
+        finally:
+            if extra:
+                with self._lock:
+                    self.in_flight -= extra
+                    self._slot_free.notify(extra)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, in_flight=self.in_flight, queue_depth=self.queued,
+                        max_in_flight=self.max_in_flight, max_queue=self.max_queue)
+
+class ClientRateLimit:
+    """Per-client token buckets alone, for routes that don't call the LLM."""
+
+    def __init__(self, per_minute, burst, message):
+        self.buckets = BucketSet(per_minute, burst)
+        self.message = message
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """Raises Rejected (429) when the client's bucket is empty."""
+        with self._lock:
+            wait = self.buckets.take(client)
+        if wait:
+            raise Rejected(429, wait, self.message)
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+def get_admission():
+    """Builds the Admission configured by the environment (see the top of this module)."""
+    return Admission(
+        key_per_min=float(os.environ.get("RATE_KEY_PER_MIN", 10)),
+        key_burst=float(os.environ.get("RATE_KEY_BURST", 5)),
+        client_per_min=float(os.environ.get("RATE_CLIENT_PER_MIN", 20)),
+        client_burst=float(os.environ.get("RATE_CLIENT_BURST", 10)),
+        max_in_flight=int(os.environ.get("MAX_IN_FLIGHT", 8)),
+        max_queue=int(os.environ.get("MAX_QUEUE", 16)),
+        queue_timeout=float(os.environ.get("QUEUE_TIMEOUT", 10))
+    )
+
+def get_upload_rate_limit():
+    """The per-client limit on image uploads (see the top of this module)."""
+    return ClientRateLimit(
+        float(os.environ.get("RATE_UPLOAD_PER_MIN", 30)),
+        float(os.environ.get("RATE_UPLOAD_BURST", 10)),
+        "Too many uploads from this client."
+    )
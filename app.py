@@ -1,31 +1,269 @@
-from flask import Flask, render_template, request, send_file, Response
+from flask import Blueprint, Flask, current_app, render_template, request, send_file, Response, jsonify, make_response, redirect, url_for
+import functools
+import hashlib
+import json
 import os
-import sys
+import secrets
+import threading
+import time
 
-# Add parent directory to path to import prompts if needed, 
-# but we are self-contained in ppt_web_app for now except for prompts.py
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'ppt_gen'))
-# Also add current dir
-sys.path.append(os.path.dirname(__file__))
+from ppt_generator_web import ROUTER, generate_incremental, generate_json_from_text, generate_slide, json_to_vba
+from admission import Rejected, get_admission, get_upload_rate_limit, retry_after_header
+from gas_backend import json_to_gas
+from deck_history import get_deck_history
+from deck_store import get_deck_store, new_deck_id
+from http_pool import pool_stats
+from image_pipeline import ImageError, get_image_store, mime_type, sidecar_zip
+from ingest import IngestError, extract_text, max_upload_bytes
+from output_cache import OutputCache, choose_encoding, etag_for, output_key
+from profiling import get_profiler
+from state_backend import StateError, get_state_backend
+from slide_schema import COMMON_FIELDS, SLIDE_SCHEMAS, normalize_slide, validate_slide
+from source_text import best_excerpt, slide_text
+from svg_renderer import ThumbnailCache
+from text_preprocess import preprocess
 
-from ppt_generator_web import generate_json_from_text, json_to_vba
-try:
-    from prompts import SYSTEM_PROMPT
-except ImportError:
-    # If prompts.py is in ../ppt_gen/prompts.py, we need to make sure we can import it
-    # We added the path above, so it should work if the file exists.
-    pass
+bp = Blueprint('slides', __name__)
 
-app = Flask(__name__)
+def create_app(config=None):
+    """
+    Builds the app. config is applied to app.config; everything else is read
+    from the environment (DECK_STORE, LLM_BACKEND, SYSTEM_PROMPT_FILE, ...).
 
-@app.route('/', methods=['GET'])
+    Nothing here opens files or sockets: the deck store and admission state
+    are created on first use in each process (see _resource), so the app can
+    be built once in gunicorn's master with --preload and forked safely.
+    """
+    app = Flask(__name__)
+    # Larger uploads are refused before they are read (see ingest.py)
+    app.config['MAX_CONTENT_LENGTH'] = max_upload_bytes()
+    app.config.update(config or {})
+    app.register_blueprint(bp)
+    # Opt-in (PROFILE_TOKEN, PROFILE_SAMPLE_RATE); when off the app isn't wrapped at all
+    profiler = get_profiler()
+    if profiler is not None:
+        app.wsgi_app = profiler.wrap(app.wsgi_app)
+    return app
+
+_resources_lock = threading.Lock()
+
+def _resource(name, factory):
+    """A per-process object stored on the app, recreated after a fork."""
+    state = current_app.extensions.setdefault('slides', {})
+    if state.get('pid') != os.getpid():
+        with _resources_lock:
+            if state.get('pid') != os.getpid():
+                state.clear()
+                state['pid'] = os.getpid()
+    if name not in state:
+        with _resources_lock:
+            if name not in state:
+                state[name] = factory()
+    return state[name]
+
+def get_state():
+    """Key-value state shared across processes and nodes when STATE_BACKEND is a Redis-protocol server."""
+    return _resource('state', get_state_backend)
+
+def get_decks():
+    """The deck store selected by DECK_STORE."""
+    # Built outside _resource's factory: the resources lock isn't reentrant
+    state = get_state()
+    return _resource('deck_store', lambda: get_deck_store(state))
+
+def get_images():
+    """Uploaded images for imageText slides, in the state backend (see image_pipeline.py)."""
+    state = get_state()
+    return _resource('images', lambda: get_image_store(state))
+
+def get_outputs():
+    """
+    Rendered downloads; OUTPUT_CACHE_BYTES (default 64 MiB) per process, and
+    OUTPUT_CACHE_TTL seconds (default 3600) in a shared STATE_BACKEND.
+    """
+    state = get_state()
+    return _resource('outputs', lambda: OutputCache(int(os.environ.get('OUTPUT_CACHE_BYTES', 64 * 1024 * 1024)),
+                                                    shared=state if state.shared else None,
+                                                    shared_ttl=float(os.environ.get('OUTPUT_CACHE_TTL', 3600))))
+
+def get_history():
+    """The deck version history selected by DECK_HISTORY, or None when it is off."""
+    return _resource('history', get_deck_history)
+
+def get_admission_control():
+    return _resource('admission', get_admission)
+
+def get_upload_limit():
+    return _resource('upload_limit', get_upload_rate_limit)
+
+def get_thumbnails():
+    """Rendered slide thumbnails; THUMBNAIL_CACHE_SIZE entries (default 1024) per process."""
+    return _resource('thumbnails', lambda: ThumbnailCache(int(os.environ.get('THUMBNAIL_CACHE_SIZE', 1024))))
+
+def parse_slide_diffs(raw):
+    """The editor's slide_diffs field as {index: slide}, or None when it isn't one."""
+    try:
+        diffs = json.loads(raw or '{}')
+    except ValueError:
+        return None
+    if not isinstance(diffs, dict):
+        return None
+    if not all(key.isascii() and key.isdigit() for key in diffs):
+        return None
+    return diffs
+
+def apply_slide_diffs(slides, diffs):
+    """
+    Replaces edited slides in the canonical deck.
+    diffs: {index: slide} as submitted by the editor. Nothing is applied unless
+    every submitted slide passes its type's schema; the errors are returned.
+    """
+    errors = []
+    for key, slide in diffs.items():
+        i = int(key)
+        if not 0 <= i < len(slides):
+            errors.append(f"slide {key}: index out of range")
+            continue
+        errors.extend(f"slide {i + 1}: {e}" for e in validate_slide(slide))
+    if errors:
+        return errors
+    for key, slide in diffs.items():
+        slides[int(key)] = normalize_slide(slide)
+    return []
+
+def load_deck(deck_id):
+    """
+    The working copy of a deck. A deck that expired from the deck store is
+    restored from its latest saved version.
+    """
+    if not deck_id:
+        return None
+    deck = get_decks().get(deck_id)
+    if deck is None and get_history() is not None:
+        deck = get_history().load(deck_id)
+        if deck is not None:
+            print(f"DEBUG: deck {deck_id}: restored from history")
+            get_decks().put(deck_id, deck)
+    return deck
+
+def save_deck(deck_id, deck, owner=None, parent_id=None):
+    """Stores the working copy and records it as a new version in the history."""
+    get_decks().put(deck_id, deck)
+    if get_history() is None:
+        return
+    try:
+        get_history().save(deck_id, deck, owner=owner or "server", parent_id=parent_id)
+    except Exception as e:
+        # The deck is still usable from the deck store
+        print(f"DEBUG: deck {deck_id}: saving to history failed: {e}")
+
+# Slides per /decks/<id>/slides request; the editor loads them as they scroll into view
+EDITOR_PAGE_SIZE = 20
+EDITOR_PAGE_MAX = 100
+
+def editor_page(deck_id, deck):
+    """
+    edit.html for a deck. Only the slide count is embedded; the editor loads
+    slides and the source text from JSON endpoints, so the page is the same
+    size for 10 slides or 1000.
+    """
+    return render_template('edit.html', slide_count=len(deck['slides']), page_size=EDITOR_PAGE_SIZE,
+                           settings=deck['settings'], deck_id=deck_id, schemas=SLIDE_SCHEMAS,
+                           common_fields=COMMON_FIELDS)
+
+def add_usage_headers(resp, report):
+    """Per-request input usage, estimated with text_preprocess.estimate_tokens."""
+    resp.headers['X-Input-Tokens'] = str(report.get('input_tokens', 0))
+    resp.headers['X-Prompt-Tokens'] = str(report.get('prompt_tokens', 0))
+    resp.headers['X-Cached-Tokens'] = str(report.get('cached_tokens', 0))
+    resp.headers['Server-Timing'] = f"llm;dur={report.get('llm_seconds', 0) * 1000:.0f}"
+
+def client_id():
+    # Behind a proxy (e.g. the Heroku router) every request comes from the proxy
+    if os.environ.get("TRUST_PROXY") == "1":
+        return request.access_route[0]
+    return request.remote_addr or "-"
+
+def api_key_id(api_key):
+    # Requests using the server's own key share one bucket
+    if not api_key:
+        return "server"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+# With the server's key, a browser's decks are listed under a random token kept
+# in this cookie. Addresses don't work: behind a proxy every client has the same one.
+OWNER_COOKIE = 'deck_owner'
+OWNER_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+def owner_token():
+    """The browser's owner token, or '' when it has none (or not one we issued)."""
+    token = request.cookies.get(OWNER_COOKIE, '')
+    return token if len(token) >= 32 else ''
+
+def owner_id(api_key, token=None):
+    """Whose deck history a request sees: the user's own API key, or the browser's token with the server's key."""
+    if api_key:
+        return api_key_id(api_key)
+    token = owner_token() if token is None else token
+    if not token:
+        return None
+    return "browser-" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+def admitted(view):
+    """Rate limits and caps concurrency for routes that call the LLM (see admission.py)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            # The client is checked before the body is read: reading the form parses the whole upload
+            get_admission_control().check_client_rate(client_id())
+            payload = request.get_json(silent=True) if request.is_json else None
+            api_key = (payload or {}).get('api_key') or request.form.get('api_key', '')
+            get_admission_control().check_key_rate(api_key_id(api_key))
+            with get_admission_control().slot():
+                return view(*args, **kwargs)
+        except Rejected as e:
+            print(f"DEBUG: rejected {request.path} with {e.status}: {e.message}")
+            if request.is_json:
+                resp = jsonify(error=e.message)
+            else:
+                resp = make_response("Error: " + e.message)
+            resp.status_code = e.status
+            resp.headers['Retry-After'] = retry_after_header(e.retry_after)
+            return resp
+    return wrapper
+
+@bp.app_errorhandler(413)
+def too_large(e):
+    limit = current_app.config.get('MAX_CONTENT_LENGTH') or 0
+    return f"Error: The upload is larger than {round(limit / 1024 / 1024, 1):g} MB.", 413
+
+@bp.app_errorhandler(StateError)
+def state_unavailable(e):
+    # The shared STATE_BACKEND is down; nothing this node could do would be seen by the others
+    print(f"DEBUG: state backend error: {e}")
+    return "Error: The server is temporarily unavailable. Please try again shortly.", 503, {'Retry-After': '5'}
+
+@bp.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
 
-@app.route('/preview', methods=['POST'])
+@bp.route('/preview', methods=['POST'])
+@admitted
 def preview():
-    text_input = request.form.get('text_input')
+    text_input = request.form.get('text_input', '')
     api_key = request.form.get('api_key') or os.environ.get("GOOGLE_API_KEY")
+
+    # An uploaded document is extracted as it streams from the spooled upload; pasted text comes first
+    document = request.files.get('document')
+    ingest_report = {}
+    if document and document.filename:
+        try:
+            extracted, ingest_report = extract_text(document.stream, document.filename)
+        except IngestError as e:
+            print(f"DEBUG: rejected upload {document.filename!r}: {e.message}")
+            return "Error: " + e.message, e.status
+        print(f"DEBUG: extracted {ingest_report['document_chars']} characters from {document.filename!r}")
+        text_input = "\n\n".join(t for t in (text_input.strip(), extracted) if t)
     
     # Capture settings to pass through
     settings = {
@@ -40,262 +278,335 @@ def preview():
     if not api_key:
         return "Error: API Key is required.", 400
 
+    # Drop whitespace, repeated headers and duplicate paragraphs before they cost tokens
+    text_input, report = preprocess(text_input)
+    report.update(ingest_report)
+
+    # An edited source resubmitted from the editor: only changed sections go to the model
+    base_deck_id = request.form.get('base_deck_id')
+    base = load_deck(base_deck_id)
+    if base is not None:
+        # Unsaved edits in the editor are kept, like on /download
+        diffs = parse_slide_diffs(request.form.get('slide_diffs'))
+        if diffs is None:
+            return "Error: Invalid slide data.", 400
+        errors = apply_slide_diffs(base['slides'], diffs)
+        if errors:
+            return "Error: Invalid slide data.\n" + "\n".join(errors), 400
+
     # Generate JSON
-    slide_data = generate_json_from_text(text_input, api_key)
+    start = time.perf_counter()
+    source_map = []
+    slide_data = None
+    # Parallel slide calls (two-stage, incremental) run in free MAX_IN_FLIGHT slots, beside this request's own
+    slots = get_admission_control().extra_slots
+    if base is not None:
+        slide_data = generate_incremental(base.get('source', ''), base['slides'], base.get('source_map'),
+                                          text_input, api_key, report=report, source_map=source_map, slots=slots)
+    report["incremental"] = int(slide_data is not None)
+    if slide_data is None:
+        slide_data = generate_json_from_text(text_input, api_key, report=report, source_map=source_map, slots=slots)
+    report["llm_seconds"] = round(time.perf_counter() - start, 3)
+    print(f"DEBUG: preview usage {json.dumps(report)}")
     
     if not slide_data:
         return "Error: Failed to generate slide data from AI.", 500
 
-    # Pre-process slides for the editor (flatten lists to strings)
-    for slide in slide_data:
-        content_parts = []
-        if "points" in slide:
-            content_parts = slide["points"]
-        elif "items" in slide:
-            items = slide["items"]
-            if items and isinstance(items[0], str):
-                content_parts = items
-            elif items and isinstance(items[0], dict):
-                content_parts = [f"{item.get('title','')}: {item.get('desc','')}" if 'title' in item else f"{item.get('label','')}: {item.get('subLabel','')}" for item in items]
-        elif "milestones" in slide:
-            content_parts = [f"{m.get('date','')}: {m.get('label','')}" for m in slide["milestones"]]
-        elif "levels" in slide:
-            content_parts = [f"{l.get('title','')}: {l.get('description','')}" for l in slide["levels"]]
-        elif "leftItems" in slide or "rightItems" in slide:
-            content_parts.append("--- Left ---")
-            content_parts.extend(slide.get("leftItems", []))
-            content_parts.append("--- Right ---")
-            content_parts.extend(slide.get("rightItems", []))
-        elif "shapes" in slide:
-            content_parts = [f"{s.get('label','')}" for s in slide["shapes"]]
-        elif "flows" in slide:
-            for flow in slide["flows"]:
-                content_parts.extend(flow.get("steps", []))
-        elif "imageDesc" in slide or "text" in slide:
-            content_parts.append(f"Image: {slide.get('imageDesc','')}")
-            content_parts.append(f"Text: {slide.get('text','')}")
-        elif "headers" in slide:
-            content_parts.append(" | ".join(slide.get("headers", [])))
-            for row in slide.get("rows", []):
-                content_parts.append(" | ".join(row))
-        elif "quote" in slide:
-            content_parts.append(f"Quote: {slide.get('quote','')}")
-            content_parts.append(f"Author: {slide.get('author','')}")
-        elif "kpis" in slide:
-            content_parts = [f"{k.get('label','')}: {k.get('value','')} ({k.get('change','')})" for k in slide["kpis"]]
-        elif "cards" in slide: # bulletCards
-            for c in slide["cards"]:
-                content_parts.append(f"Title: {c.get('title','')}")
-                for p in c.get("points", []):
-                    content_parts.append(f"- {p}")
-                content_parts.append("---")
-        elif "stats" in slide: # statsCompare
-            content_parts = [f"{s.get('label','')}: {s.get('leftValue','')} / {s.get('rightValue','')}" for s in slide["stats"]]
-        elif "items" in slide: # Generic items fallback (faq, barCompare, progress, etc)
-            items = slide["items"]
-            if items and isinstance(items[0], dict):
-                if "q" in items[0]: # FAQ
-                    content_parts = [f"Q: {i.get('q','')}\nA: {i.get('a','')}" for i in items]
-                elif "valueA" in items[0]: # barCompare
-                    content_parts = [f"{i.get('label','')}: {i.get('valueA','')} / {i.get('valueB','')}" for i in items]
-                elif "percent" in items[0]: # progress
-                    content_parts = [f"{i.get('label','')}: {i.get('percent','')}%" for i in items]
-                else:
-                    # Fallback for other dict items
-                    content_parts = [f"{item.get('title','')}: {item.get('desc','')}" if 'title' in item else f"{item.get('label','')}: {item.get('subLabel','')}" for item in items]
-        
-        # Join with newlines for textarea
-        slide['content_text'] = "\n".join(content_parts)
-
-    return render_template('edit.html', slides=slide_data, settings=settings)
-
-@app.route('/download', methods=['POST'])
-def download():
-    # Reconstruct slide_data from form
-    print("DEBUG: Form Data:", request.form)
-    slide_count = int(request.form.get('slide_count', 0))
-    print(f"DEBUG: slide_count = {slide_count}")
-    slide_data = []
-    
-    for i in range(slide_count):
-        slide = {}
-        slide_type = request.form.get(f'slide_{i}_type')
-        slide['type'] = slide_type
-        slide['title'] = request.form.get(f'slide_{i}_title')
-        slide['subhead'] = request.form.get(f'slide_{i}_subhead')
-        
-        # Reconstruct content list
-        content_text = request.form.get(f'slide_{i}_content', '')
-        content_list = [line.strip() for line in content_text.split('\n') if line.strip()]
-        
-        # Assign back to the appropriate key based on type
-        if slide_type == 'process':
-            slide['steps'] = content_list
-        elif slide_type == 'timeline':
-            milestones = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    milestones.append({"date": parts[0].strip(), "label": parts[1].strip()})
-                else:
-                    milestones.append({"date": "", "label": line})
-            slide['milestones'] = milestones
-        elif slide_type == 'cycle':
-            items = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    items.append({"label": parts[1].strip(), "subLabel": parts[0].strip()})
-                else:
-                    items.append({"label": line, "subLabel": ""})
-            slide['items'] = items
-        elif slide_type == 'cards':
-            items = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    items.append({"title": parts[0].strip(), "desc": parts[1].strip()})
-                else:
-                    items.append({"title": line, "desc": ""})
-            slide['items'] = items
-        elif slide_type == 'pyramid':
-            levels = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    levels.append({"title": parts[0].strip(), "description": parts[1].strip()})
-                else:
-                    levels.append({"title": line, "description": ""})
-            slide['levels'] = levels
-        elif slide_type == 'compare':
-            left_items = []
-            right_items = []
-            current_list = left_items
-            for line in content_list:
-                if "--- Left ---" in line:
-                    current_list = left_items
-                    continue
-                elif "--- Right ---" in line:
-                    current_list = right_items
-                    continue
-                current_list.append(line)
-            slide['leftItems'] = left_items
-            slide['rightItems'] = right_items
-        elif slide_type == 'diagram':
-            slide['shapes'] = [{"label": line} for line in content_list]
-        elif slide_type == 'flowChart':
-            slide['flows'] = [{"steps": content_list}]
-        elif slide_type == 'stepUp':
-            slide['steps'] = [{"label": line} for line in content_list]
-        elif slide_type == 'imageText':
-            slide['imageDesc'] = ""
-            slide['text'] = ""
-            for line in content_list:
-                if line.startswith("Image:"): slide['imageDesc'] = line.replace("Image:", "").strip()
-                elif line.startswith("Text:"): slide['text'] = line.replace("Text:", "").strip()
-                else: slide['text'] += "\n" + line
-        elif slide_type == 'table':
-            if content_list:
-                slide['headers'] = [c.strip() for c in content_list[0].split('|')]
-                slide['rows'] = [[c.strip() for c in row.split('|')] for row in content_list[1:]]
-        elif slide_type == 'quote':
-            for line in content_list:
-                if line.startswith("Quote:"): slide['quote'] = line.replace("Quote:", "").strip()
-                elif line.startswith("Author:"): slide['author'] = line.replace("Author:", "").strip()
-        elif slide_type == 'kpi':
-            kpis = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    val_change = parts[1].strip().split('(')
-                    val = val_change[0].strip()
-                    change = val_change[1].replace(')', '').strip() if len(val_change) > 1 else ""
-                    kpis.append({"label": parts[0].strip(), "value": val, "change": change})
-                else:
-                    kpis.append({"label": line, "value": "", "change": ""})
-            slide['kpis'] = kpis
-        elif slide_type == 'bulletCards':
-            cards = []
-            current_card = None
-            for line in content_list:
-                if line.startswith("Title:"):
-                    if current_card: cards.append(current_card)
-                    current_card = {"title": line.replace("Title:", "").strip(), "points": []}
-                elif line.startswith("-"):
-                    if current_card: current_card["points"].append(line.replace("-", "").strip())
-                elif line == "---":
-                    if current_card: 
-                        cards.append(current_card)
-                        current_card = None
-            if current_card: cards.append(current_card)
-            slide['cards'] = cards
-        elif slide_type == 'faq':
-            items = []
-            current_q = None
-            for line in content_list:
-                if line.startswith("Q:"):
-                    if current_q: items.append(current_q)
-                    current_q = {"q": line.replace("Q:", "").strip(), "a": ""}
-                elif line.startswith("A:"):
-                    if current_q: current_q["a"] = line.replace("A:", "").strip()
-            if current_q: items.append(current_q)
-            slide['items'] = items
-        elif slide_type == 'statsCompare':
-            stats = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    vals = parts[1].strip().split('/')
-                    l = vals[0].strip()
-                    r = vals[1].strip() if len(vals) > 1 else ""
-                    stats.append({"label": parts[0].strip(), "leftValue": l, "rightValue": r})
-            slide['stats'] = stats
-        elif slide_type == 'barCompare':
-            items = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    vals = parts[1].strip().split('/')
-                    vA = float(vals[0].strip()) if vals[0].strip().replace('.','').isdigit() else 0
-                    vB = float(vals[1].strip()) if len(vals) > 1 and vals[1].strip().replace('.','').isdigit() else 0
-                    items.append({"label": parts[0].strip(), "valueA": vA, "valueB": vB})
-            slide['items'] = items
-        elif slide_type == 'progress':
-            items = []
-            for line in content_list:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    pct = float(parts[1].replace('%','').strip()) if parts[1].replace('%','').strip().replace('.','').isdigit() else 0
-                    items.append({"label": parts[0].strip(), "percent": pct})
-            slide['items'] = items
-        else:
-            slide['points'] = content_list
-            slide['items'] = content_list # Fallback
-        
-        # Pass through other fields
-        if request.form.get(f'slide_{i}_sectionNo'):
-             slide['sectionNo'] = request.form.get(f'slide_{i}_sectionNo')
-             
-        slide_data.append(slide)
+    deck_id = new_deck_id()
+    deck = {"slides": slide_data, "settings": settings, "source": text_input, "source_map": source_map}
+    token = owner_token() or secrets.token_urlsafe(32)
+    save_deck(deck_id, deck, owner=owner_id(request.form.get('api_key'), token),
+              parent_id=base_deck_id if base is not None else None)
 
-    settings = {
-        'primary_color': request.form.get('primary_color'),
-        'title_color': request.form.get('title_color'),
-        'body_color': request.form.get('body_color'),
-        'font_family': request.form.get('font_family')
+    resp = make_response(editor_page(deck_id, deck))
+    add_usage_headers(resp, report)
+    if token != owner_token():
+        resp.set_cookie(OWNER_COOKIE, token, max_age=OWNER_COOKIE_MAX_AGE, secure=request.is_secure,
+                        httponly=True, samesite='Lax')
+    return resp
+
+@bp.route('/slides/regenerate', methods=['POST'])
+@admitted
+def regenerate_slide():
+    payload = request.get_json(silent=True) or {}
+    deck_id = payload.get('deck_id')
+    deck = load_deck(deck_id)
+    if deck is None:
+        return jsonify(error="This deck has expired. Please generate it again."), 410
+
+    slides = deck['slides']
+    index = payload.get('index')
+    if not isinstance(index, int) or not 0 <= index < len(slides):
+        return jsonify(error="Invalid slide index."), 400
+    # The editor sends its current (possibly unsaved) version of the slide
+    current = payload.get('slide') or slides[index]
+    errors = validate_slide(current)
+    if errors:
+        return jsonify(error="Invalid slide data.", details=errors), 400
+    slide_type = payload.get('type') or current.get('type', 'content')
+    if slide_type not in SLIDE_SCHEMAS:
+        return jsonify(error=f"Unknown slide type: {slide_type}"), 400
+    api_key = payload.get('api_key') or os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        return jsonify(error="API Key is required."), 400
+
+    context = {
+        'title': current.get('title', ''),
+        'prev_title': slides[index - 1].get('title', '') if index > 0 else '',
+        'next_title': slides[index + 1].get('title', '') if index + 1 < len(slides) else '',
+        'excerpt': best_excerpt(deck.get('source', ''), slide_text(current))
     }
+    slide = generate_slide(context, slide_type, api_key)
+    if slide is None:
+        return jsonify(error="Failed to regenerate the slide."), 502
+    # The model never sets editor-only fields; keep the user's image
+    if 'image' in slide and current.get('image'):
+        slide['image'] = current['image']
+
+    slides[index] = slide
+    save_deck(deck_id, deck)
+    return jsonify(slide=slide)
+
+def svg_response(key, svg):
+    # Decks change under the same URL, so browsers revalidate; unchanged slides get a 304
+    if request.if_none_match.contains(key):
+        resp = Response(status=304)
+    else:
+        resp = Response(svg, mimetype="image/svg+xml")
+    resp.set_etag(key)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+@bp.route('/decks/<deck_id>/slides/<int:index>/thumbnail.svg', methods=['GET'])
+def slide_thumbnail(deck_id, index):
+    """The stored slide rendered with the deck's settings, for the editor's previews."""
+    deck = load_deck(deck_id)
+    if deck is None:
+        return "Error: This deck has expired. Please generate it again.", 410
+    slides = deck['slides']
+    if not 0 <= index < len(slides):
+        return "Error: Invalid slide index.", 404
+    key, svg = get_thumbnails().render(slides[index], deck['settings'], index)
+    return svg_response(key, svg)
+
+@bp.route('/slides/thumbnail', methods=['POST'])
+def edited_slide_thumbnail():
+    """A thumbnail for the editor's unsaved version of a slide."""
+    payload = request.get_json(silent=True) or {}
+    deck_id = payload.get('deck_id')
+    deck = load_deck(deck_id)
+    if deck is None:
+        return jsonify(error="This deck has expired. Please generate it again."), 410
+    index = payload.get('index')
+    slide = payload.get('slide')
+    if not isinstance(index, int) or not 0 <= index < len(deck['slides']):
+        return jsonify(error="Invalid slide index."), 400
+    errors = validate_slide(slide)
+    if errors:
+        return jsonify(error="Invalid slide data.", details=errors), 400
+    key, svg = get_thumbnails().render(slide, deck['settings'], index)
+    return svg_response(key, svg)
+
+@bp.route('/images', methods=['POST'])
+def upload_image():
+    """An image for an imageText slide; returns its reference for the slide's "image" field."""
+    # No LLM call, so no admission slot or API key bucket; only the client's upload rate
+    try:
+        get_upload_limit().check(client_id())
+    except Rejected as e:
+        print(f"DEBUG: rejected {request.path} with {e.status}: {e.message}")
+        resp = jsonify(error=e.message)
+        resp.status_code = e.status
+        resp.headers['Retry-After'] = retry_after_header(e.retry_after)
+        return resp
+    upload = request.files.get('image')
+    if not upload or not upload.filename:
+        return jsonify(error="No image uploaded."), 400
+    try:
+        ref, stats = get_images().put(upload.read())
+    except ImageError as e:
+        print(f"DEBUG: rejected image {upload.filename!r}: {e.message}")
+        return jsonify(error=e.message), e.status
+    print(f"DEBUG: image {upload.filename!r} stored as {ref}: {json.dumps(stats)}")
+    return jsonify(image=ref, **stats)
+
+@bp.route('/images/<ref>', methods=['GET'])
+def image(ref):
+    """A stored image. References are content hashes, so the response never changes."""
+    data = get_images().get(ref)
+    if data is None:
+        return "Error: Image not found.", 404
+    resp = Response(data, mimetype=mime_type(ref))
+    resp.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return resp
+
+@bp.route('/decks/<deck_id>/edit', methods=['GET'])
+def edit_deck(deck_id):
+    """Reopens a saved deck in the editor."""
+    deck = load_deck(deck_id)
+    if deck is None:
+        return "Error: Deck not found.", 404
+    return editor_page(deck_id, deck)
+
+@bp.route('/decks/<deck_id>/versions/<int:version>/restore', methods=['POST'])
+def restore_version(deck_id, version):
+    """Makes an earlier version the latest one and reopens it in the editor."""
+    if get_history() is None:
+        return "Error: Deck history is disabled.", 404
+    deck = get_history().load(deck_id, version)
+    if deck is None:
+        return "Error: Deck not found.", 404
+    if version != get_history().info(deck_id)['head']:
+        print(f"DEBUG: deck {deck_id}: restoring version {version}")
+        save_deck(deck_id, deck)
+    else:
+        get_decks().put(deck_id, deck)
+    return redirect(url_for('slides.edit_deck', deck_id=deck_id), code=303)
+
+@bp.route('/decks/<deck_id>/slides', methods=['GET'])
+def deck_slides(deck_id):
+    """?offset=&limit= slides of the stored deck, for the editor."""
+    deck = load_deck(deck_id)
+    if deck is None:
+        return jsonify(error="This deck has expired. Please generate it again."), 410
+    slides = deck['slides']
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', EDITOR_PAGE_SIZE, type=int)), EDITOR_PAGE_MAX)
+    return jsonify(total=len(slides), offset=offset, slides=slides[offset:offset + limit])
+
+@bp.route('/decks/<deck_id>/source', methods=['GET'])
+def deck_source(deck_id):
+    """The text the deck was generated from, for the editor's resubmission form."""
+    deck = load_deck(deck_id)
+    if deck is None:
+        return jsonify(error="This deck has expired. Please generate it again."), 410
+    return jsonify(source=deck.get('source', ''))
+
+@bp.route('/decks/<deck_id>/versions', methods=['GET'])
+def deck_versions(deck_id):
+    info = get_history().info(deck_id) if get_history() is not None else None
+    if info is None:
+        return jsonify(error="Deck not found."), 404
+    info.pop('owner')
+    return jsonify(deck=info, versions=get_history().versions(deck_id))
+
+@bp.route('/decks/history', methods=['POST'])
+def deck_history():
+    """The caller's saved decks, newest first. The API key is sent in the body, not the URL."""
+    payload = request.get_json(silent=True) or {}
+    owner = owner_id(payload.get('api_key'))
+    # A browser without an owner token hasn't saved anything yet
+    if get_history() is None or owner is None:
+        return jsonify(decks=[])
+    return jsonify(decks=get_history().list_decks(owner))
+
+@bp.route('/status', methods=['GET'])
+def status():
+    """Per-model routing, connection pool and download cache stats for this worker process."""
+    return jsonify(models=ROUTER.snapshot(), order=ROUTER.candidates(), connections=pool_stats(),
+                   downloads=get_outputs().snapshot())
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Admission counters in the Prometheus text format."""
+    m = get_admission_control().metrics()
+    lines = [
+        f"admission_in_flight {m['in_flight']}",
+        f"admission_in_flight_limit {m['max_in_flight']}",
+        f"admission_queue_depth {m['queue_depth']}",
+        f"admission_queue_limit {m['max_queue']}",
+    ]
+    for outcome in ("admitted", "rejected_key_rate", "rejected_client_rate", "shed_queue_full", "shed_queue_timeout"):
+        lines.append(f'admission_requests_total{{outcome="{outcome}"}} {m[outcome]}')
+    return Response("\n".join(lines) + "\n", mimetype="text/plain")
+
+def render_vba(slide_data, settings, images):
+    """The macro, in a zip with its images when the deck has any."""
+    macro = json_to_vba(slide_data, settings)
+    return sidecar_zip('presentation_macro.vba', macro, images) if images else macro
+
+# format -> (render(slide_data, settings, images), filename, filename with images)
+OUTPUT_FORMATS = {
+    'vba': (render_vba, 'presentation_macro.vba', 'presentation_macro.zip'),
+    'gas': (json_to_gas, 'presentation_script.gs', 'presentation_script.gs'),
+}
+
+def output_response(slide_data, settings, output_format):
+    """
+    The rendered deck as a download. Unchanged decks get a 304 for a matching
+    If-None-Match and are otherwise served from the output cache.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        return f"Error: Unknown output format: {output_format}", 400
+    render, filename, packaged_filename = OUTPUT_FORMATS[output_format]
+    # Image references are content hashes, so the key covers the images too;
+    # slides whose image has expired get the placeholder instead
+    images = get_images().deck_images(slide_data)
+    slide_data = [dict(slide, image="") if isinstance(slide, dict) and slide.get('image') and slide['image'] not in images
+                  else slide for slide in slide_data]
+    key = output_key(slide_data, settings, output_format)
+    zipped = output_format == 'vba' and bool(images)
+    # A zip of PNG and JPEG files gains nothing from another compression
+    encoding = None if zipped else choose_encoding(request.headers.get('Accept-Encoding'))
+    etag = etag_for(key, encoding)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        body = get_outputs().get(key, lambda: render(slide_data, settings, images), encoding)
+        print(f"DEBUG: {output_format} code: {len(body)} bytes ({encoding or 'identity'}, {len(images)} images)")
+        resp = Response(body, mimetype="application/zip" if zipped else "text/plain",
+                        headers={"Content-disposition": f"attachment; filename={packaged_filename if images else filename}"})
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
+
+@bp.route('/download', methods=['POST'])
+def download():
+    deck_id = request.form.get('deck_id')
+    deck = load_deck(deck_id)
+    if deck is None:
+        return "Error: This deck has expired. Please generate it again.", 410
+
+    # Apply the editor's changes to the stored deck
+    diffs = parse_slide_diffs(request.form.get('slide_diffs'))
+    if diffs is None:
+        return "Error: Invalid slide data.", 400
+    print(f"DEBUG: deck {deck_id}: applying {len(diffs)} slide diffs")
+    slide_data = deck['slides']
+    # The editor sends every slide edited since it was loaded, so an edit that
+    # was reverted after an earlier download still reaches the server; only
+    # slides that differ from the stored ones make a new version
+    stored = {int(key): slide_data[int(key)] for key in diffs if int(key) < len(slide_data)}
+    errors = apply_slide_diffs(slide_data, diffs)
+    if errors:
+        return "Error: Invalid slide data.\n" + "\n".join(errors), 400
+    if any(slide_data[i] != slide for i, slide in stored.items()):
+        save_deck(deck_id, deck)
+
+    settings = dict(deck['settings'])
+    for key in ('primary_color', 'title_color', 'body_color', 'font_family'):
+        if request.form.get(key):
+            settings[key] = request.form.get(key)
     
     print(f"DEBUG: slide_data length: {len(slide_data)}")
     # print(f"DEBUG: slide_data[0]: {slide_data[0] if slide_data else 'Empty'}")
     
-    vba_code = json_to_vba(slide_data, settings)
-    print(f"DEBUG: vba_code length: {len(vba_code)}")
-    
-    return Response(
-        vba_code,
-        mimetype="text/plain",
-        headers={"Content-disposition": "attachment; filename=presentation_macro.vba"}
-    )
+    # 'vba' (PowerPoint macro, the default) or 'gas' (Google Slides Apps Script)
+    return output_response(slide_data, settings, request.form.get('format', 'vba'))
+
+@bp.route('/decks/<deck_id>/download', methods=['GET'])
+def download_deck(deck_id):
+    """The stored deck as it was last saved; ?format=vba|gas. Cacheable by URL, unlike POST /download."""
+    deck = load_deck(deck_id)
+    if deck is None:
+        return "Error: This deck has expired. Please generate it again.", 410
+    return output_response(deck['slides'], deck['settings'], request.args.get('format', 'vba'))
+
+# `gunicorn app:app` and existing imports keep working; building the app is cheap
+app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,73 @@
+"""
+Native charts (layout.chart): output size and object-model calls as the data grows.
+
+    python -m benchmarks.charts
+    python -m benchmarks.charts --points 10 100 1000 --series 3 --slides 50
+
+Builds decks of chart, progress and barCompare slides with --points values
+per series and reports, per slide, the shapes laid out, the macro's
+PowerPoint object-model calls (the slow part of running it), the lines that
+only build the chart data string, the Slides API requests and the build
+time. Exits 1 if the shape count or the object-model calls per slide change
+with the number of points.
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.run import DEFAULT_SETTINGS
+from gas_backend import build_requests
+from layout import layout_deck
+from ppt_generator_web import json_to_vba
+
+def make_slides(kind, points, series, n_slides):
+    labels = [f"item {i + 1}" for i in range(points)]
+    if kind == "progress":
+        slide = {"type": "progress", "title": "Progress", "items": [{"label": l, "percent": i % 101} for i, l in enumerate(labels)]}
+    elif kind == "barCompare":
+        slide = {"type": "barCompare", "title": "Compare",
+                 "items": [{"label": l, "valueA": i * 3 % 97, "valueB": i * 7 % 89} for i, l in enumerate(labels)]}
+    else:
+        slide = {"type": "chart", "title": "Chart", "chartType": kind, "categories": labels,
+                 "series": [{"name": f"series {k + 1}", "values": [(i * (k + 3)) % 251 - 20 for i in range(points)]}
+                            for k in range(series)]}
+    return [slide] * n_slides
+
+def measure(slides):
+    shapes = sum(len(page["shapes"]) for page in layout_deck(slides, DEFAULT_SETTINGS))
+    start = time.perf_counter()
+    macro = json_to_vba(slides, DEFAULT_SETTINGS)
+    seconds = time.perf_counter() - start
+    lines = macro.split("\n")
+    # Object-model calls; the chart data lines only concatenate strings
+    calls = sum(1 for l in lines if "pptShape" in l or "pptSlide" in l)
+    data_lines = sum(1 for l in lines if l.startswith("    chartData = "))
+    requests, _ = build_requests(slides, DEFAULT_SETTINGS, charts=[])
+    n = len(slides)
+    return {"shapes": shapes / n, "calls": calls / n, "data_lines": data_lines / n,
+            "requests": len(requests) / n, "bytes": len(macro), "ms": seconds * 1000}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--series", type=int, default=2, help="Series per chart slide")
+    parser.add_argument("--slides", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    ok = True
+    print(f"{'slide':<12} {'points':>7} {'shapes':>7} {'calls':>6} {'data lines':>11} {'requests':>9} {'macro':>10} {'time':>9}")
+    for kind in ("column", "line", "bar", "pie", "progress", "barCompare"):
+        per_slide = set()
+        for points in args.points:
+            m = measure(make_slides(kind, points, args.series, args.slides))
+            per_slide.add((m["shapes"], m["calls"], m["requests"]))
+            print(f"{kind:<12} {points:>7} {m['shapes']:>7.0f} {m['calls']:>6.0f} {m['data_lines']:>11.0f} "
+                  f"{m['requests']:>9.0f} {m['bytes']:>10} {m['ms']:>7.1f}ms")
+        if len(per_slide) > 1:
+            print(f"    {kind}: shapes or calls per slide grow with the data")
+            ok = False
+    print("constant per slide" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Storage and load cost of the deck version history (deck_history.py).
+
+    python -m benchmarks.deck_history
+    python -m benchmarks.deck_history --slides 2000 --versions 200
+
+Saves a deck, then a series of small edits (one slide rewritten, sometimes a
+slide inserted or removed), and reports the bytes stored per version and the
+time to load versions. Every version is read back and compared with what was
+saved; exits 1 on a mismatch.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.decks import make_deck
+from benchmarks.run import DEFAULT_SETTINGS
+from deck_history import DeckHistory
+
+def edit(deck, rng, step):
+    slides = deck["slides"]
+    i = rng.randrange(len(slides))
+    slides[i] = dict(slides[i], title=f"edited {step}")
+    if step % 10 == 0:
+        slides.insert(rng.randrange(len(slides)), {"type": "content", "title": f"new {step}", "points": ["added"]})
+    elif step % 10 == 5:
+        del slides[rng.randrange(len(slides))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=500)
+    parser.add_argument("--versions", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    deck = {"slides": make_deck(args.slides, seed=args.seed), "settings": DEFAULT_SETTINGS,
+            "source": "source text\n\n" * 2000, "source_map": [[i] for i in range(args.slides)]}
+    raw = len(json.dumps(deck, ensure_ascii=False).encode("utf-8"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = DeckHistory(os.path.join(tmp, "history.db"))
+        saved = []
+        save_seconds = 0
+        for step in range(args.versions):
+            if step:
+                edit(deck, rng, step)
+            start = time.perf_counter()
+            history.save("deck", deck)
+            save_seconds += time.perf_counter() - start
+            saved.append(copy.deepcopy(deck))
+        save_ms = save_seconds * 1000 / args.versions
+
+        versions = history.versions("deck")
+        keyframes = [v for v in versions if not v["delta"]]
+        deltas = [v for v in versions if v["delta"]]
+        print(f"deck: {args.slides} slides, {raw} bytes as JSON")
+        print(f"keyframes: {len(keyframes)}, {sum(v['bytes'] for v in keyframes) // max(1, len(keyframes))} bytes each")
+        print(f"deltas:    {len(deltas)}, {sum(v['bytes'] for v in deltas) // max(1, len(deltas))} bytes each "
+              f"(max {max((v['bytes'] for v in deltas), default=0)})")
+        print(f"total:     {sum(v['bytes'] for v in versions)} bytes for {len(versions)} versions")
+        print(f"save:      {save_ms:.2f} ms per version")
+
+        ok = True
+        timings = []
+        for v, expected in zip(versions, saved):
+            start = time.perf_counter()
+            loaded = history.load("deck", v["version"])
+            timings.append((time.perf_counter() - start) * 1000)
+            if loaded != expected:
+                print(f"version {v['version']}: loaded deck differs from the saved one")
+                ok = False
+        print(f"load:      {sum(timings) / len(timings):.2f} ms average, {max(timings):.2f} ms max")
+    print("round trip ok" if ok else "round trip FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import random
+
+# Synthetic slide decks for the benchmark suite.
+# Every slide type handled by json_to_vba has a factory here so that mixed
+# decks exercise all renderer branches. Output is deterministic for a seed.
+
+WORDS = [
+    "売上", "成長", "顧客", "戦略", "市場", "効率", "品質", "チーム", "計画", "改善",
+    "revenue", "growth", "pipeline", "launch", "roadmap", "platform", "adoption", "margin"
+]
+
+def _text(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+def _title(rng):
+    return _text(rng, 3)
+
+def make_title(i, rng):
+    return {"type": "title", "title": _title(rng), "date": "2026.10.19"}
+
+def make_section(i, rng):
+    return {"type": "section", "title": _title(rng), "sectionNo": (i % 9) + 1}
+
+def make_content(i, rng):
+    return {"type": "content", "title": _title(rng), "subhead": _text(rng, 5),
+            "points": [_text(rng, 8) for _ in range(5)], "notes": _text(rng, 12)}
+
+def make_process(i, rng):
+    return {"type": "process", "title": _title(rng), "subhead": _text(rng, 5),
+            "steps": [_text(rng, 6) for _ in range(4)]}
+
+def make_timeline(i, rng):
+    return {"type": "timeline", "title": _title(rng), "subhead": _text(rng, 5),
+            "milestones": [{"date": f"2026.{m + 1:02d}", "label": _text(rng, 4)} for m in range(5)]}
+
+def make_cycle(i, rng):
+    return {"type": "cycle", "title": _title(rng), "subhead": _text(rng, 5),
+            "items": [{"label": _text(rng, 3), "subLabel": f"Phase {k + 1}"} for k in range(4)]}
+
+def make_cards(i, rng):
+    return {"type": "cards", "title": _title(rng), "subhead": _text(rng, 5),
+            "items": [{"title": _text(rng, 2), "desc": _text(rng, 8)} for _ in range(6)]}
+
+def make_pyramid(i, rng):
+    return {"type": "pyramid", "title": _title(rng), "subhead": _text(rng, 5),
+            "levels": [{"title": _text(rng, 2), "description": _text(rng, 6)} for _ in range(4)]}
+
+def make_compare(i, rng):
+    return {"type": "compare", "title": _title(rng), "subhead": _text(rng, 5),
+            "leftTitle": "Before", "rightTitle": "After",
+            "leftItems": [_text(rng, 5) for _ in range(4)],
+            "rightItems": [_text(rng, 5) for _ in range(4)]}
+
+def make_diagram(i, rng):
+    return {"type": "diagram", "title": _title(rng), "subhead": _text(rng, 5),
+            "shapes": [{"shapeType": rng.choice(["rect", "oval", "rounded_rect"]), "label": _text(rng, 2),
+                        "x": 100 + 200 * k, "y": 200, "w": 160, "h": 80} for k in range(4)]}
+
+def make_flow_chart(i, rng):
+    return {"type": "flowChart", "title": _title(rng), "subhead": _text(rng, 5),
+            "flows": [{"steps": [_text(rng, 2) for _ in range(4)]}]}
+
+def make_step_up(i, rng):
+    return {"type": "stepUp", "title": _title(rng), "subhead": _text(rng, 5),
+            "steps": [{"label": _text(rng, 3)} for _ in range(5)]}
+
+def make_image_text(i, rng):
+    return {"type": "imageText", "title": _title(rng), "subhead": _text(rng, 5),
+            "imageDesc": _text(rng, 6), "text": _text(rng, 30)}
+
+def make_table(i, rng):
+    return {"type": "table", "title": _title(rng), "subhead": _text(rng, 5),
+            "headers": ["項目", "2025", "2026", "備考"],
+            "rows": [[_text(rng, 1), str(rng.randint(1, 999)), str(rng.randint(1, 999)), _text(rng, 3)] for _ in range(6)]}
+
+def make_progress(i, rng):
+    return {"type": "progress", "title": _title(rng), "subhead": _text(rng, 5),
+            "items": [{"label": _text(rng, 2), "percent": rng.randint(0, 100)} for _ in range(5)]}
+
+def make_quote(i, rng):
+    return {"type": "quote", "title": _title(rng), "quote": _text(rng, 20), "author": _text(rng, 2)}
+
+def make_kpi(i, rng):
+    return {"type": "kpi", "title": _title(rng), "subhead": _text(rng, 5),
+            "kpis": [{"label": _text(rng, 2), "value": f"{rng.randint(1, 500)}%", "change": f"+{rng.randint(1, 50)}%"} for _ in range(6)]}
+
+def make_bullet_cards(i, rng):
+    return {"type": "bulletCards", "title": _title(rng), "subhead": _text(rng, 5),
+            "cards": [{"title": _text(rng, 2), "points": [_text(rng, 5) for _ in range(4)]} for _ in range(2)]}
+
+def make_faq(i, rng):
+    return {"type": "faq", "title": _title(rng), "subhead": _text(rng, 5),
+            "items": [{"q": _text(rng, 8), "a": _text(rng, 15)} for _ in range(3)]}
+
+def make_stats_compare(i, rng):
+    return {"type": "statsCompare", "title": _title(rng), "subhead": _text(rng, 5),
+            "leftTitle": "2025", "rightTitle": "2026",
+            "stats": [{"label": _text(rng, 2), "leftValue": str(rng.randint(1, 999)), "rightValue": str(rng.randint(1, 999))} for _ in range(4)]}
+
+def make_bar_compare(i, rng):
+    return {"type": "barCompare", "title": _title(rng), "subhead": _text(rng, 5),
+            "items": [{"label": _text(rng, 2), "valueA": rng.randint(0, 100), "valueB": rng.randint(0, 100)} for _ in range(4)]}
+
+def make_chart(i, rng):
+    months = [f"2026.{m + 1:02d}" for m in range(12)]
+    return {"type": "chart", "title": _title(rng), "subhead": _text(rng, 5),
+            "chartType": ("column", "line", "bar", "pie")[i % 4], "categories": months,
+            "series": [{"name": _text(rng, 1), "values": [rng.randint(0, 500) for _ in months]} for _ in range(2)]}
+
+SLIDE_FACTORIES = {
+    "title": make_title,
+    "section": make_section,
+    "content": make_content,
+    "process": make_process,
+    "timeline": make_timeline,
+    "cycle": make_cycle,
+    "cards": make_cards,
+    "pyramid": make_pyramid,
+    "compare": make_compare,
+    "diagram": make_diagram,
+    "flowChart": make_flow_chart,
+    "stepUp": make_step_up,
+    "imageText": make_image_text,
+    "table": make_table,
+    "progress": make_progress,
+    "quote": make_quote,
+    "kpi": make_kpi,
+    "bulletCards": make_bullet_cards,
+    "faq": make_faq,
+    "statsCompare": make_stats_compare,
+    "barCompare": make_bar_compare,
+    "chart": make_chart,
+}
+
+def make_deck(n_slides, seed=0, types=None):
+    """Builds a deck of n_slides, cycling through `types` (default: every slide type)."""
+    rng = random.Random(seed)
+    types = list(types or SLIDE_FACTORIES)
+    return [SLIDE_FACTORIES[types[i % len(types)]](i, rng) for i in range(n_slides)]
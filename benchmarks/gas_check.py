@@ -0,0 +1,94 @@
+"""
+Offline check of the Google Slides output: builds the batchUpdate requests
+for every slide type and for mixed decks, and validates their structure
+with gas_backend.validate_requests.
+
+    python -m benchmarks.gas_check
+    python -m benchmarks.gas_check --slides 500 --seeds 5 --show 3
+
+Exits 1 on any error. The generated script itself is syntax-checked with
+`node --check` when node is on the PATH.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.decks import SLIDE_FACTORIES, make_deck
+from benchmarks.run import DEFAULT_SETTINGS
+from gas_backend import BATCH_SIZE, build_requests, json_to_gas, validate_requests
+
+# An uploaded image (image_pipeline.py); the script embeds it once for both slides using it
+EDGE_IMAGE = "0" * 32 + "-804x241.png"
+EDGE_IMAGES = {EDGE_IMAGE: b"\x89PNG\r\n\x1a\n not decoded offline"}
+
+# Edge cases the synthetic decks don't produce
+EDGE_SLIDES = [
+    {"type": "content", "title": 'Quotes " and\nnewlines', "points": ["a\r\nb", ""], "notes": "line 1\nline 2"},
+    {"type": "progress", "title": "Empty bar", "items": [{"label": "none", "percent": 0}]},
+    {"type": "table", "title": "Ragged", "headers": ["a", "b"], "rows": [["1"], ["1", "2", "3"]]},
+    {"type": "title", "title": "", "date": ""},
+    {"type": "unknown", "items": ["falls back", "to content"]},
+    # Over capacity: split into continuation slides by pagination.py
+    {"type": "process", "title": "Nine steps", "steps": [f"step {i}" for i in range(9)], "notes": "first page only"},
+    {"type": "table", "title": "Long table", "headers": ["a", "b"], "rows": [[str(i), "v"] for i in range(20)]},
+    {"type": "imageText", "title": "Logo", "text": "uploaded image", "image": EDGE_IMAGE},
+    {"type": "imageText", "title": "Logo again", "text": "same image", "image": EDGE_IMAGE},
+    {"type": "imageText", "title": "Model-invented image", "imageDesc": "placeholder", "image": "logo.png"},
+    # Native charts (layout.chart): long series, ragged data, labels with quotes and separators
+    {"type": "chart", "title": "Long series", "chartType": "line",
+     "series": [{"name": "a", "values": [i % 37 - 10 for i in range(800)]}, {"name": "b", "values": [0.5]}]},
+    {"type": "chart", "title": "Pie", "chartType": "pie", "categories": ['"x"', "y|~^`", "z\nw"],
+     "series": [{"name": "", "values": [1, 2, 3]}]},
+    {"type": "chart", "title": "No data", "chartType": "bogus", "series": []},
+    {"type": "barCompare", "title": "Many pairs", "items": [{"label": f"item {i}", "valueA": i, "valueB": 2 * i} for i in range(300)]},
+]
+
+def check(label, deck, show=0):
+    requests, notes = build_requests(deck, DEFAULT_SETTINGS)
+    errors = validate_requests(requests)
+    batches = (len(requests) + BATCH_SIZE - 1) // BATCH_SIZE
+    status = "ok" if not errors else f"{len(errors)} errors"
+    print(f"{label:<28} {len(deck):>5} slides {len(requests):>7} requests {batches:>4} batches  {status}")
+    for error in errors[:show or 5]:
+        print(f"    {error}")
+    return not errors
+
+def syntax_check(deck):
+    node = shutil.which("node")
+    if not node:
+        print("node not found; skipping the script syntax check")
+        return True
+    with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False, encoding="utf-8") as f:
+        f.write(json_to_gas(deck, DEFAULT_SETTINGS, EDGE_IMAGES))
+    try:
+        proc = subprocess.run([node, "--check", f.name], capture_output=True, text=True)
+    finally:
+        os.unlink(f.name)
+    print(f"script syntax (node --check)  {'ok' if proc.returncode == 0 else proc.stderr.strip()}")
+    return proc.returncode == 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=200, help="Slides per mixed deck")
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--show", type=int, default=0, help="Errors to print per deck (default 5)")
+    args = parser.parse_args(argv)
+
+    ok = True
+    for slide_type in SLIDE_FACTORIES:
+        ok &= check(slide_type, make_deck(20, types=[slide_type]), args.show)
+    ok &= check("edge cases", EDGE_SLIDES, args.show)
+    for seed in range(args.seeds):
+        deck = make_deck(args.slides, seed=seed)
+        start = time.perf_counter()
+        ok &= check(f"mixed (seed {seed})", deck, args.show)
+        print(f"    built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    ok &= syntax_check(make_deck(len(SLIDE_FACTORIES)) + EDGE_SLIDES)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
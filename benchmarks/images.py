@@ -0,0 +1,106 @@
+"""
+Image pipeline (image_pipeline.py): upload processing, deduplication and the
+size of downloads with images.
+
+    python -m benchmarks.images
+    python -m benchmarks.images --slides 500 --photo-every 10
+
+Uploads a large logo and a few photos to an in-memory image store, builds a
+deck of imageText slides with the logo on every slide and a photo on every
+--photo-every-th, and reports what each upload was reduced to, the cost of a
+repeated upload, and the VBA zip and Apps Script sizes. Checks that every
+distinct image is stored, zipped and embedded exactly once; exits 1 if not.
+"""
+import argparse
+import io
+import json
+import random
+import struct
+import sys
+import time
+import zipfile
+import zlib
+
+from benchmarks.run import DEFAULT_SETTINGS
+from gas_backend import json_to_gas
+from image_pipeline import Image, ImageStore, sidecar_zip
+from ppt_generator_web import json_to_vba
+from state_backend import MemoryState
+
+def png(width, height, pixel):
+    """An RGB PNG, pixel(x, y) -> (r, g, b), written without Pillow."""
+    rows = b"".join(b"\0" + bytes(c for x in range(width) for c in pixel(x, y)) for y in range(height))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 6)) + chunk(b"IEND", b""))
+
+def make_logo():
+    # Flat colours, wider than the image area
+    return png(2400, 800, lambda x, y: (220, 30, 40) if 200 < x < 1100 and 200 < y < 600 else (255, 255, 255))
+
+def make_photo(seed):
+    rng = random.Random(seed)
+    noise = bytes(rng.randrange(40) for _ in range(4096))
+    return png(1600, 1200, lambda x, y: (x * 255 // 1600, (y * 255 // 1200 + noise[(x * 31 + y) % 4096]) % 256,
+                                         noise[(x + y * 7) % 4096] * 4))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=100)
+    parser.add_argument("--photos", type=int, default=3)
+    parser.add_argument("--photo-every", type=int, default=25, help="Every n-th slide shows a photo instead of the logo")
+    args = parser.parse_args(argv)
+
+    if Image is None:
+        print("Pillow is not installed: images are stored as uploaded, without scaling")
+    store = ImageStore(MemoryState())
+    uploads = [("logo", make_logo())] + [(f"photo {i + 1}", make_photo(i)) for i in range(args.photos)]
+    refs = []
+    print(f"{'upload':<10} {'bytes':>10} {'stored':>10} {'size':>10} {'time':>8} {'again':>8}")
+    for name, data in uploads:
+        start = time.perf_counter()
+        ref, stats = store.put(data)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        again, again_stats = store.put(data)
+        repeat = time.perf_counter() - start
+        refs.append(ref)
+        print(f"{name:<10} {len(data):>10} {stats['stored_bytes']:>10} {stats['width']:>5}x{stats['height']:<4} "
+              f"{first * 1000:>6.1f}ms {repeat * 1000:>6.2f}ms")
+        if again != ref or not again_stats.get("deduplicated"):
+            print(f"    repeated upload of {name} was processed again")
+            return 1
+
+    slides = []
+    for i in range(args.slides):
+        photo = args.photos and i % args.photo_every == args.photo_every - 1
+        ref = refs[1 + (i // args.photo_every) % args.photos] if photo else refs[0]
+        slides.append({"type": "imageText", "title": f"Slide {i + 1}", "text": "text", "image": ref})
+    images = store.deck_images(slides)
+    distinct = len(set(s["image"] for s in slides))
+    image_bytes = sum(len(b) for b in images.values())
+
+    start = time.perf_counter()
+    macro = json_to_vba(slides, DEFAULT_SETTINGS)
+    package = sidecar_zip("presentation_macro.vba", macro, images)
+    vba_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    script = json_to_gas(slides, DEFAULT_SETTINGS, images)
+    gas_ms = (time.perf_counter() - start) * 1000
+
+    zipped = [n for n in zipfile.ZipFile(io.BytesIO(package)).namelist() if n.startswith("images/")]
+    embedded = json.loads(next(l for l in script.splitlines() if l.startswith("var IMAGES = "))[13:-1])
+    print(f"deck: {args.slides} slides, {distinct} distinct images, {image_bytes} image bytes")
+    print(f"vba zip:    {len(package):>9} bytes, {len(zipped)} image files, "
+          f"{macro.count('AddPicture')} pictures placed, built in {vba_ms:.1f} ms")
+    print(f"apps script:{len(script):>9} bytes, {len(embedded)} embedded images, built in {gas_ms:.1f} ms")
+
+    ok = len(zipped) == distinct and len(embedded) == distinct and len(images) == distinct
+    # Each image once: the script is the deck, the images' base64 and a short placement per slide
+    ok &= len(script) < len(json_to_gas(slides, DEFAULT_SETTINGS)) + image_bytes * 4 / 3 + 100 * args.slides
+    print("deduplicated" if ok else "images are repeated in the output")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Peak memory and time of document extraction (ingest.py) as uploads grow.
+
+    python -m benchmarks.ingest
+    python -m benchmarks.ingest --sizes 1,16,64
+
+Writes DOCX and Markdown files of roughly each size (MB of XML or Markdown),
+extracts them with the default limits and reports the traced peak memory,
+which should stay flat as the files grow. Dense files reach INGEST_MAX_CHARS
+early; sparse ones are mostly formatting and are read to the end. Also
+checks that a DOCX expanding past INGEST_MAX_EXPANDED is refused. PDFs need pypdf and a real text-layer
+file, so they are not generated here. Exits 1 if a check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from ingest import IngestError, Limits, extract_text
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8"?>'
+                 '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                 '<Default Extension="xml" ContentType="application/xml"/></Types>')
+STYLES = (f'<?xml version="1.0" encoding="UTF-8"?><w:styles xmlns:w="{W_NS}">'
+          '<w:style w:type="paragraph" w:styleId="1"><w:name w:val="heading 1"/></w:style>'
+          '<w:style w:type="paragraph" w:styleId="2"><w:name w:val="heading 2"/></w:style></w:styles>')
+SENTENCE = "市場の成長に合わせて新しいプラットフォームを段階的に展開します。Revenue grew 12% year over year. "
+# Sparse documents are mostly formatting with little text (empty styled
+# paragraphs, blank lines), so the extractors must read the whole file
+# without reaching INGEST_MAX_CHARS.
+SPARSE_EVERY = 200
+
+def paragraphs(sparse):
+    """Endless (heading level or 0, text); in sparse documents most texts are empty."""
+    i = 0
+    while True:
+        if sparse and i % SPARSE_EVERY:
+            item = (0, "")
+        elif i % 50 == 0:
+            item = (1, f"Chapter {i // 50 + 1}")
+        elif i % 10 == 0:
+            item = (2, f"Section {i // 10 + 1}")
+        else:
+            item = (0, f"{i}: " + SENTENCE * 3)
+        i += 1
+        yield item
+
+def write_docx(path, n_bytes, sparse=False):
+    """A DOCX whose document.xml is about n_bytes."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("word/styles.xml", STYLES)
+        # Streamed into the archive, so writing large files doesn't need the XML in memory either
+        with archive.open("word/document.xml", "w", force_zip64=True) as f:
+            written = f.write(f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{W_NS}"><w:body>'.encode())
+            for level, text in paragraphs(sparse):
+                if written >= n_bytes:
+                    break
+                style = f'<w:pPr><w:pStyle w:val="{level}"/></w:pPr>' if level else '<w:pPr><w:spacing w:after="0"/></w:pPr>'
+                run = f'<w:r><w:rPr><w:b/><w:color w:val="333333"/></w:rPr><w:t>{text}</w:t></w:r>'
+                written += f.write(f"<w:p>{style}{run}</w:p>".encode("utf-8"))
+            f.write(b"</w:body></w:document>")
+
+def write_markdown(path, n_bytes, sparse=False):
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        for level, text in paragraphs(sparse):
+            if written >= n_bytes:
+                break
+            line = ("#" * level + " " if level else "") + text if text else " " * 80
+            written += len((line + "\n\n").encode("utf-8"))
+            f.write(line + "\n\n")
+
+def measure(path, limits=None):
+    """(text, stats, peak traced bytes, seconds); timed without tracemalloc, which slows parsing severalfold."""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        text, stats = extract_text(f, path, limits)
+    seconds = time.perf_counter() - start
+    traced = Limits(timeout=3600, max_expanded=limits.max_expanded if limits else None)
+    tracemalloc.start()
+    try:
+        with open(path, "rb") as f:
+            extract_text(f, path, traced)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return text, stats, peak, seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,4,16", help="File sizes in MB")
+    args = parser.parse_args(argv)
+
+    ok = True
+    peaks = {} # (sparse, ext) -> peaks by size
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'file':<20} {'on disk':>9} {'kept chars':>11} {'peak memory':>12} {'time':>7}")
+        for mb in [int(x) for x in args.sizes.split(",")]:
+            for sparse in (False, True):
+                for ext, write in ((".docx", write_docx), (".md", write_markdown)):
+                    path = os.path.join(tmp, f"doc{mb}{'s' if sparse else ''}{ext}")
+                    write(path, mb * 1024 * 1024, sparse)
+                    text, stats, peak, seconds = measure(path)
+                    peaks.setdefault((sparse, ext), []).append(peak)
+                    label = f"{mb} MB {'sparse ' if sparse else ''}{ext}"
+                    print(f"{label:<20} {os.path.getsize(path) / 1e6:>7.1f}MB {stats['document_chars']:>11} "
+                          f"{peak / 1e6:>10.1f}MB {seconds:>6.2f}s"
+                          f"{'  truncated' if stats['document_truncated'] else ''}")
+                    if not text.startswith("# Chapter 1\n\n") or not (sparse or "\n\n## Section" in text):
+                        print(f"    headings lost: {text[:60]!r}")
+                        ok = False
+
+        # A small limit on the expanded XML stands in for a zip bomb
+        path = os.path.join(tmp, "bomb.docx")
+        write_docx(path, 4 * 1024 * 1024, sparse=True)
+        try:
+            measure(path, Limits(max_expanded=1024 * 1024))
+            print("expanded-size limit: NOT enforced")
+            ok = False
+        except IngestError as e:
+            print(f"expanded-size limit: refused with {e.status} ({e.message})")
+
+    # Bounded: the largest file of a kind needs little more memory than the smallest
+    for (sparse, ext), series in peaks.items():
+        if max(series) > 2 * series[0] + 1024 * 1024:
+            print(f"{'sparse ' if sparse else ''}{ext}: peak memory grew from {series[0] / 1e6:.1f}MB "
+                  f"to {max(series) / 1e6:.1f}MB")
+            ok = False
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
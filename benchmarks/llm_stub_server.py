@@ -0,0 +1,310 @@
+"""
+Local record/replay stand-in for the Gemini REST API.
+
+    python -m benchmarks.llm_stub_server --recordings rec.jsonl --latency lognormal:-1.2,0.4
+    LLM_BACKEND=stub LLM_STUB_URL=http://127.0.0.1:8765 gunicorn app:app
+
+Responses come from a JSONL file written by RecordingBackend (LLM_RECORD_PATH),
+matched by prompt key; unmatched prompts get the recordings round-robin, or a
+synthetic deck from benchmarks.decks when there are no recordings. Latency,
+failures and SSE chunking are configurable and seeded, so runs are repeatable.
+POST /v1beta/cachedContents stands in for context caching: a cached system
+prompt is not charged against --input-rate. With --certfile/--keyfile the stub
+serves HTTPS, and --connect-delay adds a fixed cost to every new connection
+(the handshake round trips a real API pays), for connection pooling tests.
+"""
+import argparse
+import json
+import random
+import re
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.decks import SLIDE_FACTORIES, make_deck
+from llm_backends import prompt_key
+from ppt_generator_web import OUTLINE_PROMPT, SLIDE_PROMPT
+
+DEFAULT_PORT = 8765
+MODELS = ['gemini-2.0-flash', 'gemini-flash-latest', 'gemini-1.5-flash']
+
+def parse_latency(spec):
+    """
+    fixed:S | uniform:LO,HI | normal:MEAN,STDDEV | lognormal:MU,SIGMA  (seconds)
+    Returns a function rng -> delay in seconds.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class StubState:
+    def __init__(self, recordings=None, latency="fixed:0", fail_rate=0.0, malformed_rate=0.0,
+                 hang_rate=0.0, hang_seconds=120.0, fail_models=(), chunk_size=256,
+                 chunk_delay=0.0, synthetic_slides=20, output_rate=0.0, input_rate=0.0, model_latency=None,
+                 seed=0):
+        self.by_key = {}
+        self.ordered = []
+        for record in recordings or []:
+            self.by_key.setdefault(record["key"], record["response"])
+            self.ordered.append(record["response"])
+        self.latency = parse_latency(latency)
+        # Per-model overrides, e.g. to check that routing moves off a slow model
+        self.model_latency = {m: parse_latency(spec) for m, spec in (model_latency or {}).items()}
+        self.fail_rate = fail_rate
+        self.malformed_rate = malformed_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.fail_models = set(fail_models)
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.output_rate = output_rate
+        self.input_rate = input_rate
+        self.cached_contents = {}
+        self.deck = make_deck(synthetic_slides, seed=seed)
+        self.synthetic = json.dumps(self.deck, ensure_ascii=False)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "replayed": 0, "fallback": 0, "failed": 0, "malformed": 0, "hung": 0,
+                      "caches": 0, "cached_calls": 0, "input_chars": 0}
+        self._cursor = 0
+
+    def create_cache(self, model, system):
+        with self.lock:
+            self.stats["caches"] += 1
+            name = f"cachedContents/{len(self.cached_contents) + 1}"
+            self.cached_contents[name] = system
+            return name
+
+    def plan(self, model, contents, cached=0):
+        """
+        Decides the outcome of one call: (delay, status, text).
+        cached: how many leading parts of contents came from a cached context.
+        """
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = self.model_latency.get(model, self.latency)(self.rng)
+            input_chars = sum(len(c) for c in contents[cached:])
+            self.stats["input_chars"] += input_chars
+            if cached:
+                self.stats["cached_calls"] += 1
+            if self.input_rate:
+                # Prefill time grows with the uncached part of the prompt
+                delay += input_chars / self.input_rate
+            roll = self.rng.random()
+            if model in self.fail_models or roll < self.fail_rate:
+                self.stats["failed"] += 1
+                return delay, 500, None
+            if roll < self.fail_rate + self.hang_rate:
+                self.stats["hung"] += 1
+                return self.hang_seconds, 200, self.synthetic
+
+            key = prompt_key(contents)
+            if key in self.by_key:
+                self.stats["replayed"] += 1
+                text = self.by_key[key]
+            elif self.ordered:
+                self.stats["fallback"] += 1
+                text = self.ordered[self._cursor % len(self.ordered)]
+                self._cursor += 1
+            else:
+                self.stats["fallback"] += 1
+                text = self.synthetic_text(contents)
+
+            if self.output_rate:
+                # Generation time grows with the length of the answer
+                delay += len(text) / self.output_rate
+            if roll < self.fail_rate + self.hang_rate + self.malformed_rate:
+                self.stats["malformed"] += 1
+                text = text[:len(text) // 2]
+            return delay, 200, text
+
+    def synthetic_text(self, contents):
+        # Answers shaped like what each of the app's prompts asks for
+        prompt = contents[0] if contents else ""
+        if prompt.startswith(SLIDE_PROMPT.split("\n")[0]):
+            m = re.search(r'of type "(\w+)"', prompt)
+            factory = SLIDE_FACTORIES.get(m.group(1) if m else "content", SLIDE_FACTORIES["content"])
+            return json.dumps(factory(0, self.rng), ensure_ascii=False)
+        if prompt.startswith(OUTLINE_PROMPT.split("\n")[0]):
+            return json.dumps([{"type": s["type"], "title": s.get("title", ""), "paragraphs": [1]} for s in self.deck], ensure_ascii=False)
+        return self.synthetic
+
+def _response(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/v1beta/models"):
+                self._send_json(200, {"models": [{"name": f"models/{m}"} for m in MODELS]})
+            elif self.path == "/stats":
+                with state.lock:
+                    self._send_json(200, dict(state.stats))
+            else:
+                self._send_json(404, {"error": {"code": 404, "message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            path, _, query = self.path.partition("?")
+            if path == "/v1beta/cachedContents":
+                system = "".join(p.get("text", "") for p in body.get("systemInstruction", {}).get("parts", []))
+                name = state.create_cache(body.get("model", ""), system)
+                self._send_json(200, {"name": name, "model": body.get("model"), "ttl": body.get("ttl")})
+                return
+            if not path.startswith("/v1beta/models/") or ":" not in path:
+                self._send_json(404, {"error": {"code": 404, "message": "not found"}})
+                return
+            model, _, method = path[len("/v1beta/models/"):].partition(":")
+            contents = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+            # Put a cached system prompt back in front, as if it had been sent inline
+            cached = 0
+            if body.get("cachedContent"):
+                system = state.cached_contents.get(body["cachedContent"])
+                if system is None:
+                    self._send_json(404, {"error": {"code": 404, "message": "cached content not found"}})
+                    return
+                contents = [system] + contents
+                cached = 1
+
+            delay, status, text = state.plan(model, contents, cached)
+            time.sleep(delay)
+            if status != 200:
+                self._send_json(status, {"error": {"code": status, "message": "injected failure"}})
+            elif method == "streamGenerateContent":
+                self._stream(text)
+            else:
+                self._send_json(200, _response(text))
+
+        def _stream(self, text):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(text), state.chunk_size):
+                event = f"data: {json.dumps(_response(text[i:i + state.chunk_size]), ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+                self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                self.wfile.flush()
+                if state.chunk_delay:
+                    time.sleep(state.chunk_delay)
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, handler, ssl_context=None, connect_delay=0.0):
+        super().__init__(address, handler)
+        self.connect_delay = connect_delay
+        if ssl_context is not None:
+            # Handshakes happen in the per-connection thread, not the accept loop
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+
+    def finish_request(self, request, client_address):
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+        if isinstance(request, ssl.SSLSocket):
+            try:
+                request.do_handshake()
+            except (ssl.SSLError, OSError):
+                return
+        super().finish_request(request, client_address)
+
+def tls_context(certfile, keyfile):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+def load_recordings(path):
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def start_server(state, host="127.0.0.1", port=DEFAULT_PORT, ssl_context=None, connect_delay=0.0):
+    """Starts the stub in a daemon thread and returns the server (port 0 picks a free port)."""
+    server = StubHTTPServer((host, port), make_handler(state), ssl_context, connect_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_state_arguments(parser):
+    parser.add_argument("--recordings", help="JSONL written by LLM_RECORD_PATH")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:LO,HI | normal:MEAN,SD | lognormal:MU,SIGMA")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of calls answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of calls answered with truncated JSON")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of calls that stall for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--fail-model", action="append", default=[], help="Always fail calls to this model")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="Latency distribution for one model, overriding --latency")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Characters per SSE chunk when streaming")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between SSE chunks")
+    parser.add_argument("--synthetic-slides", type=int, default=20)
+    parser.add_argument("--output-rate", type=float, default=0.0, help="Simulated output characters per second (0 = instant)")
+    parser.add_argument("--input-rate", type=float, default=0.0, help="Simulated uncached input characters per second (0 = instant)")
+    parser.add_argument("--seed", type=int, default=0)
+
+def state_from_args(args):
+    return StubState(
+        recordings=load_recordings(args.recordings),
+        latency=args.latency,
+        fail_rate=args.fail_rate,
+        malformed_rate=args.malformed_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        fail_models=args.fail_model,
+        chunk_size=args.chunk_size,
+        chunk_delay=args.chunk_delay,
+        synthetic_slides=args.synthetic_slides,
+        output_rate=args.output_rate,
+        input_rate=args.input_rate,
+        model_latency=dict(spec.split("=", 1) for spec in args.model_latency),
+        seed=args.seed
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--certfile", help="Serve HTTPS with this certificate")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--connect-delay", type=float, default=0.0, help="Seconds added to every new connection")
+    add_state_arguments(parser)
+    args = parser.parse_args(argv)
+
+    context = tls_context(args.certfile, args.keyfile) if args.certfile else None
+    server = StubHTTPServer((args.host, args.port), make_handler(state_from_args(args)), context, args.connect_delay)
+    scheme = "https" if context else "http"
+    print(f"LLM stub listening on {scheme}://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Offline load test for /preview against the LLM stub server.
+
+    python -m benchmarks.load_preview --requests 200 --concurrency 16 --latency lognormal:-1.5,0.5
+    python -m benchmarks.load_preview --fail-model gemini-2.0-flash --malformed-rate 0.2
+    python -m benchmarks.load_preview --synthetic-slides 30 --output-rate 2000 --mode two_stage
+    python -m benchmarks.load_preview --text-file notes.txt --input-rate 20000 --no-context-cache
+    python -m benchmarks.load_preview --model-latency gemini-2.0-flash=fixed:1.0 --latency fixed:0.1
+
+Starts the stub in-process, points the app at it (LLM_BACKEND=stub) and drives
+/preview from a thread pool, reporting throughput, latency percentiles, status
+codes, the app's per-request token usage headers and the stub's own counters
+(replayed/failed/malformed/cached calls).
+"""
+import argparse
+import json
+import os
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.llm_stub_server import add_state_arguments, start_server, state_from_args
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[k]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30.0, help="LLM_TIMEOUT for the app's backend")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming endpoint")
+    parser.add_argument("--mode", choices=["single", "two_stage"], default="single", help="GENERATION_MODE for the app")
+    parser.add_argument("--text", default="売上は前年比120%で成長しました。\n\n次の四半期は新製品を投入します。")
+    parser.add_argument("--text-file", help="Read the input text from this file instead of --text")
+    parser.add_argument("--no-context-cache", action="store_true", help="Send the system prompt inline (LLM_CONTEXT_CACHE=0)")
+    parser.add_argument("--cache-min-tokens", type=int, default=0, help="LLM_CONTEXT_CACHE_MIN_TOKENS for the app")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep the app's rate limits and in-flight cap (RATE_*, MAX_IN_FLIGHT from the environment)")
+    add_state_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stub = start_server(state_from_args(args), port=0)
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["LLM_STUB_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ["LLM_TIMEOUT"] = str(args.timeout)
+    os.environ["GENERATION_MODE"] = args.mode
+    os.environ["LLM_CONTEXT_CACHE"] = "0" if args.no_context_cache else "1"
+    os.environ["LLM_CONTEXT_CACHE_MIN_TOKENS"] = str(args.cache_min_tokens)
+    if args.stream:
+        os.environ["LLM_STUB_STREAM"] = "1"
+    if not args.admission:
+        # Every simulated user shares one address and key
+        for name in ("RATE_KEY_PER_MIN", "RATE_CLIENT_PER_MIN", "MAX_IN_FLIGHT"):
+            os.environ[name] = "0"
+
+    from app import app
+    text = args.text
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as f:
+            text = f.read()
+    form = {"text_input": text, "api_key": "stub"}
+
+    def one(i):
+        client = app.test_client()
+        start = time.perf_counter()
+        resp = client.post("/preview", data=form)
+        usage = {h: int(resp.headers.get(h, 0)) for h in ("X-Input-Tokens", "X-Prompt-Tokens", "X-Cached-Tokens")}
+        return resp.status_code, time.perf_counter() - start, usage
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [t for _, t, _ in results]
+    statuses = Counter(code for code, _, _ in results)
+    usage = Counter()
+    for _, _, u in results:
+        usage.update(u)
+    with urllib.request.urlopen(os.environ["LLM_STUB_URL"] + "/stats") as resp:
+        stub_stats = json.loads(resp.read())
+    router = app.test_client().get("/status").get_json()
+    admission = app.test_client().get("/metrics").get_data(as_text=True)
+    stub.shutdown()
+
+    print(f"requests      {args.requests} @ concurrency {args.concurrency}")
+    print(f"wall time     {wall:.2f} s")
+    print(f"throughput    {args.requests / wall:.1f} req/s")
+    print(f"latency p50   {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p95   {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"latency p99   {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"statuses      {dict(sorted(statuses.items()))}")
+    for header, total in usage.items():
+        print(f"{header.lower()[2:]:<14}{total / len(results):.0f} per request")
+    print(f"stub          {stub_stats}")
+    if args.admission:
+        print("admission")
+        print("".join(f"  {line}\n" for line in admission.splitlines()), end="")
+    print(f"model order   {router['order']}")
+    for model, stats in router["models"].items():
+        print(f"  {model:<22}{stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Stateless multi-node check: one user's flow spread across app processes.
+
+    python -m benchmarks.multinode_check
+    python -m benchmarks.multinode_check --nodes 4 --flows 20
+    python -m benchmarks.multinode_check --state-url redis://127.0.0.1:6379/15   # a real Redis
+
+Starts the LLM stub and the RESP stand-in (benchmarks.resp_stub_server) in
+this process and --nodes app processes on their own ports, all with
+STATE_BACKEND pointing at the stand-in. Each flow sends every step to the
+next node in turn: /preview, a thumbnail, /slides/regenerate, two downloads
+of the stored deck and a conditional download that must be a 304. Then the
+same flows run against nodes with the in-memory backend as a control, where
+steps landing on another node get 410 (deck expired). Exits 1 if a shared
+flow fails or the control unexpectedly passes.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks.llm_stub_server import StubState, start_server as start_llm_stub
+from benchmarks.resp_stub_server import start_server as start_resp_stub
+
+NODE = """
+import sys
+import app
+app.app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)
+"""
+
+def request(url, data=None, headers=None, json_body=None):
+    """(status, headers, body) without raising on HTTP errors."""
+    headers = dict(headers or {})
+    if json_body is not None:
+        data = json.dumps(json_body).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    elif data is not None:
+        data = urllib.parse.urlencode(data).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_nodes(n, env):
+    nodes = []
+    for _ in range(n):
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, "-c", NODE, str(port)], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        nodes.append((f"http://127.0.0.1:{port}", proc))
+    deadline = time.monotonic() + 30
+    for url, proc in nodes:
+        while True:
+            try:
+                if request(url + "/status")[0] == 200:
+                    break
+            except OSError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                stop_nodes(nodes)
+                raise RuntimeError(f"app node {url} did not start")
+            time.sleep(0.1)
+    return nodes
+
+def stop_nodes(nodes):
+    for _, proc in nodes:
+        proc.terminate()
+    for _, proc in nodes:
+        proc.wait()
+
+def run_flow(urls, start):
+    """Runs one flow, each step on the next node; returns a list of failed steps."""
+    node = iter(urls[(start + i) % len(urls)] for i in range(100))
+    failures = []
+    def check(step, status, expected):
+        if status != expected:
+            failures.append(f"{step}: {status}")
+        return status == expected
+
+    status, _, body = request(next(node) + "/preview", {"text_input": f"flow {start}\n\n売上は前年比120%で成長しました。",
+                                                        "api_key": "multinode-check"})
+    if not check("preview", status, 200):
+        return failures
+    deck_id = re.search(rb'id="deck_id" name="deck_id" value="([^"]+)"', body).group(1).decode()
+
+    status, _, _ = request(next(node) + f"/decks/{deck_id}/slides/0/thumbnail.svg")
+    check("thumbnail", status, 200)
+    status, _, _ = request(next(node) + "/slides/regenerate",
+                           json_body={"deck_id": deck_id, "index": 1, "api_key": "multinode-check"})
+    check("regenerate", status, 200)
+
+    # Rendered on one node, reused from the shared cache on the next; same bytes, same ETag
+    gzip = {"Accept-Encoding": "gzip"}
+    first = request(next(node) + f"/decks/{deck_id}/download", headers=gzip)
+    second = request(next(node) + f"/decks/{deck_id}/download", headers=gzip)
+    if check("download", first[0], 200) and check("download again", second[0], 200):
+        if first[1].get("ETag") != second[1].get("ETag") or first[2] != second[2]:
+            failures.append("download: nodes served different outputs")
+        status, _, _ = request(next(node) + f"/decks/{deck_id}/download",
+                               headers=dict(gzip, **{"If-None-Match": first[1].get("ETag")}))
+        check("conditional download", status, 304)
+    return failures
+
+def run(label, nodes, flows):
+    urls = [url for url, _ in nodes]
+    failed = 0
+    start = time.perf_counter()
+    for i in range(flows):
+        failures = run_flow(urls, i)
+        if failures:
+            failed += 1
+            if failed <= 3:
+                print(f"  {label} flow {i}: " + ", ".join(failures))
+    seconds = time.perf_counter() - start
+    shared_hits = sum(json.loads(request(url + "/status")[2])["downloads"].get("shared_hits", 0) for url in urls)
+    print(f"{label:<8} {flows - failed}/{flows} flows passed, {seconds / flows * 1000:.0f} ms per flow, "
+          f"{shared_hits} shared download cache hits")
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--flows", type=int, default=10)
+    parser.add_argument("--state-url", help="Use this Redis-protocol server instead of the local stand-in")
+    args = parser.parse_args(argv)
+
+    llm = start_llm_stub(StubState(synthetic_slides=12), port=0)
+    state_url = args.state_url
+    resp = None
+    if not state_url:
+        resp = start_resp_stub(port=0)
+        state_url = f"redis://127.0.0.1:{resp.server_address[1]}/0"
+
+    env = dict(os.environ, LLM_BACKEND="stub", LLM_STUB_URL=f"http://127.0.0.1:{llm.server_address[1]}",
+               DECK_HISTORY="off", RATE_KEY_PER_MIN="0", RATE_CLIENT_PER_MIN="0", MAX_IN_FLIGHT="0")
+    env.pop("DECK_STORE", None)
+    print(f"{args.nodes} app nodes, state on {state_url}")
+
+    nodes = start_nodes(args.nodes, dict(env, STATE_BACKEND=state_url))
+    try:
+        shared_failed = run("shared", nodes, args.flows)
+    finally:
+        stop_nodes(nodes)
+    if resp is not None:
+        calls = resp.store.calls
+        print(f"         state server: {sum(calls.values())} commands ({', '.join(f'{k} {v}' for k, v in calls.most_common())})")
+
+    nodes = start_nodes(args.nodes, dict(env, STATE_BACKEND="memory"))
+    try:
+        control_failed = run("memory", nodes, args.flows)
+    finally:
+        stop_nodes(nodes)
+
+    ok = shared_failed == 0 and (args.nodes < 2 or control_failed > 0)
+    if args.nodes >= 2 and control_failed == 0:
+        print("control: per-process state passed too, so the check proves nothing")
+    print("ok" if ok else "FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
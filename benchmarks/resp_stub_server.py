@@ -0,0 +1,167 @@
+"""
+Local stand-in for a Redis-protocol server, for multi-node tests without Redis.
+
+    python -m benchmarks.resp_stub_server --port 6390
+    STATE_BACKEND=redis://127.0.0.1:6390/0 gunicorn -w 4 app:app
+
+Speaks RESP2 and implements the commands state_backend.RespState sends (GET,
+SET with EX/PX/NX/XX, DEL, EXPIRE/PEXPIRE, PING, SELECT, AUTH) plus EXISTS,
+INCR, FLUSHDB, DBSIZE and a STATS command returning its command counters.
+Keys live in one dict per database; expired keys are dropped when touched.
+"""
+import argparse
+import socketserver
+import threading
+import time
+from collections import Counter
+
+DEFAULT_PORT = 6390
+
+class RespStore:
+    def __init__(self, password=None):
+        self.password = password
+        self.dbs = {} # db -> {key: (expires_at or None, value)}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def _live(self, db, key):
+        entry = self.dbs.get(db, {}).get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+            del self.dbs[db][key]
+            return None
+        return entry
+
+    def execute(self, session, args):
+        """The reply for one command: bytes, str (simple string), int, None, list or an Exception (error reply)."""
+        name = args[0].decode("ascii", "replace").upper()
+        rest = args[1:]
+        with self.lock:
+            self.calls[name] += 1
+            if name == "AUTH":
+                if self.password is None or rest[-1].decode() == self.password:
+                    session["authed"] = True
+                    return "OK"
+                return Exception("WRONGPASS invalid password")
+            if self.password is not None and not session.get("authed") and name != "PING":
+                return Exception("NOAUTH Authentication required.")
+            db = session.setdefault("db", 0)
+            keys = self.dbs.setdefault(db, {})
+            if name == "PING":
+                return rest[0] if rest else "PONG"
+            if name == "SELECT":
+                session["db"] = int(rest[0])
+                return "OK"
+            if name == "GET":
+                entry = self._live(db, rest[0])
+                return None if entry is None else entry[1]
+            if name == "SET":
+                key, value, options = rest[0], rest[1], [o.decode().upper() for o in rest[2:]]
+                expires_at = None
+                for i, option in enumerate(options):
+                    if option == "EX":
+                        expires_at = time.monotonic() + int(options[i + 1])
+                    elif option == "PX":
+                        expires_at = time.monotonic() + int(options[i + 1]) / 1000
+                exists = self._live(db, key) is not None
+                if ("NX" in options and exists) or ("XX" in options and not exists):
+                    return None
+                keys[key] = (expires_at, value)
+                return "OK"
+            if name in ("DEL", "EXISTS"):
+                found = [key for key in rest if self._live(db, key) is not None]
+                if name == "DEL":
+                    for key in found:
+                        del keys[key]
+                return len(found)
+            if name in ("EXPIRE", "PEXPIRE"):
+                entry = self._live(db, rest[0])
+                if entry is None:
+                    return 0
+                seconds = int(rest[1]) / (1000 if name == "PEXPIRE" else 1)
+                keys[rest[0]] = (time.monotonic() + seconds, entry[1])
+                return 1
+            if name == "INCR":
+                entry = self._live(db, rest[0])
+                value = int(entry[1]) + 1 if entry else 1
+                keys[rest[0]] = (entry[0] if entry else None, str(value).encode())
+                return value
+            if name == "DBSIZE":
+                return len(keys)
+            if name == "FLUSHDB":
+                keys.clear()
+                return "OK"
+            if name == "STATS":
+                return [f"{k}={v}".encode() for k, v in sorted(self.calls.items())]
+            return Exception(f"ERR unknown command '{name}'")
+
+def encode_reply(reply):
+    if isinstance(reply, Exception):
+        return b"-%s\r\n" % str(reply).encode()
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode_reply(r) for r in reply)
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+def read_command(reader):
+    """One command as a list of bytes arguments, or None at end of stream."""
+    line = reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split() # inline command, e.g. from telnet
+    args = []
+    for _ in range(int(line[1:])):
+        n = int(reader.readline()[1:])
+        args.append(reader.read(n + 2)[:-2])
+    return args
+
+def make_handler(store):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            session = {}
+            while True:
+                try:
+                    args = read_command(self.rfile)
+                except (OSError, ValueError):
+                    return
+                if args is None:
+                    return
+                if not args:
+                    continue
+                self.wfile.write(encode_reply(store.execute(session, args)))
+                self.wfile.flush()
+    return Handler
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_server(store=None, host="127.0.0.1", port=DEFAULT_PORT):
+    """Starts the stand-in in a daemon thread and returns the server (port 0 picks a free port)."""
+    store = store or RespStore()
+    server = RespServer((host, port), make_handler(store))
+    server.store = store
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--password", help="Require AUTH with this password")
+    args = parser.parse_args(argv)
+
+    server = RespServer((args.host, args.port), make_handler(RespStore(args.password)))
+    print(f"RESP stub listening on redis://{args.host}:{server.server_address[1]}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Offline benchmark suite for the deck transforms.
+
+    python -m benchmarks.run                 # run and compare against baselines.json
+    python -m benchmarks.run --update        # run and overwrite baselines.json
+    python -m benchmarks.run --only json_to_vba --sizes 10,100
+
+Each case is measured for wall time (best of --repeat runs), peak traced memory
+(tracemalloc, separate run) and output size in bytes. A case fails when it
+regresses past the configured threshold relative to the stored baseline.
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.decks import SLIDE_FACTORIES, make_deck
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_SIZES = [10, 100, 500, 2000]
+PER_TYPE_SIZE = 200
+
+# Timings below this many seconds are treated as noise when comparing.
+TIME_NOISE_FLOOR = 0.005
+
+DEFAULT_SETTINGS = {
+    'primary_color': '#4285F4',
+    'title_color': '#333333',
+    'body_color': '#333333',
+    'font_family': 'Meiryo'
+}
+
+# name -> (setup(n_slides) -> arg, run(arg) -> output)
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(setup):
+        def wrap(run):
+            BENCHMARKS[name] = (setup, run)
+            return run
+        return wrap
+    return register
+
+def _deck(n):
+    return make_deck(n)
+
+@benchmark("json_to_vba")(_deck)
+def bench_json_to_vba(deck):
+    from ppt_generator_web import json_to_vba
+    return json_to_vba(deck, DEFAULT_SETTINGS)
+
+@benchmark("editor_payload")(_deck)
+def bench_editor_payload(deck):
+    # The slide JSON the editor loads up front: its first page of cards
+    from app import EDITOR_PAGE_SIZE
+    return json.dumps(deck[:EDITOR_PAGE_SIZE], ensure_ascii=False)
+
+@benchmark("editor_page")(_deck)
+def bench_editor_page(deck):
+    # edit.html itself, which holds only the slide count
+    from app import app, editor_page
+    with app.test_request_context():
+        return editor_page("bench", {"slides": deck, "settings": DEFAULT_SETTINGS})
+
+def _deck_with_diffs(n):
+    # Roughly what an editing session sends: a title fix on every 10th slide
+    # and a content edit on every 20th.
+    deck = make_deck(n)
+    diffs = {}
+    for i in range(0, n, 10):
+        slide = copy.deepcopy(deck[i])
+        slide["title"] += " (edited)"
+        diffs[str(i)] = slide
+    for i in range(0, n, 20):
+        diffs[str(i)]["notes"] = "edited"
+    return deck, diffs
+
+@benchmark("download_diffs")(_deck_with_diffs)
+def bench_download_diffs(arg):
+    from app import apply_slide_diffs
+    deck, diffs = arg
+    apply_slide_diffs(list(deck), diffs)
+    # Output size is the request payload
+    return json.dumps(diffs, ensure_ascii=False)
+
+def _per_type_setup(slide_type):
+    return lambda n: make_deck(n, types=[slide_type])
+
+for _slide_type in SLIDE_FACTORIES:
+    BENCHMARKS[f"json_to_vba[{_slide_type}]"] = (_per_type_setup(_slide_type), bench_json_to_vba)
+
+def _output_bytes(output):
+    if isinstance(output, bytes):
+        return len(output)
+    if isinstance(output, str):
+        return len(output.encode("utf-8"))
+    return len(json.dumps(output, ensure_ascii=False).encode("utf-8"))
+
+def measure(setup, run, n, repeat):
+    arg = setup(n)
+    output = run(arg) # warm-up (also imports)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time_s": round(best, 6), "peak_bytes": peak, "output_bytes": _output_bytes(output)}
+
+def compare(results, baseline, time_threshold, mem_threshold, size_threshold):
+    regressions = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        if current["time_s"] > base["time_s"] * (1 + time_threshold) and current["time_s"] - base["time_s"] > TIME_NOISE_FLOOR:
+            regressions.append(f"{case}: time {base['time_s']:.4f}s -> {current['time_s']:.4f}s")
+        if current["peak_bytes"] > base["peak_bytes"] * (1 + mem_threshold):
+            regressions.append(f"{case}: peak memory {base['peak_bytes']} -> {current['peak_bytes']} bytes")
+        if current["output_bytes"] > base["output_bytes"] * (1 + size_threshold):
+            regressions.append(f"{case}: output {base['output_bytes']} -> {current['output_bytes']} bytes")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--only", action="append", help="Run only cases whose name starts with this prefix")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--time-threshold", type=float, default=0.25)
+    parser.add_argument("--mem-threshold", type=float, default=0.10)
+    parser.add_argument("--size-threshold", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = {}
+    for name, (setup, run) in BENCHMARKS.items():
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        case_sizes = [PER_TYPE_SIZE] if "[" in name else sizes
+        for n in case_sizes:
+            case = f"{name}/{n}"
+            results[case] = measure(setup, run, n, args.repeat)
+            r = results[case]
+            print(f"{case:<40} {r['time_s'] * 1000:>10.2f} ms {r['peak_bytes'] / 1024:>10.1f} KiB {r['output_bytes']:>12} B")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    if args.update:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {"python": platform.python_version(), "machine": platform.machine()},
+                "results": dict(sorted(baseline.items()))
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.time_threshold, args.mem_threshold, args.size_threshold)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions." if baseline else "\nNo baseline found; run with --update to create one.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Worker cold-start time: importing the app and serving the first request, in
+fresh interpreters.
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --max-import-ms 400   # exit 1 above this median
+
+Each run starts a new Python process (as a gunicorn worker without --preload
+would), imports app and GETs /. The slowest imports by cumulative time come
+from -X importtime, and the report shows whether google.generativeai was
+loaded, which it should not be unless LLM_BACKEND=gemini.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+resp = app.app.test_client().get("/")
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (served - imported) * 1000,
+    "status": resp.status_code,
+    "genai_loaded": "google.generativeai" in sys.modules,
+    "modules": len(sys.modules)
+}))
+"""
+
+def run_once(cwd, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    proc = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, proc.stderr
+
+def slowest_imports(stderr, top):
+    # "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if m:
+            rows.append((int(m.group(2)), len(m.group(3)), m.group(4)))
+    # Only top-level imports of the probe, so nested modules aren't counted twice
+    outer = min((depth for _, depth, _ in rows), default=0)
+    rows = [(us, name) for us, depth, name in rows if depth <= outer + 2]
+    return sorted(rows, reverse=True)[:top]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time is above this")
+    args = parser.parse_args(argv)
+
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    run_once(cwd) # warm the filesystem and bytecode caches
+    results = [run_once(cwd)[0] for _ in range(args.runs)]
+    _, stderr = run_once(cwd, importtime=True)
+
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    first_ms = statistics.median(r["first_request_ms"] for r in results)
+    print(f"runs              {args.runs}")
+    print(f"import app        {import_ms:.1f} ms (median)")
+    print(f"first request     {first_ms:.1f} ms (median, status {results[0]['status']})")
+    print(f"modules loaded    {results[0]['modules']}")
+    print(f"genai loaded      {results[0]['genai_loaded']}")
+    print("slowest imports (cumulative)")
+    for us, name in slowest_imports(stderr, args.top):
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: median import time {import_ms:.1f} ms > {args.max_import_ms:.1f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
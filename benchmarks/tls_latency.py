@@ -0,0 +1,87 @@
+"""
+Per-call latency of the REST backend against a local TLS stub, with and
+without connection pooling.
+
+    python -m benchmarks.tls_latency --calls 200 --concurrency 8 --connect-delay 0.03
+
+A self-signed certificate is generated with the openssl CLI (or pass
+--certfile/--keyfile). --connect-delay models the round trips a new
+connection costs against the real API (TCP + TLS handshakes); the local TLS
+handshake itself is measured on top. The stub answers instantly, so the
+numbers are pure transport overhead:
+
+    fresh        a new connection per call (LLM_POOL_SIZE=0)
+    pooled       keep-alive pool, cold start
+    pooled+warm  keep-alive pool warmed first, as gunicorn's post_fork does
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.llm_stub_server import StubState, start_server, tls_context
+from benchmarks.load_preview import percentile
+from http_pool import HTTPPool
+from llm_backends import StubBackend
+
+def self_signed_cert(directory):
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+         "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True
+    )
+    return certfile, keyfile
+
+def run(base_url, certfile, pool_size, warm, calls, concurrency):
+    os.environ["LLM_CA_FILE"] = certfile
+    backend = StubBackend(base_url)
+    backend.pool = HTTPPool(base_url, size=pool_size, timeout=30)
+    if warm:
+        backend.pool.warm(concurrency)
+
+    def one(i):
+        start = time.perf_counter()
+        backend.generate("gemini-2.0-flash", [f"ping {i}"])
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - started
+    stats = dict(backend.pool.stats)
+    backend.pool.close()
+    return latencies, wall, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--connect-delay", type=float, default=0.03, help="Seconds added to every new connection")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = (args.certfile, args.keyfile) if args.certfile else self_signed_cert(tmp)
+        stub = start_server(StubState(synthetic_slides=1), port=0,
+                            ssl_context=tls_context(certfile, keyfile), connect_delay=args.connect_delay)
+        base_url = f"https://127.0.0.1:{stub.server_address[1]}"
+
+        print(f"{args.calls} calls @ concurrency {args.concurrency}, connect delay {args.connect_delay * 1000:.0f} ms")
+        print(f"{'mode':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'wall':>10}  connections")
+        for label, size, warm in (("fresh", 0, False), ("pooled", 16, False), ("pooled+warm", 16, True)):
+            latencies, wall, stats = run(base_url, certfile, size, warm, args.calls, args.concurrency)
+            print(f"{label:<14}"
+                  f"{percentile(latencies, 50) * 1000:>8.1f}ms"
+                  f"{percentile(latencies, 95) * 1000:>8.1f}ms"
+                  f"{percentile(latencies, 99) * 1000:>8.1f}ms"
+                  f"{wall:>9.2f}s  opened {stats['opened']}, reused {stats['reused']}")
+        stub.shutdown()
+
+if __name__ == "__main__":
+    main()
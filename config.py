@@ -157,6 +157,12 @@ class PPTConfig:
             "subhead": {"left": 25, "top": 90, "width": 910, "height": 40},
             "area": {"left": 25, "top": 132, "width": 910, "height": 330}
         },
+        "chartSlide": {
+            "title": {"left": 25, "top": 20, "width": 830, "height": 65},
+            "titleUnderline": {"left": 25, "top": 80, "width": 260, "height": 4},
+            "subhead": {"left": 25, "top": 90, "width": 910, "height": 40},
+            "area": {"left": 25, "top": 132, "width": 910, "height": 330}
+        },
         "footer": {
             "leftText": {"left": 15, "top": 511, "width": 250, "height": 20},
             "rightPage": {"right": 15, "top": 511, "width": 50, "height": 20}
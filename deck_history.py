@@ -0,0 +1,258 @@
+import difflib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Version history of every deck, kept on disk so a closed tab or an expired
+# deck doesn't mean another generation. Each save is a version. Versions are
+# stored as keyframes (the whole deck) or as deltas against the deck's latest
+# keyframe, zlib-compressed. A load is one keyframe plus at most one delta,
+# so its cost follows the deck size, not the length of its history.
+#
+# A delta lists the slides as runs copied from the keyframe and runs of new
+# slides, and the other deck fields only where they changed:
+#   {"slides": [[start, end] | [slide, ...], ...], "settings": {...}, "_removed": [field, ...]}
+#
+# Retention is applied on save: a deck keeps its latest MAX_VERSIONS versions
+# (plus the keyframe the oldest of them are stored against) and versions
+# younger than MAX_AGE_DAYS; decks not saved for MAX_AGE_DAYS are deleted.
+#
+# The history is a SQLite file local to the node. Decks themselves can be
+# shared between nodes (STATE_BACKEND, see state_backend.py), their history
+# is not: each node lists and restores the versions saved through it.
+
+KEYFRAME_INTERVAL = 32 # versions
+MAX_VERSIONS = 100 # per deck; 0: unlimited
+MAX_AGE_DAYS = 90 # 0: unlimited
+KEYFRAME_RATIO = 0.5 # a delta larger than this share of its keyframe becomes a keyframe
+COMPRESSION_LEVEL = 6
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _pack(value):
+    return zlib.compress(_dumps(value).encode("utf-8"), COMPRESSION_LEVEL)
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+def make_delta(base, deck):
+    """The changes from deck base to deck, in the delta format above."""
+    base_keys = [_dumps(s) for s in base.get("slides", [])]
+    keys = [_dumps(s) for s in deck.get("slides", [])]
+    runs = []
+    matcher = difflib.SequenceMatcher(None, base_keys, keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            runs.append([i1, i2])
+        elif j1 < j2:
+            runs.append(deck["slides"][j1:j2])
+    delta = {"slides": runs}
+    for key, value in deck.items():
+        if key != "slides" and base.get(key) != value:
+            delta[key] = value
+    delta["_removed"] = [key for key in base if key not in deck]
+    return delta
+
+def apply_delta(base, delta):
+    deck = {key: value for key, value in base.items() if key not in delta["_removed"]}
+    slides = []
+    for run in delta["slides"]:
+        if len(run) == 2 and all(isinstance(i, int) for i in run):
+            slides.extend(base["slides"][run[0]:run[1]])
+        else:
+            slides.extend(run)
+    deck.update((key, value) for key, value in delta.items() if key not in ("slides", "_removed"))
+    deck["slides"] = slides
+    return deck
+
+def _title(deck):
+    slides = deck.get("slides") or []
+    return str(slides[0].get("title", "")) if slides else ""
+
+class DeckHistory:
+    """
+    Versioned decks in a SQLite file. Decks are listed by owner (a hash of the
+    user's API key or browser token, see app.owner_id) and last update.
+    """
+
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL, max_versions=MAX_VERSIONS, max_age_days=MAX_AGE_DAYS):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.max_versions = max_versions
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history_decks ("
+            " deck_id TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " parent_id TEXT,"
+            " title TEXT NOT NULL,"
+            " slide_count INTEGER NOT NULL,"
+            " head INTEGER NOT NULL,"
+            " keyframe INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_decks_owner ON history_decks (owner, updated_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_decks_updated ON history_decks (updated_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history_versions ("
+            " deck_id TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " base INTEGER," # keyframe a delta applies to; NULL for keyframes
+            " payload BLOB NOT NULL,"
+            " saved_at REAL NOT NULL,"
+            " PRIMARY KEY (deck_id, version))"
+        )
+
+    def _payload(self, deck_id, version):
+        return self._conn.execute(
+            "SELECT base, payload FROM history_versions WHERE deck_id = ? AND version = ?", (deck_id, version)
+        ).fetchone()
+
+    def _load(self, deck_id, version):
+        row = self._payload(deck_id, version)
+        if row is None:
+            return None
+        base, payload = row
+        if base is None:
+            return _unpack(payload)
+        return apply_delta(_unpack(self._payload(deck_id, base)[1]), _unpack(payload))
+
+    def save(self, deck_id, deck, owner="server", parent_id=None):
+        """Records deck as the next version of deck_id. Returns the version number."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so workers sharing the file number versions in turn
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT head, keyframe FROM history_decks WHERE deck_id = ?", (deck_id,)
+                ).fetchone()
+                base, payload = None, None
+                if row is None:
+                    version = 1
+                else:
+                    head, keyframe = row
+                    version = head + 1
+                    if version - keyframe < self.keyframe_interval:
+                        keyframe_blob = self._payload(deck_id, keyframe)[1]
+                        delta = _pack(make_delta(_unpack(keyframe_blob), deck))
+                        if len(delta) <= KEYFRAME_RATIO * len(keyframe_blob):
+                            base, payload = keyframe, delta
+                if base is None:
+                    payload = _pack(deck)
+                keyframe = version if base is None else base
+                self._conn.execute(
+                    "INSERT INTO history_versions (deck_id, version, base, payload, saved_at) VALUES (?, ?, ?, ?, ?)",
+                    (deck_id, version, base, payload, now)
+                )
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO history_decks (deck_id, owner, parent_id, title, slide_count, head, keyframe,"
+                        " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (deck_id, owner, parent_id, _title(deck), len(deck.get("slides", [])), version, keyframe, now, now)
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE history_decks SET title = ?, slide_count = ?, head = ?, keyframe = ?, updated_at = ?"
+                        " WHERE deck_id = ?",
+                        (_title(deck), len(deck.get("slides", [])), version, keyframe, now, deck_id)
+                    )
+                self._prune(deck_id, version, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def _prune(self, deck_id, head, now):
+        # Versions of this deck past the retention, never the head nor a keyframe a kept delta needs
+        cutoff = head - self.max_versions + 1 if self.max_versions else 0
+        if self.max_age:
+            row = self._conn.execute(
+                "SELECT min(version) FROM history_versions WHERE deck_id = ? AND saved_at >= ?", (deck_id, now - self.max_age)
+            ).fetchone()
+            cutoff = max(cutoff, min(row[0], head))
+        if cutoff > 1:
+            self._conn.execute(
+                "DELETE FROM history_versions WHERE deck_id = ? AND version < ? AND version NOT IN"
+                " (SELECT base FROM history_versions WHERE deck_id = ? AND version >= ? AND base IS NOT NULL)",
+                (deck_id, cutoff, deck_id, cutoff)
+            )
+        if self.max_age:
+            expired = "SELECT deck_id FROM history_decks WHERE updated_at < ?"
+            self._conn.execute(f"DELETE FROM history_versions WHERE deck_id IN ({expired})", (now - self.max_age,))
+            self._conn.execute("DELETE FROM history_decks WHERE updated_at < ?", (now - self.max_age,))
+
+    def load(self, deck_id, version=None):
+        """The deck at version (default: the latest), or None."""
+        with self._lock:
+            if version is None:
+                row = self._conn.execute("SELECT head FROM history_decks WHERE deck_id = ?", (deck_id,)).fetchone()
+                if row is None:
+                    return None
+                version = row[0]
+            return self._load(deck_id, version)
+
+    def info(self, deck_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT deck_id, owner, parent_id, title, slide_count, head, created_at, updated_at"
+                " FROM history_decks WHERE deck_id = ?", (deck_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("deck_id", "owner", "parent_id", "title", "slide_count", "head", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    def versions(self, deck_id):
+        """[{"version", "saved_at", "bytes", "delta"}] oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, saved_at, length(payload), base IS NOT NULL FROM history_versions"
+                " WHERE deck_id = ? ORDER BY version", (deck_id,)
+            ).fetchall()
+        return [{"version": v, "saved_at": t, "bytes": n, "delta": bool(d)} for v, t, n, d in rows]
+
+    def list_decks(self, owner, limit=50):
+        """The owner's decks, most recently updated first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT deck_id, title, slide_count, head, updated_at FROM history_decks"
+                " WHERE owner = ? ORDER BY updated_at DESC LIMIT ?", (owner, limit)
+            ).fetchall()
+        return [{"deck_id": d, "title": t, "slides": n, "versions": h, "updated_at": u} for d, t, n, h, u in rows]
+
+    def delete(self, deck_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM history_versions WHERE deck_id = ?", (deck_id,))
+            self._conn.execute("DELETE FROM history_decks WHERE deck_id = ?", (deck_id,))
+
+def get_deck_history():
+    """
+    Builds the history selected by the environment, or None when it is off:
+      DECK_HISTORY                sqlite:/path/to/history.db (default sqlite:deck_history.db) | off
+      DECK_HISTORY_KEYFRAME_EVERY versions between full copies (default 32)
+      DECK_HISTORY_MAX_VERSIONS   versions kept per deck (default 100, 0: unlimited)
+      DECK_HISTORY_MAX_AGE_DAYS   days versions and idle decks are kept (default 90, 0: unlimited)
+    The file is per node: with several nodes, each keeps the history of the
+    saves it served, even when STATE_BACKEND shares the decks themselves.
+    """
+    spec = os.environ.get("DECK_HISTORY", "sqlite:deck_history.db")
+    if spec == "off":
+        return None
+    if spec.startswith("sqlite:"):
+        return DeckHistory(
+            spec[len("sqlite:"):],
+            keyframe_interval=int(os.environ.get("DECK_HISTORY_KEYFRAME_EVERY", KEYFRAME_INTERVAL)),
+            max_versions=int(os.environ.get("DECK_HISTORY_MAX_VERSIONS", MAX_VERSIONS)),
+            max_age_days=float(os.environ.get("DECK_HISTORY_MAX_AGE_DAYS", MAX_AGE_DAYS)),
+        )
+    raise ValueError(f"Unknown DECK_HISTORY: {spec}")
@@ -0,0 +1,161 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Server-side storage for decks between /preview and /download.
+# A deck is {"slides": [...], "settings": {...}, "source": "...", "source_map": [...]}
+# keyed by a random deck id, so the editor only has to send back what the user
+# changed. source_map lists the source paragraphs behind each slide, for
+# incremental regeneration (see source_text.plan_update).
+
+DEFAULT_MAX_DECKS = 256
+DEFAULT_TTL = 24 * 60 * 60 # seconds
+
+def new_deck_id():
+    return uuid.uuid4().hex
+
+class MemoryDeckStore:
+    """Per-process LRU of decks. Oldest decks are evicted past max_decks or ttl."""
+
+    def __init__(self, max_decks=DEFAULT_MAX_DECKS, ttl=DEFAULT_TTL):
+        self.max_decks = max_decks
+        self.ttl = ttl
+        self._decks = OrderedDict() # deck_id -> (saved_at, deck)
+        self._lock = threading.Lock()
+
+    def create(self, deck):
+        deck_id = new_deck_id()
+        self.put(deck_id, deck)
+        return deck_id
+
+    def get(self, deck_id):
+        with self._lock:
+            entry = self._decks.get(deck_id)
+            if entry is None:
+                return None
+            saved_at, deck = entry
+            if time.time() - saved_at > self.ttl:
+                del self._decks[deck_id]
+                return None
+            self._decks.move_to_end(deck_id)
+            return copy.deepcopy(deck)
+
+    def put(self, deck_id, deck):
+        deck = copy.deepcopy(deck)
+        with self._lock:
+            self._decks[deck_id] = (time.time(), deck)
+            self._decks.move_to_end(deck_id)
+            while len(self._decks) > self.max_decks:
+                self._decks.popitem(last=False)
+
+    def delete(self, deck_id):
+        with self._lock:
+            self._decks.pop(deck_id, None)
+
+class SQLiteDeckStore:
+    """Decks persisted in a SQLite file, so they survive worker restarts and are shared by workers on one host."""
+
+    def __init__(self, path, max_decks=DEFAULT_MAX_DECKS, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_decks = max_decks
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS decks ("
+            " deck_id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " saved_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS decks_saved_at ON decks (saved_at)")
+
+    def create(self, deck):
+        deck_id = new_deck_id()
+        self.put(deck_id, deck)
+        return deck_id
+
+    def get(self, deck_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, saved_at FROM decks WHERE deck_id = ?", (deck_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM decks WHERE deck_id = ?", (deck_id,))
+                return None
+            self._conn.execute("UPDATE decks SET saved_at = ? WHERE deck_id = ?", (time.time(), deck_id))
+        return json.loads(row[0])
+
+    def put(self, deck_id, deck):
+        payload = json.dumps(deck, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO decks (deck_id, payload, saved_at) VALUES (?, ?, ?)",
+                (deck_id, payload, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM decks WHERE saved_at < ? OR deck_id IN ("
+                " SELECT deck_id FROM decks ORDER BY saved_at DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl, self.max_decks)
+            )
+
+    def delete(self, deck_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM decks WHERE deck_id = ?", (deck_id,))
+
+class StateDeckStore:
+    """
+    Decks in the shared state backend (state_backend.py), so every node and
+    worker sees every deck. Expiry is left to the backend's TTLs.
+    """
+
+    def __init__(self, state, ttl=DEFAULT_TTL):
+        self.state = state
+        self.ttl = ttl
+
+    def create(self, deck):
+        deck_id = new_deck_id()
+        self.put(deck_id, deck)
+        return deck_id
+
+    def get(self, deck_id):
+        payload = self.state.get("deck:" + deck_id)
+        if payload is None:
+            return None
+        self.state.expire("deck:" + deck_id, self.ttl)
+        return json.loads(payload)
+
+    def put(self, deck_id, deck):
+        payload = json.dumps(deck, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.state.set("deck:" + deck_id, payload, self.ttl)
+
+    def delete(self, deck_id):
+        self.state.delete("deck:" + deck_id)
+
+def get_deck_store(state=None):
+    """
+    Builds the store selected by the environment:
+      DECK_STORE          memory | sqlite:/path/to/decks.db | state
+                          (default: state when STATE_BACKEND is shared, else memory)
+      DECK_STORE_MAX      maximum number of decks kept (memory and sqlite)
+      DECK_STORE_TTL      seconds a deck is kept after its last use
+    state is the backend from state_backend.get_state_backend, for "state".
+    """
+    shared = state is not None and state.shared
+    spec = os.environ.get("DECK_STORE") or ("state" if shared else "memory")
+    max_decks = int(os.environ.get("DECK_STORE_MAX", DEFAULT_MAX_DECKS))
+    ttl = float(os.environ.get("DECK_STORE_TTL", DEFAULT_TTL))
+    if spec == "memory":
+        return MemoryDeckStore(max_decks=max_decks, ttl=ttl)
+    if spec.startswith("sqlite:"):
+        return SQLiteDeckStore(spec[len("sqlite:"):], max_decks=max_decks, ttl=ttl)
+    if spec == "state" and state is not None:
+        return StateDeckStore(state, ttl=ttl)
+    raise ValueError(f"Unknown DECK_STORE: {spec}")
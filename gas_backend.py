@@ -0,0 +1,397 @@
+import base64
+import json
+import re
+
+from config import PPTConfig
+from image_pipeline import mime_type
+from layout import DEFAULT_FONT_SIZE, DEFAULT_SHAPE_FILL, DEFAULT_SHAPE_LINE, DEFAULT_SHAPE_TEXT, chart_table, layout_deck
+
+# Google Slides output: the same layout as the VBA macro (layout.py), as a
+# list of Slides API batchUpdate requests wrapped in an Apps Script. The
+# script sends the requests in a few large batches instead of one call per
+# shape, which is what makes SlidesApp-style scripts slow on big decks.
+#
+# Requests are built for the A4 page in points (PPTConfig.SLIDE_WIDTH_PT);
+# the script scales every position, size and font size to the target
+# presentation's page width, and prefixes object IDs with a per-run token so
+# it can be run more than once on the same presentation.
+#
+# Uploaded images can't go through batchUpdate (createImage needs a public
+# URL), so they are embedded in the script as base64, each image once however
+# many slides use it, and inserted with SlidesApp after the batches.
+#
+# Charts (layout.chart) are Sheets charts: the script writes each chart's data
+# to a sheet of one spreadsheet per run with a single setValues call, builds
+# the chart there and links it into the slide.
+
+SHAPE_TYPES = {1: "RECTANGLE", 5: "ROUND_RECTANGLE", 9: "ELLIPSE", 33: "RIGHT_ARROW", 66: "DOWN_ARROW"}
+ALIGNMENTS = {1: "START", 2: "CENTER", 3: "END"}
+CHART_TYPES = {"bar": "BAR", "column": "COLUMN", "line": "LINE", "pie": "PIE"}
+BATCH_SIZE = 500
+# Room left in the 50-character object ID limit for the script's run prefix
+RUN_PREFIX_MAX = 16
+
+def _rgb(color):
+    r, g, b = color
+    return {"rgbColor": {"red": r / 255, "green": g / 255, "blue": b / 255}}
+
+def _solid(color):
+    return {"solidFill": {"color": _rgb(color)}}
+
+def _pt(value):
+    return {"magnitude": value, "unit": "PT"}
+
+def _element_properties(page_id, left, top, width, height):
+    return {
+        "pageObjectId": page_id,
+        "size": {"width": _pt(width), "height": _pt(height)},
+        "transform": {"scaleX": 1, "scaleY": 1, "translateX": left, "translateY": top, "unit": "PT"}
+    }
+
+def _text_requests(object_id, prim, default_color, cell=None):
+    """insertText plus the text and paragraph style of one shape or table cell."""
+    text = prim.get("text")
+    if not text:
+        return []
+    target = {"objectId": object_id}
+    if cell:
+        target["cellLocation"] = {"rowIndex": cell[0] - 1, "columnIndex": cell[1] - 1}
+    # Slides uses "\n" between paragraphs and a vertical tab for a line break
+    requests = [{"insertText": dict(target, text=text.replace("\r\n", "\v"), insertionIndex=0)}]
+
+    font = prim.get("font", {})
+    style = {
+        "fontSize": _pt(font.get("size", DEFAULT_FONT_SIZE)),
+        "foregroundColor": {"opaqueColor": _rgb(font.get("color", default_color))}
+    }
+    if "name" in font:
+        style["fontFamily"] = font["name"]
+    if "bold" in font:
+        style["bold"] = bool(font["bold"])
+    if "italic" in font:
+        style["italic"] = bool(font["italic"])
+    requests.append({"updateTextStyle": dict(target, style=style, textRange={"type": "ALL"}, fields=",".join(sorted(style)))})
+    if "align" in prim:
+        requests.append({"updateParagraphStyle": dict(target, style={"alignment": ALIGNMENTS[prim["align"]]},
+                                                      textRange={"type": "ALL"}, fields="alignment")})
+    return requests
+
+def _outline(prim):
+    line = prim.get("line", {})
+    if line.get("visible") is False:
+        return {"propertyState": "NOT_RENDERED"}, ["outline.propertyState"]
+    outline = {"outlineFill": _solid(line.get("color", DEFAULT_SHAPE_LINE)), "weight": _pt(line.get("weight", 0.75))}
+    return outline, ["outline.outlineFill.solidFill.color", "outline.weight"]
+
+def _shape_requests(page_id, object_id, prim):
+    kind = prim["kind"]
+    if kind == "line":
+        x1, y1, x2, y2 = prim["points"]
+        line = prim.get("line", {})
+        return [
+            {"createLine": {"objectId": object_id, "lineCategory": "STRAIGHT",
+                            "elementProperties": _element_properties(page_id, min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))}},
+            {"updateLineProperties": {"objectId": object_id,
+                                      "lineProperties": {"lineFill": _solid(line.get("color", DEFAULT_SHAPE_FILL)),
+                                                         "weight": _pt(line.get("weight", 0.75))},
+                                      "fields": "lineFill.solidFill.color,weight"}}
+        ]
+
+    left, top, width, height = prim["box"]
+    if width <= 0 or height <= 0:
+        # Slides rejects zero-sized shapes
+        return []
+    if kind == "table":
+        requests = [{"createTable": {"objectId": object_id, "rows": prim["rows"], "columns": prim["cols"],
+                                     "elementProperties": _element_properties(page_id, left, top, width, height)}}]
+        for (r, c), cell in sorted(prim["cells"].items()):
+            if "fill" in cell:
+                requests.append({"updateTableCellProperties": {
+                    "objectId": object_id,
+                    "tableRange": {"location": {"rowIndex": r - 1, "columnIndex": c - 1}, "rowSpan": 1, "columnSpan": 1},
+                    "tableCellProperties": {"tableCellBackgroundFill": _solid(cell["fill"])},
+                    "fields": "tableCellBackgroundFill.solidFill.color"
+                }})
+            requests.extend(_text_requests(object_id, cell, (0, 0, 0), cell=(r, c)))
+        return requests
+
+    if kind == "textbox":
+        requests = [{"createShape": {"objectId": object_id, "shapeType": "TEXT_BOX",
+                                     "elementProperties": _element_properties(page_id, left, top, width, height)}}]
+        return requests + _text_requests(object_id, prim, (0, 0, 0))
+
+    # Spell out PowerPoint's default fill and outline; Slides' defaults differ
+    outline, outline_fields = _outline(prim)
+    return [
+        {"createShape": {"objectId": object_id, "shapeType": SHAPE_TYPES.get(prim["shape"], "RECTANGLE"),
+                         "elementProperties": _element_properties(page_id, left, top, width, height)}},
+        {"updateShapeProperties": {"objectId": object_id,
+                                   "shapeProperties": {"shapeBackgroundFill": _solid(prim.get("fill", DEFAULT_SHAPE_FILL)),
+                                                       "outline": outline, "contentAlignment": "MIDDLE"},
+                                   "fields": ",".join(["shapeBackgroundFill.solidFill.color", "contentAlignment"] + outline_fields)}}
+    ] + _text_requests(object_id, prim, DEFAULT_SHAPE_TEXT)
+
+def _chart_options(prim):
+    """Sheets chart options for a chart primitive."""
+    options = {"legend": {"position": "bottom" if prim.get("legend") else "none"}}
+    series = prim["series"]
+    if all("color" in s for s in series):
+        options["colors"] = ["#%02x%02x%02x" % tuple(s["color"]) for s in series]
+    if "axis_max" in prim:
+        # The value axis is horizontal in a bar chart
+        options["hAxis" if prim["chart"] == "bar" else "vAxis"] = {"viewWindow": {"min": 0, "max": prim["axis_max"]}}
+    if prim.get("data_labels"):
+        if prim["chart"] == "pie":
+            options["pieSliceText"] = "value"
+        else:
+            options["series"] = {str(k): {"dataLabel": "value"} for k in range(len(series))}
+    font = prim.get("font", {})
+    if "name" in font:
+        options["fontName"] = font["name"]
+    if "size" in font:
+        options["fontSize"] = font["size"]
+    return options
+
+def build_requests(data, settings, pictures=None, charts=None):
+    """
+    Returns (requests, notes): the batchUpdate requests for the whole deck and
+    {slide object ID: speaker notes}, which the API can only set once the
+    slides exist. Images are appended to pictures, if given, as
+    [slide object ID, image reference, left, top, width, height], and charts
+    to charts as [slide object ID, chart type, left, top, width, height,
+    rows, options].
+    """
+    requests = []
+    notes = {}
+    for i, slide in enumerate(layout_deck(data, settings)):
+        page_id = f"s{i + 1:04d}"
+        requests.append({"createSlide": {"objectId": page_id, "slideLayoutReference": {"predefinedLayout": "BLANK"}}})
+        requests.append({"updatePageProperties": {"objectId": page_id,
+                                                  "pageProperties": {"pageBackgroundFill": _solid(slide["background"])},
+                                                  "fields": "pageBackgroundFill.solidFill.color"}})
+        for n, prim in enumerate(slide["shapes"]):
+            if prim["kind"] == "picture":
+                if pictures is not None:
+                    pictures.append([page_id, prim["image"]] + [round(v, 2) for v in prim["box"]])
+                continue
+            if prim["kind"] == "chart":
+                if charts is not None:
+                    rows = [["" if cell is None else cell for cell in row] for row in chart_table(prim)]
+                    charts.append([page_id, CHART_TYPES[prim["chart"]]] + [round(v, 2) for v in prim["box"]]
+                                  + [rows, _chart_options(prim)])
+                continue
+            requests.extend(_shape_requests(page_id, f"{page_id}_e{n + 1:03d}", prim))
+        if slide["notes"]:
+            notes[page_id] = slide["notes"]
+    return requests, notes
+
+OBJECT_ID = re.compile(r"^[a-zA-Z0-9_][a-zA-Z0-9_\-:]*$")
+REQUIRED = {
+    "createSlide": ("objectId",),
+    "updatePageProperties": ("objectId", "pageProperties", "fields"),
+    "createShape": ("objectId", "shapeType", "elementProperties"),
+    "createLine": ("objectId", "lineCategory", "elementProperties"),
+    "createTable": ("objectId", "rows", "columns", "elementProperties"),
+    "insertText": ("objectId", "text"),
+    "updateTextStyle": ("objectId", "style", "textRange", "fields"),
+    "updateParagraphStyle": ("objectId", "style", "textRange", "fields"),
+    "updateShapeProperties": ("objectId", "shapeProperties", "fields"),
+    "updateLineProperties": ("objectId", "lineProperties", "fields"),
+    "updateTableCellProperties": ("objectId", "tableRange", "tableCellProperties", "fields"),
+}
+TEXT_TARGETS = ("TEXT_BOX",) + tuple(SHAPE_TYPES.values())
+
+def _check_colors(value, path, errors):
+    if isinstance(value, dict):
+        if "rgbColor" in value:
+            for channel, level in value["rgbColor"].items():
+                if not isinstance(level, (int, float)) or not 0 <= level <= 1:
+                    errors.append(f"{path}: {channel} must be between 0 and 1")
+        for key, sub in value.items():
+            _check_colors(sub, f"{path}.{key}", errors)
+    elif isinstance(value, list):
+        for i, sub in enumerate(value):
+            _check_colors(sub, f"{path}[{i}]", errors)
+
+def validate_requests(requests):
+    """
+    Checks a request list offline, as far as it can be without the API:
+    request shapes, object ID rules and references, sizes, colours and cell
+    locations. Returns a list of error messages; empty means valid.
+    """
+    errors = []
+    objects = {} # object ID -> kind ("page", "table", "line" or a shape type)
+    tables = {}  # table ID -> (rows, columns)
+    for i, request in enumerate(requests):
+        path = f"requests[{i}]"
+        if not isinstance(request, dict) or len(request) != 1:
+            errors.append(f"{path}: expected exactly one request type")
+            continue
+        (kind, body), = request.items()
+        if kind not in REQUIRED:
+            errors.append(f"{path}: unsupported request {kind}")
+            continue
+        missing = [key for key in REQUIRED[kind] if key not in body]
+        if missing:
+            errors.append(f"{path}.{kind}: missing {', '.join(missing)}")
+            continue
+        _check_colors(body, f"{path}.{kind}", errors)
+        object_id = body["objectId"]
+
+        if kind.startswith("create"):
+            if not OBJECT_ID.match(object_id) or not 5 <= len(object_id) <= 50 - RUN_PREFIX_MAX:
+                errors.append(f"{path}.{kind}: invalid object ID {object_id!r}")
+            if object_id in objects:
+                errors.append(f"{path}.{kind}: duplicate object ID {object_id!r}")
+            if kind == "createSlide":
+                objects[object_id] = "page"
+                continue
+            props = body["elementProperties"]
+            page = props.get("pageObjectId")
+            if objects.get(page) != "page":
+                errors.append(f"{path}.{kind}: page {page!r} is not created before it is used")
+            size = props.get("size", {})
+            width = size.get("width", {}).get("magnitude")
+            height = size.get("height", {}).get("magnitude")
+            minimum = 0 if kind == "createLine" else 1e-9
+            if not isinstance(width, (int, float)) or not isinstance(height, (int, float)) or min(width, height) < minimum:
+                errors.append(f"{path}.{kind}: invalid size {width} x {height}")
+            if kind == "createTable":
+                if not (isinstance(body["rows"], int) and body["rows"] > 0 and isinstance(body["columns"], int) and body["columns"] > 0):
+                    errors.append(f"{path}.createTable: rows and columns must be positive")
+                tables[object_id] = (body["rows"], body["columns"])
+                objects[object_id] = "table"
+            else:
+                objects[object_id] = "line" if kind == "createLine" else body["shapeType"]
+            continue
+
+        target = objects.get(object_id)
+        if target is None:
+            errors.append(f"{path}.{kind}: object {object_id!r} is not created before it is used")
+            continue
+        if not body.get("fields", True):
+            errors.append(f"{path}.{kind}: empty fields mask")
+        expected = {
+            "updatePageProperties": ("page",),
+            "updateShapeProperties": TEXT_TARGETS,
+            "updateLineProperties": ("line",),
+            "updateTableCellProperties": ("table",),
+        }.get(kind, TEXT_TARGETS + ("table",))
+        if target not in expected:
+            errors.append(f"{path}.{kind}: not applicable to {target} {object_id!r}")
+            continue
+        location = body.get("cellLocation") or body.get("tableRange", {}).get("location")
+        if target == "table":
+            rows, cols = tables[object_id]
+            if not location or not (0 <= location.get("rowIndex", -1) < rows and 0 <= location.get("columnIndex", -1) < cols):
+                errors.append(f"{path}.{kind}: cell {location} outside the {rows}x{cols} table")
+        elif location:
+            errors.append(f"{path}.{kind}: cell location on a non-table object")
+        if kind == "insertText" and not body["text"]:
+            errors.append(f"{path}.insertText: empty text")
+    return errors
+
+SCRIPT = """\
+/**
+ * Builds the slides in the open Google Slides presentation.
+ *
+ * 1. Open (or create) a presentation. For the same proportions as the
+ *    PowerPoint macro, set File > Page setup > Custom 29.7 x 21 cm.
+ * 2. Extensions > Apps Script, paste this file and add the "Google Slides
+ *    API" advanced service (Services > +).
+ * 3. Run createPresentation.
+ */
+var REQUESTS = {requests};
+var NOTES = {notes};
+// [slide ID, image, left, top, width, height]; IMAGES holds each image once as [MIME type, base64]
+var PICTURES = {pictures};
+var IMAGES = {images};
+// [slide ID, chart type, left, top, width, height, data rows with a header row, Sheets chart options]
+var CHARTS = {charts};
+var SOURCE_WIDTH = {width};
+var BATCH_SIZE = {batch_size};
+
+function createPresentation() {{
+  var presentation = SlidesApp.getActivePresentation();
+  var id = presentation.getId();
+  var run = 'r' + Date.now().toString(36) + '_';
+  var scale = presentation.getPageWidth() / SOURCE_WIDTH;
+  var requests = adapt(REQUESTS, scale, run);
+  for (var i = 0; i < requests.length; i += BATCH_SIZE) {{
+    Slides.Presentations.batchUpdate({{requests: requests.slice(i, i + BATCH_SIZE)}}, id);
+  }}
+  // Speaker notes need the notes page, which exists only once the slide does
+  presentation = SlidesApp.openById(id);
+  Object.keys(NOTES).forEach(function (slideId) {{
+    presentation.getSlideById(run + slideId).getNotesPage().getSpeakerNotesShape().getText().setText(NOTES[slideId]);
+  }});
+  // Each image is decoded once, however many slides use it
+  var blobs = {{}};
+  PICTURES.forEach(function (p) {{
+    if (!blobs[p[1]]) blobs[p[1]] = Utilities.newBlob(Utilities.base64Decode(IMAGES[p[1]][1]), IMAGES[p[1]][0], p[1]);
+    presentation.getSlideById(run + p[0]).insertImage(blobs[p[1]], p[2] * scale, p[3] * scale, p[4] * scale, p[5] * scale);
+  }});
+  // Each chart's data goes to its own sheet in one write, however many points it has
+  if (CHARTS.length) {{
+    var book = SpreadsheetApp.create(presentation.getName() + ' (chart data)');
+    CHARTS.forEach(function (c, k) {{
+      var sheet = k ? book.insertSheet() : book.getSheets()[0];
+      var range = sheet.getRange(1, 1, c[6].length, c[6][0].length);
+      // Labels stay text, so a year isn't taken for a value
+      sheet.getRange(1, 1, 1, c[6][0].length).setNumberFormat('@');
+      sheet.getRange(1, 1, c[6].length, 1).setNumberFormat('@');
+      range.setValues(c[6]);
+      var builder = sheet.newChart().setChartType(Charts.ChartType[c[1]]).addRange(range)
+          .setNumHeaders(1).setPosition(1, c[6][0].length + 2, 0, 0);
+      Object.keys(c[7]).forEach(function (key) {{ builder.setOption(key, c[7][key]); }});
+      sheet.insertChart(builder.build());
+      presentation.getSlideById(run + c[0]).insertSheetsChart(sheet.getCharts()[0], c[2] * scale, c[3] * scale, c[4] * scale, c[5] * scale);
+    }});
+  }}
+}}
+
+// Scales point sizes and positions to the page and makes object IDs unique to this run
+function adapt(value, scale, run) {{
+  if (Array.isArray(value)) {{
+    return value.map(function (item) {{ return adapt(item, scale, run); }});
+  }}
+  if (value === null || typeof value !== 'object') return value;
+  var out = {{}};
+  Object.keys(value).forEach(function (key) {{
+    var item = value[key];
+    if (/bjectId$/.test(key) && typeof item === 'string') {{
+      out[key] = run + item;
+    }} else if ((key === 'magnitude' && value.unit === 'PT') || key === 'translateX' || key === 'translateY') {{
+      out[key] = item * scale;
+    }} else {{
+      out[key] = adapt(item, scale, run);
+    }}
+  }});
+  return out;
+}}
+"""
+
+def json_to_gas(data, settings, images=None):
+    """
+    The deck as an Apps Script for Google Slides (see SCRIPT). images is
+    {image reference: bytes} for the slides' uploaded images; pictures
+    without their image are left out.
+    """
+    if not data:
+        return ""
+    images = images or {}
+    pictures = []
+    charts = []
+    requests, notes = build_requests(data, settings, pictures, charts)
+    pictures = [p for p in pictures if p[1] in images]
+    embedded = {ref: [mime_type(ref), base64.b64encode(images[ref]).decode("ascii")]
+                for ref in sorted({p[1] for p in pictures})}
+    return SCRIPT.format(
+        requests=json.dumps(requests, ensure_ascii=False, separators=(",", ":")),
+        notes=json.dumps(notes, ensure_ascii=False, separators=(",", ":")),
+        pictures=json.dumps(pictures, separators=(",", ":")),
+        images=json.dumps(embedded, separators=(",", ":")),
+        charts=json.dumps(charts, ensure_ascii=False, separators=(",", ":")),
+        width=PPTConfig.SLIDE_WIDTH_PT,
+        batch_size=BATCH_SIZE
+    )
@@ -0,0 +1,11 @@
+# gunicorn loads this file automatically from the working directory.
+
+# Import the app once in the master and fork workers from it. create_app()
+# opens nothing, and per-process state (deck store, admission, connection
+# pools, STATE_BACKEND connections) is created in each worker on first use.
+preload_app = True
+
+def post_fork(server, worker):
+    # Each worker opens its own keep-alive connections to the model API
+    from llm_backends import warm_up
+    warm_up()
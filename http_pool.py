@@ -0,0 +1,172 @@
+import http.client
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+# Keep-alive HTTP(S) connections for the model API, shared by every request
+# in a worker process. Opening a fresh TLS connection per call costs a TCP
+# and a TLS handshake (two or more round trips) before the first byte; a
+# pooled connection skips both.
+#
+# Configuration (environment):
+#   LLM_POOL_SIZE          idle connections kept per host (default 16)
+#   LLM_POOL_IDLE_TIMEOUT  seconds an idle connection may be reused (default 60)
+#   LLM_POOL_WARM          connections opened by warm_up() at worker start (default 2)
+#   LLM_CONNECT_TIMEOUT    seconds for connect + TLS handshake (default 10)
+#   LLM_CA_FILE            extra CA bundle, e.g. for a local TLS stub
+
+DEFAULT_POOL_SIZE = 16
+
+class PoolError(OSError):
+    pass
+
+class _Response:
+    """A finished or streaming response; read() and iteration work as on http.client."""
+
+    def __init__(self, resp):
+        self._resp = resp
+        self.status = resp.status
+        self.headers = resp.headers
+
+    def read(self):
+        return self._resp.read()
+
+    def __iter__(self):
+        return iter(self._resp)
+
+class HTTPPool:
+    """
+    A LIFO pool of keep-alive connections to one origin. LIFO keeps the most
+    recently used (and so most likely still open) connection hot; connections
+    beyond `size` are closed after use rather than kept idle.
+    """
+
+    def __init__(self, base_url, size=None, timeout=60.0, connect_timeout=None, idle_timeout=None, context=None):
+        url = urllib.parse.urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.size = DEFAULT_POOL_SIZE if size is None else size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or float(os.environ.get("LLM_CONNECT_TIMEOUT", 10))
+        self.idle_timeout = idle_timeout or float(os.environ.get("LLM_POOL_IDLE_TIMEOUT", 60))
+        if self.scheme == "https" and context is None:
+            context = ssl.create_default_context(cafile=os.environ.get("LLM_CA_FILE"))
+        self.context = context
+        self._idle = [] # [(connection, last_used)]
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "discarded": 0}
+
+    def _new_connection(self):
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout, context=self.context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.timeout)
+        # Headers and body go out as separate writes; don't let Nagle hold the body back
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self.stats["opened"] += 1
+        return conn
+
+    def _checkout(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self.stats["reused"] += 1
+                    return conn, True
+                conn.close()
+                self.stats["discarded"] += 1
+        return self._new_connection(), False
+
+    def _checkin(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def warm(self, n):
+        """Opens up to n connections ahead of the first request."""
+        conns = []
+        try:
+            for _ in range(min(n, self.size)):
+                conns.append(self._new_connection())
+        finally:
+            for conn in conns:
+                self._checkin(conn)
+        return len(conns)
+
+    @contextmanager
+    def open(self, method, path, body=None, headers=None):
+        """
+        Sends a request and yields the response. The connection goes back to
+        the pool once the body has been read; a reused connection that turns
+        out to be closed by the server is replaced once, transparently.
+        """
+        for attempt in range(2):
+            conn, reused = self._checkout()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise PoolError(f"{method} {path} failed: {e}") from e
+            except OSError as e:
+                conn.close()
+                raise PoolError(f"{method} {path} failed: {e}") from e
+            break
+
+        try:
+            yield _Response(resp)
+            # Drain whatever the caller left so the connection can be reused
+            resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(conn)
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, body bytes)."""
+        with self.open(method, path, body, headers) as resp:
+            return resp.status, resp.read()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+def get_pool(base_url, timeout=60.0):
+    """The process-wide pool for base_url. Pools are never shared across a fork."""
+    global _pools_pid
+    with _pools_lock:
+        if os.getpid() != _pools_pid:
+            # Sockets inherited from the parent belong to the parent
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = HTTPPool(base_url, size=int(os.environ.get("LLM_POOL_SIZE", DEFAULT_POOL_SIZE)), timeout=timeout)
+            _pools[base_url] = pool
+        return pool
+
+def pool_stats():
+    with _pools_lock:
+        return {url: dict(pool.stats, idle=len(pool._idle)) for url, pool in _pools.items()}
@@ -0,0 +1,207 @@
+import hashlib
+import io
+import os
+import re
+import struct
+import warnings
+import zipfile
+
+try:
+    from PIL import Image, ImageOps # optional; without it images are stored as uploaded
+except ImportError:
+    Image = None
+
+from config import PPTConfig
+
+# Images for imageText slides. An upload is decoded, scaled down to fit the
+# slide's image area at IMAGE_DPI, recompressed (PNG for flat graphics and
+# anything transparent, JPEG for photos) and stored under a content-addressed
+# reference, so the same logo on 100 slides is one stored image, one file in
+# the download and one decode in the generated script.
+#
+# A reference is "<sha256 prefix>-<width>x<height>.<png|jpg>": the layout can
+# size the picture from the reference alone, and anything the model invents
+# in the field simply doesn't parse (see parse_ref).
+#
+# Configuration (environment):
+#   IMAGE_DPI           resolution images are scaled to on the slide (default 150)
+#   IMAGE_MAX_BYTES     largest accepted image upload (default 10 MB)
+#   IMAGE_MAX_PIXELS    largest decoded image, against decompression bombs (default 40 million)
+#   IMAGE_JPEG_QUALITY  quality of recompressed photos (default 85)
+#   IMAGE_TTL           seconds an image is kept after its last upload (default DECK_STORE_TTL or 24 h)
+
+DEFAULT_DPI = 150
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 40 * 1000 * 1000
+DEFAULT_JPEG_QUALITY = 85
+DEFAULT_TTL = 24 * 3600
+# Images with at most this many colours are kept as (palette) PNG
+FLAT_COLORS = 256
+
+REF = re.compile(r"^([0-9a-f]{32})-(\d{1,5})x(\d{1,5})\.(png|jpg)$")
+MIME_TYPES = {"png": "image/png", "jpg": "image/jpeg"}
+INPUT_FORMATS = ("PNG", "JPEG", "GIF", "WEBP")
+
+class ImageError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def parse_ref(ref):
+    """(width, height) in pixels of a valid image reference, else None."""
+    m = REF.match(ref or "")
+    if not m:
+        return None
+    width, height = int(m.group(2)), int(m.group(3))
+    return (width, height) if width and height else None
+
+def mime_type(ref):
+    return MIME_TYPES[ref.rsplit(".", 1)[1]]
+
+def fit_box(box, width, height):
+    """The largest box of the image's proportions centred in box (left, top, width, height)."""
+    left, top, box_w, box_h = box
+    scale = min(box_w / width, box_h / height)
+    w, h = width * scale, height * scale
+    return (left + (box_w - w) / 2, top + (box_h - h) / 2, w, h)
+
+def target_pixels(dpi=None):
+    """Pixel size of the imageText image area at dpi."""
+    dpi = dpi or int(os.environ.get("IMAGE_DPI", DEFAULT_DPI))
+    area = PPTConfig.POS_PX["imageTextSlide"]["imageArea"]
+    return (round(PPTConfig.px_to_pt(area["width"]) / 72 * dpi),
+            round(PPTConfig.px_to_pt(area["height"]) / 72 * dpi))
+
+def _sniff(data):
+    """(extension, width, height) from a PNG or JPEG header, for servers without Pillow."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return "png", width, height
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                break
+            marker = data[i + 1]
+            length = struct.unpack(">H", data[i + 2:i + 4])[0]
+            # SOF0-SOF15 carry the size, except DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return "jpg", width, height
+            i += 2 + length
+    raise ImageError("Unsupported image. Use PNG or JPEG.", 415)
+
+def _recompress(data, size, max_pixels, quality):
+    try:
+        # Only the header is read here, so the pixel count is checked before decoding
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            img = Image.open(io.BytesIO(data), formats=INPUT_FORMATS)
+        if img.width * img.height > max_pixels:
+            raise ImageError("The image has too many pixels.", 413)
+        # JPEG: decode at a reduced scale when that is still large enough (either orientation)
+        img.draft(None, (max(size), max(size)))
+        img = ImageOps.exif_transpose(img)
+    except ImageError:
+        raise
+    except Image.DecompressionBombError:
+        raise ImageError("The image has too many pixels.", 413)
+    except Image.UnidentifiedImageError:
+        raise ImageError("Unsupported image. Use PNG, JPEG, GIF or WebP.", 415)
+    except Exception as e:
+        raise ImageError(f"The image could not be read: {e}", 415)
+
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    if img.width > size[0] or img.height > size[1]:
+        img.thumbnail(size, Image.LANCZOS)
+    out = io.BytesIO()
+    colors = img.getcolors(FLAT_COLORS)
+    if has_alpha or colors is not None:
+        if colors is not None and not has_alpha:
+            img = img.quantize(len(colors))
+        img.save(out, "PNG", optimize=True)
+        extension = "png"
+    else:
+        img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        extension = "jpg"
+    return extension, img.width, img.height, out.getvalue()
+
+def process_image(data, dpi=None, max_pixels=None, quality=None):
+    """
+    Prepares uploaded image bytes for the slides. Returns (ref, bytes, stats);
+    raises ImageError.
+    """
+    if len(data) > int(os.environ.get("IMAGE_MAX_BYTES", DEFAULT_MAX_BYTES)):
+        raise ImageError("The image is too large.", 413)
+    size = target_pixels(dpi)
+    if Image is not None:
+        extension, width, height, out = _recompress(
+            data, size,
+            max_pixels or int(os.environ.get("IMAGE_MAX_PIXELS", DEFAULT_MAX_PIXELS)),
+            quality or int(os.environ.get("IMAGE_JPEG_QUALITY", DEFAULT_JPEG_QUALITY)))
+    else:
+        # Stored as uploaded: correct, just larger than it needs to be
+        extension, width, height = _sniff(data)
+        out = data
+    ref = f"{hashlib.sha256(out).hexdigest()[:32]}-{width}x{height}.{extension}"
+    stats = {"upload_bytes": len(data), "stored_bytes": len(out), "width": width, "height": height,
+             "resized": Image is not None}
+    return ref, out, stats
+
+class ImageStore:
+    """
+    Processed images in the state backend (state_backend.py), by reference.
+    A repeated upload of the same file is recognised by its hash and not
+    processed again.
+    """
+
+    def __init__(self, state, ttl=DEFAULT_TTL):
+        self.state = state
+        self.ttl = ttl
+
+    def put(self, data):
+        """Stores uploaded bytes; returns (ref, stats)."""
+        source_key = "imgsrc:" + hashlib.sha256(data).hexdigest()
+        known = self.state.get(source_key)
+        if known is not None:
+            ref = known.decode("ascii")
+            if self.state.get("img:" + ref) is not None:
+                self.state.expire("img:" + ref, self.ttl)
+                self.state.expire(source_key, self.ttl)
+                return ref, {"upload_bytes": len(data), "deduplicated": True}
+        ref, out, stats = process_image(data)
+        self.state.set("img:" + ref, out, self.ttl)
+        self.state.set(source_key, ref.encode("ascii"), self.ttl)
+        return ref, stats
+
+    def get(self, ref):
+        if parse_ref(ref) is None:
+            return None
+        return self.state.get("img:" + ref)
+
+    def deck_images(self, slides):
+        """{ref: bytes} for every image the slides use, each once; missing images are left out."""
+        images = {}
+        for slide in slides:
+            ref = slide.get("image") if isinstance(slide, dict) else None
+            if ref and ref not in images and parse_ref(ref) is not None:
+                data = self.get(ref)
+                if data is not None:
+                    images[ref] = data
+        return images
+
+def get_image_store(state):
+    ttl = float(os.environ.get("IMAGE_TTL") or os.environ.get("DECK_STORE_TTL") or DEFAULT_TTL)
+    return ImageStore(state, ttl)
+
+def sidecar_zip(name, text, images, folder="images"):
+    """A zip with the script text as name and every image once under folder/."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as archive:
+        archive.writestr(name, text.encode("utf-8"), zipfile.ZIP_DEFLATED)
+        # PNG and JPEG are compressed already
+        for ref, data in sorted(images.items()):
+            archive.writestr(f"{folder}/{ref}", data, zipfile.ZIP_STORED)
+    return out.getvalue()
@@ -0,0 +1,297 @@
+import io
+import os
+import re
+import time
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    import pypdf # optional; needed for PDF uploads only
+except ImportError:
+    pypdf = None
+
+from text_preprocess import PAGE_BREAK
+
+# Text extraction for uploaded documents (/preview's "document" field).
+# Every extractor reads its input incrementally and stops at the limits
+# below, so memory stays bounded however large the upload is: Werkzeug
+# spools the upload to a temporary file, DOCX XML is parsed with iterparse
+# and discarded paragraph by paragraph, Markdown and text are read line by
+# line, and PDFs one page at a time.
+#
+# The output is Markdown-like plain text: headings become "# ..." lines and
+# every paragraph is separated by a blank line, the structure that
+# text_preprocess and source_text.split_paragraphs work on. PDF pages are
+# separated by PAGE_BREAK, so text_preprocess can tell running headers and
+# footers from content; it removes the marks.
+#
+# Configuration (environment):
+#   UPLOAD_MAX_BYTES     largest accepted upload (default 20 MB; enforced by Flask)
+#   INGEST_MAX_CHARS     extracted text kept; the rest is cut (default 400000)
+#   INGEST_MAX_EXPANDED  bytes read from inside a DOCX, against zip bombs (default 200 MB)
+#   INGEST_MAX_PAGES     PDF pages read (default 500)
+#   INGEST_TIMEOUT       seconds spent extracting (default 20)
+
+DEFAULT_MAX_UPLOAD = 20 * 1024 * 1024
+DEFAULT_MAX_CHARS = 400000
+DEFAULT_MAX_EXPANDED = 200 * 1024 * 1024
+DEFAULT_MAX_PAGES = 500
+DEFAULT_TIMEOUT = 20.0
+READ_CHUNK = 64 * 1024
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+class IngestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Limits:
+    def __init__(self, max_chars=None, max_expanded=None, max_pages=None, timeout=None):
+        env = os.environ.get
+        self.max_chars = max_chars or int(env("INGEST_MAX_CHARS", DEFAULT_MAX_CHARS))
+        self.max_expanded = max_expanded or int(env("INGEST_MAX_EXPANDED", DEFAULT_MAX_EXPANDED))
+        self.max_pages = max_pages or int(env("INGEST_MAX_PAGES", DEFAULT_MAX_PAGES))
+        self.timeout = timeout or float(env("INGEST_TIMEOUT", DEFAULT_TIMEOUT))
+
+def max_upload_bytes():
+    return int(os.environ.get("UPLOAD_MAX_BYTES", DEFAULT_MAX_UPLOAD))
+
+class _Output:
+    """Collects paragraphs up to max_chars and enforces the deadline."""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.parts = []
+        self.chars = 0
+        self.truncated = False
+        self.deadline = time.monotonic() + limits.timeout
+
+    def check_time(self):
+        if time.monotonic() > self.deadline:
+            raise IngestError(f"Reading the document took longer than {self.limits.timeout:g} seconds.", 422)
+
+    def add(self, paragraph):
+        """Adds one paragraph; returns False once the character limit is reached."""
+        paragraph = paragraph.strip()
+        if not paragraph:
+            return True
+        room = self.limits.max_chars - self.chars
+        if len(paragraph) > room:
+            if room > 0:
+                self.parts.append(paragraph[:room])
+            self.chars = self.limits.max_chars
+            self.truncated = True
+            return False
+        self.parts.append(paragraph)
+        self.chars += len(paragraph) + 2
+        return True
+
+    def page_break(self):
+        if self.parts and self.parts[-1] != PAGE_BREAK:
+            self.parts.append(PAGE_BREAK)
+
+    def text(self):
+        return "\n\n".join(self.parts)
+
+class _CappedReader(io.RawIOBase):
+    """Raises once more than limit bytes were read from the wrapped stream."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.read_bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.read_bytes += len(data)
+        if self.read_bytes > self.limit:
+            raise IngestError("The document expands to more data than allowed.", 413)
+        buffer[:len(data)] = data
+        return len(data)
+
+def _docx_heading_levels(archive, limits):
+    """styleId -> heading level, from word/styles.xml (styles are named "heading 1" etc. in every language)."""
+    levels = {}
+    try:
+        with archive.open("word/styles.xml") as f:
+            capped = io.BufferedReader(_CappedReader(f, limits.max_expanded), READ_CHUNK)
+            root = ElementTree.parse(capped).getroot()
+    except KeyError:
+        return levels
+    except ElementTree.ParseError as e:
+        raise IngestError(f"The .docx file is damaged: {e}")
+    for style in root.iter(W + "style"):
+        style_id = style.get(W + "styleId")
+        name = style.find(W + "name")
+        name = (name.get(W + "val") if name is not None else "").lower()
+        outline = style.find(f"{W}pPr/{W}outlineLvl")
+        m = re.fullmatch(r"heading (\d)", name)
+        if name == "title":
+            levels[style_id] = 1
+        elif m:
+            levels[style_id] = int(m.group(1))
+        elif outline is not None and outline.get(W + "val", "").isdigit():
+            levels[style_id] = int(outline.get(W + "val")) + 1
+    return levels
+
+def _docx_paragraph(p, levels):
+    parts = []
+    for node in p.iter():
+        if node.tag == W + "t" and node.text:
+            parts.append(node.text)
+        elif node.tag == W + "tab":
+            parts.append("\t")
+        elif node.tag in (W + "br", W + "cr"):
+            parts.append("\n")
+    text = "".join(parts).strip()
+    if not text:
+        return ""
+    level = None
+    style = p.find(f"{W}pPr/{W}pStyle")
+    if style is not None:
+        level = levels.get(style.get(W + "val"))
+    outline = p.find(f"{W}pPr/{W}outlineLvl")
+    if outline is not None and outline.get(W + "val", "").isdigit():
+        level = int(outline.get(W + "val")) + 1
+    if level and level <= 9:
+        return "#" * min(level, 6) + " " + " ".join(text.split())
+    return text
+
+def extract_docx(stream, limits):
+    out = _Output(limits)
+    try:
+        archive = zipfile.ZipFile(stream)
+        member = archive.open("word/document.xml")
+    except (zipfile.BadZipFile, KeyError):
+        raise IngestError("This is not a valid .docx file.")
+    levels = _docx_heading_levels(archive, limits)
+    capped = io.BufferedReader(_CappedReader(member, limits.max_expanded), READ_CHUNK)
+    body = None
+    depth = 0
+    try:
+        for event, elem in ElementTree.iterparse(capped, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if elem.tag == W + "body":
+                    body = elem
+                continue
+            depth -= 1
+            if elem.tag == W + "p":
+                if not out.add(_docx_paragraph(elem, levels)):
+                    break
+                # Cleared so an enclosing paragraph (text box) doesn't repeat it
+                elem.clear()
+            if depth == 2 and body is not None:
+                # A finished top-level block (paragraph or table): drop it from the tree
+                body.clear()
+                out.check_time()
+    except ElementTree.ParseError as e:
+        raise IngestError(f"The .docx file is damaged: {e}")
+    finally:
+        member.close()
+    return out
+
+def extract_markdown(stream, limits):
+    """Markdown or plain text, read line by line. Paragraphs are runs of lines between blank lines."""
+    out = _Output(limits)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline=None)
+    paragraph, size = [], 0
+    # readline's limit keeps one enormous line from being read whole
+    for i, line in enumerate(iter(lambda: text.readline(READ_CHUNK), "")):
+        line = line.rstrip()
+        if not line.strip() or line.lstrip().startswith("#"):
+            if paragraph and not out.add("\n".join(paragraph)):
+                break
+            paragraph, size = [], 0
+            # A heading is a paragraph of its own
+            if line.strip() and not out.add(line.strip()):
+                break
+        else:
+            paragraph.append(line)
+            size += len(line) + 1
+            if size > limits.max_chars and not out.add("\n".join(paragraph)):
+                break
+        if i % 1000 == 0:
+            out.check_time()
+    else:
+        out.add("\n".join(paragraph))
+    text.detach()
+    return out
+
+def _pdf_outline_titles(reader):
+    """page index -> ["# title", ...] from the PDF's bookmarks, the only heading structure a PDF carries."""
+    titles = {}
+    def walk(entries, level):
+        for entry in entries:
+            if isinstance(entry, list):
+                walk(entry, level + 1)
+                continue
+            try:
+                page = reader.get_destination_page_number(entry)
+            except Exception:
+                continue
+            titles.setdefault(page, []).append("#" * min(level, 6) + " " + " ".join(str(entry.title).split()))
+    try:
+        walk(reader.outline, 1)
+    except Exception as e:
+        print(f"DEBUG: ignoring unreadable PDF outline: {e}")
+    return titles
+
+def extract_pdf(stream, limits):
+    if pypdf is None:
+        raise IngestError("PDF upload needs the pypdf package on the server.", 415)
+    out = _Output(limits)
+    try:
+        reader = pypdf.PdfReader(stream)
+        titles = _pdf_outline_titles(reader)
+        for i, page in enumerate(reader.pages):
+            if i >= limits.max_pages:
+                out.truncated = True
+                break
+            out.check_time()
+            out.page_break()
+            for title in titles.get(i, []):
+                out.add(title)
+            # Blank lines in the text layer separate paragraphs; single newlines are line wraps
+            if not all(out.add(block) for block in re.split(r"\n\s*\n", page.extract_text() or "")):
+                break
+    except IngestError:
+        raise
+    except Exception as e:
+        # pypdf raises more than PdfReadError on malformed files (ValueError, KeyError, ...)
+        print(f"DEBUG: PDF parse failed: {type(e).__name__}: {e}")
+        raise IngestError(f"The PDF file could not be read: {e}")
+    if not out.parts:
+        raise IngestError("The PDF has no text layer (scanned pages are not supported).", 422)
+    return out
+
+EXTRACTORS = {
+    ".docx": extract_docx,
+    ".md": extract_markdown,
+    ".markdown": extract_markdown,
+    ".txt": extract_markdown,
+    ".pdf": extract_pdf,
+}
+
+def extract_text(stream, filename, limits=None):
+    """
+    Text of an uploaded document. stream is a binary file object (seekable
+    for .docx and .pdf). Returns (text, stats); raises IngestError.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in EXTRACTORS:
+        raise IngestError(f"Unsupported file type: {extension or filename}. Use .docx, .pdf, .md or .txt.", 415)
+    limits = limits or Limits()
+    start = time.perf_counter()
+    out = EXTRACTORS[extension](stream, limits)
+    stats = {
+        "document_chars": out.chars,
+        "document_truncated": out.truncated,
+        "ingest_seconds": round(time.perf_counter() - start, 3)
+    }
+    return out.text(), stats
@@ -0,0 +1,169 @@
+import json
+
+from slide_schema import EDITOR_FIELDS, normalize_slide
+
+# Tolerant parsing of model output. Instead of failing the whole response on a
+# trailing comma or a truncated array (and paying for another model call), the
+# text is cleaned in one pass and every complete slide object is kept.
+
+SMART_OPEN = "“„"
+SMART_CLOSE = "”"
+
+def _strip_fences(text):
+    for fence in ("```json", "```"):
+        start = text.find(fence)
+        if start != -1:
+            body = text[start + len(fence):]
+            end = body.find("```")
+            # A missing closing fence means the answer was cut off
+            return body if end == -1 else body[:end]
+    return text
+
+def _normalize(text):
+    """
+    One pass over the text outside of string literals:
+    - smart quotes used as string delimiters become plain quotes
+    - commas directly before a closing bracket are dropped
+    Raw control characters inside strings are left for json.loads(strict=False).
+    """
+    out = []
+    i = 0
+    n = len(text)
+    delimiter = None # None outside strings, otherwise the closing quote(s)
+    while i < n:
+        ch = text[i]
+        if delimiter is not None:
+            if ch == "\\" and i + 1 < n:
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if ch in delimiter:
+                out.append('"')
+                delimiter = None
+            elif ch == '"':
+                # Plain quote inside a smart-quoted string
+                out.append('\\"')
+            else:
+                out.append(ch)
+        elif ch == '"':
+            delimiter = '"'
+            out.append(ch)
+        elif ch in SMART_OPEN or ch == SMART_CLOSE:
+            delimiter = SMART_CLOSE + SMART_OPEN
+            out.append('"')
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j < n and text[j] in "]}":
+                i = j
+                continue
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+def _loads(text):
+    return json.loads(text, strict=False)
+
+def _array_elements(text, start):
+    """
+    Yields the source of each complete top-level element of the array opening
+    at text[start]. Stops quietly at a truncated element.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    element_start = None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+            if depth == 1 and element_start is None:
+                element_start = i
+        elif ch in "[{":
+            depth += 1
+            if depth == 2 and element_start is None:
+                element_start = i
+        elif ch in "]}":
+            depth -= 1
+            if depth == 1 and element_start is not None:
+                yield text[element_start:i + 1]
+                element_start = None
+            elif depth == 0:
+                if element_start is not None:
+                    yield text[element_start:i]
+                return
+        elif depth == 1 and ch == "," and element_start is not None:
+            # Scalar element
+            yield text[element_start:i]
+            element_start = None
+        elif depth == 1 and element_start is None and not ch.isspace() and ch != ",":
+            element_start = i
+
+def _first_bracket(text):
+    positions = [p for p in (text.find("["), text.find("{")) if p != -1]
+    return min(positions) if positions else -1
+
+def extract_json(text):
+    """
+    Parses a model answer as JSON, repairing fences, smart quotes and trailing
+    commas. A truncated top-level array yields its complete elements.
+    Raises ValueError when nothing usable is found.
+    """
+    text = _normalize(_strip_fences(text))
+    start = _first_bracket(text)
+    if start == -1:
+        raise ValueError("No JSON value found in model output")
+    try:
+        return _loads(text[start:].strip())
+    except ValueError:
+        pass
+    try:
+        # Trailing prose after the value
+        return json.JSONDecoder(strict=False).raw_decode(text, start)[0]
+    except ValueError:
+        pass
+    if text[start] == "[":
+        elements = []
+        for source in _array_elements(text, start):
+            try:
+                elements.append(_loads(source))
+            except ValueError:
+                continue
+        if elements:
+            return elements
+    raise ValueError("Could not repair model output as JSON")
+
+def clean_slides(data):
+    """
+    Keeps every usable slide object, normalized against its type's schema
+    (see slide_schema.normalize_slide) and without editor-only fields.
+    Returns (slides, dropped_count).
+    """
+    if isinstance(data, dict):
+        data = data["slides"] if isinstance(data.get("slides"), list) else [data]
+    if not isinstance(data, list):
+        return [], 0
+
+    slides = [normalize_slide({key: value for key, value in slide.items() if key not in EDITOR_FIELDS})
+              for slide in data if isinstance(slide, dict)]
+    return slides, len(data) - len(slides)
+
+def extract_slides(text):
+    """Parses a whole-deck answer into a list of slide dicts. Raises ValueError if there are none."""
+    slides, dropped = clean_slides(extract_json(text))
+    if dropped:
+        print(f"DEBUG: Dropped {dropped} malformed slide entries")
+    if not slides:
+        raise ValueError("No slides found in model output")
+    return slides
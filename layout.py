@@ -0,0 +1,622 @@
+from functools import lru_cache
+
+from config import PPTConfig, ColorUtils
+from image_pipeline import fit_box, parse_ref
+from pagination import paginate_slide
+from slide_schema import normalize_slide
+
+# Slide layout shared by every renderer. draw_slide() places one normalized
+# slide on a canvas, in points, with raw (unescaped) text and (r, g, b)
+# colours, so the preview, the macro and the Apps Script always agree.
+# A canvas has one method per primitive kind below (textbox, shape, line,
+# table, picture, chart), taking the primitive's keys as arguments.
+# ShapeList keeps the primitives as dicts, for svg_renderer and gas_backend
+# (see layout_slide); json_to_vba draws on a canvas that writes macro lines
+# straight away, so the macro is built without a dict per shape.
+#
+# A primitive is a dict with a "kind":
+#   textbox  "box": (left, top, width, height)
+#   shape    "box" and "shape": the msoAutoShapeType (1 rectangle, 5 rounded
+#            rectangle, 9 oval, 33 right arrow, 66 down arrow)
+#   line     "points": (x1, y1, x2, y2)
+#   table    "box", "rows", "cols" and "cells": {(row, col): cell}, 1-based,
+#            where a cell may have "text", "font" and "fill"
+#   picture  "box" and "image": an image reference (image_pipeline.py); the
+#            box already has the image's proportions
+#   chart    "box", "chart" (one of CHART_TYPES), "categories": [str] and
+#            "series": [{"name", "values", "color"}] with one value (or None)
+#            per category; optional "axis_max" (the value axis is scaled
+#            automatically without it), "legend" and "data_labels". Renderers
+#            pass the data as one block (chart_table), so a chart is a single
+#            object however many points it has
+# and any of the style keys below. A missing key means PowerPoint's default.
+#   text     str, lines separated by "\n" (paragraphs) or "\r\n" (line breaks)
+#   font     {"name", "size", "bold", "italic", "color"}
+#   fill     (r, g, b)
+#   line     {"visible": False} or {"color": (r, g, b), "weight": pt}
+#   align    1 left, 2 center, 3 right
+#   autofit  True to shrink the text to fit the shape
+
+WHITE = (255, 255, 255)
+
+# What PowerPoint gives a shape that sets no style of its own (Office theme),
+# for renderers that have to spell every style out
+DEFAULT_FONT_SIZE = 18
+DEFAULT_SHAPE_FILL = (68, 114, 196)   # accent 1
+DEFAULT_SHAPE_LINE = (47, 82, 143)
+DEFAULT_SHAPE_TEXT = WHITE
+DEFAULT_TEXT = (0, 0, 0)
+
+@lru_cache(maxsize=256)
+def rgb(hex_color):
+    try:
+        return ColorUtils.hex_to_rgb(hex_color)
+    except Exception:
+        return (0, 0, 0)
+
+@lru_cache(maxsize=256)
+def lighten(hex_color, amount):
+    """ColorUtils.lighten_color as (r, g, b)."""
+    return rgb(ColorUtils.lighten_color(hex_color, amount))
+
+# PPTConfig.px_to_pt's factor, applied inline: pt() runs for every coordinate
+PX_TO_PT = PPTConfig.SLIDE_WIDTH_PT / PPTConfig.BASE_WIDTH_PX
+
+def pt(px):
+    return px * PX_TO_PT
+
+def rect(r):
+    """A POS_PX rectangle in points."""
+    return (pt(r['left']), pt(r['top']), pt(r['width']), pt(r['height']))
+
+def _shape_dict(kind, **props):
+    return {"kind": kind, **{key: value for key, value in props.items() if value is not None}}
+
+def textbox(box, text, font=None, align=None, autofit=None):
+    return _shape_dict("textbox", box=box, text=text, font=font, align=align, autofit=autofit)
+
+def shape(mso_shape, box, fill=None, line=None, text=None, font=None, align=None, autofit=None):
+    return _shape_dict("shape", shape=mso_shape, box=box, fill=fill, line=line, text=text,
+                       font=font, align=align, autofit=autofit)
+
+def picture(box, image):
+    return _shape_dict("picture", box=box, image=image)
+
+def chart(box, chart_type, categories, series, axis_max=None, legend=None, data_labels=None, font=None):
+    return _shape_dict("chart", box=box, chart=chart_type, categories=categories, series=series,
+                       axis_max=axis_max, legend=legend, data_labels=data_labels, font=font)
+
+# "bar" is horizontal with the first category on top; "column" is vertical
+CHART_TYPES = ("bar", "column", "line", "pie")
+
+def chart_table(prim):
+    """A chart's data as rows: series names, then one row of values per category."""
+    rows = [[""] + [s["name"] for s in prim["series"]]]
+    for i, category in enumerate(prim["categories"]):
+        rows.append([category] + [s["values"][i] if i < len(s["values"]) else None for s in prim["series"]])
+    return rows
+
+def line(x1, y1, x2, y2, color, weight=None):
+    return _shape_dict("line", points=(x1, y1, x2, y2), line={"color": color, "weight": weight}
+                       if weight is not None else {"color": color})
+
+def table(box, rows, cols, cells):
+    return _shape_dict("table", box=box, rows=rows, cols=cols, cells=cells)
+
+NO_LINE = {"visible": False}
+
+class ShapeList(list):
+    """A canvas that keeps what is drawn on it as primitive dicts."""
+
+    def textbox(self, *args, **kwargs):
+        self.append(textbox(*args, **kwargs))
+
+    def shape(self, *args, **kwargs):
+        self.append(shape(*args, **kwargs))
+
+    def line(self, *args, **kwargs):
+        self.append(line(*args, **kwargs))
+
+    def table(self, *args, **kwargs):
+        self.append(table(*args, **kwargs))
+
+    def picture(self, *args, **kwargs):
+        self.append(picture(*args, **kwargs))
+
+    def chart(self, *args, **kwargs):
+        self.append(chart(*args, **kwargs))
+
+def theme_for(settings):
+    """Colours and font from the deck settings (see app.preview)."""
+    primary = settings.get('primary_color') or '#4285F4'
+    return {
+        "primary_hex": primary,
+        "primary": rgb(primary),
+        "title": rgb(settings.get('title_color') or '#333333'),
+        "body": rgb(settings.get('body_color') or '#333333'),
+        "font": settings.get('font_family') or 'Meiryo',
+        "light_gray": rgb(ColorUtils.generate_tinted_gray(primary, 10, 95))
+    }
+
+def _font(theme, **props):
+    return {"name": theme["font"], **props}
+
+def _header(slide, pos, theme, out):
+    """Title, underline and subhead used by every slide type except title and section."""
+    out.textbox(rect(pos["title"]), slide["title"],
+                font=_font(theme, size=PPTConfig.FONTS['sizes']['contentTitle'], bold=True, color=theme["primary"]),
+                align=2, autofit=True)
+
+    u_rect = pos["titleUnderline"]
+    line_start_x = pt(u_rect['left'])
+    line_start_y = pt(u_rect['top'])
+    line_end_x = line_start_x + pt(u_rect['width'])
+    out.line(line_start_x, line_start_y, line_end_x, line_start_y, theme["primary"], 2)
+
+    if slide["subhead"]:
+        out.textbox(rect(pos["subhead"]), slide["subhead"],
+                    font=_font(theme, size=PPTConfig.FONTS['sizes']['subhead'], bold=True, color=theme["title"]),
+                    align=2)
+
+def _title_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["titleSlide"]
+    out.textbox(rect(pos["title"]), slide["title"],
+                font=_font(theme, size=PPTConfig.FONTS['sizes']['title'], bold=True, color=theme["title"]),
+                align=2, autofit=True)
+    out.textbox(rect(pos["date"]), slide["date"],
+                font=_font(theme, size=PPTConfig.FONTS['sizes']['date'], color=theme["body"]))
+
+def _section_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["sectionSlide"]
+    out.textbox(rect(pos["ghostNum"]), str(slide["sectionNo"] or index),
+                font=_font(theme, size=180, color=(240, 240, 240)))
+    out.textbox(rect(pos["title"]), slide["title"],
+                font=_font(theme, size=PPTConfig.FONTS['sizes']['sectionTitle'], bold=True, color=theme["title"]),
+                autofit=True)
+
+def _process_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["processSlide"]
+    _header(slide, pos, theme, out)
+
+    area = pos["area"]
+    steps = slide["steps"][:4] # Max 4 steps
+    if not steps:
+        return
+    n = len(steps)
+    colors = ColorUtils.generate_process_colors(theme["primary_hex"], n)
+
+    box_h_pt = pt(65 if n > 3 else (80 if n == 3 else 100))
+    arrow_h_pt = pt(15 if n > 3 else (20 if n == 3 else 25))
+    header_w_pt = pt(120)
+    font_size = 24 # Minimum 24pt
+
+    current_y = pt(area['top'] + 10)
+    body_left = pt(area['left']) + header_w_pt
+    body_w_pt = pt(area['width']) - header_w_pt
+
+    for i, step in enumerate(steps):
+        # Header (Step N)
+        out.shape(1, (pt(area['left']), current_y, header_w_pt, box_h_pt), fill=rgb(colors[i]), line=NO_LINE,
+                  text=f"STEP {i+1}", font={"size": font_size, "bold": True, "color": WHITE}, align=2)
+        # Body
+        out.shape(1, (body_left, current_y, body_w_pt, box_h_pt), fill=theme["light_gray"], line=NO_LINE)
+        # Text
+        out.textbox((body_left + pt(20), current_y, body_w_pt - pt(40), box_h_pt), step,
+                    font=_font(theme, size=font_size, color=theme["body"]), autofit=True)
+        current_y += box_h_pt
+
+        if i < n - 1:
+            arrow_left = pt(area['left']) + header_w_pt / 2 - pt(8)
+            out.shape(66, (arrow_left, current_y, pt(16), arrow_h_pt), # msoShapeDownArrow
+                      fill=rgb(ColorUtils.generate_tinted_gray(theme["primary_hex"], 38, 88)), line=NO_LINE)
+            current_y += arrow_h_pt
+
+def _timeline_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["timelineSlide"]
+    _header(slide, pos, theme, out)
+
+    area = pos["area"]
+    milestones = slide["milestones"]
+    if not milestones:
+        return
+    n = len(milestones)
+    colors = ColorUtils.generate_timeline_colors(theme["primary_hex"], n)
+
+    base_y = pt(area['top'] + area['height'] * 0.5)
+    inner_margin = pt(80)
+    left_x = pt(area['left']) + inner_margin
+    right_x = pt(area['left'] + area['width']) - inner_margin
+
+    # Main line
+    out.line(left_x, base_y, right_x, base_y, (200, 200, 200), 2)
+
+    gap = (right_x - left_x) / (n - 1) if n > 1 else 0
+    card_w = pt(180)
+    v_offset = pt(40)
+    header_h = pt(28)
+    body_h = pt(80)
+    dot_r = pt(10)
+
+    for i, m in enumerate(milestones):
+        x = left_x + gap * i
+        is_above = (i % 2 == 0)
+        card_left = x - (card_w / 2)
+        card_top = (base_y - v_offset - header_h - body_h) if is_above else (base_y + v_offset)
+
+        # Connector
+        conn_y1 = (card_top + header_h + body_h) if is_above else base_y
+        conn_y2 = base_y if is_above else card_top
+        out.line(x, conn_y1, x, conn_y2, (150, 150, 150))
+        # Dot
+        out.shape(9, (x - dot_r/2, base_y - dot_r/2, dot_r, dot_r), fill=rgb(colors[i]), line=NO_LINE)
+        # Card header
+        out.shape(1, (card_left, card_top, card_w, header_h), fill=rgb(colors[i]), line=NO_LINE,
+                  text=m['date'], font=_font(theme, bold=True, color=WHITE), align=2)
+        # Card body
+        out.shape(1, (card_left, card_top + header_h, card_w, body_h), fill=theme["light_gray"], line=NO_LINE,
+                  text=m['label'], font=_font(theme, size=24, color=theme["body"]), align=2, autofit=True)
+
+def _cycle_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["cycleSlide"]
+    _header(slide, pos, theme, out)
+
+    area = pos["body"]
+    items = slide["items"][:4]
+    if not items:
+        return
+    center_x = pt(area['left'] + area['width'] / 2)
+    center_y = pt(area['top'] + area['height'] / 2)
+    radius_x = pt(area['width'] / 3.2)
+    radius_y = pt(area['height'] / 2.6)
+    card_w = pt(200)
+    card_h = pt(90)
+
+    positions = [
+        (center_x + radius_x, center_y),
+        (center_x, center_y + radius_y),
+        (center_x - radius_x, center_y),
+        (center_x, center_y - radius_y)
+    ]
+    for i, item in enumerate(items):
+        pos_x, pos_y = positions[i]
+        sub = item["subLabel"] or f"Phase {i+1}"
+        out.shape(5, (pos_x - card_w / 2, pos_y - card_h / 2, card_w, card_h), fill=theme["primary"], line=NO_LINE,
+                  text=f"{sub}\r\n{item['label']}", font=_font(theme, color=WHITE), align=2, autofit=True)
+
+def _cards_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["cardsSlide"]
+    _header(slide, pos, theme, out)
+
+    area = pos["gridArea"]
+    items = slide["items"]
+    if not items:
+        return
+    cols = 3 if len(items) > 4 else 2
+    rows = (len(items) + cols - 1) // cols
+    gap = pt(16)
+    card_w = (pt(area['width']) - gap * (cols - 1)) / cols
+    card_h = (pt(area['height']) - gap * (rows - 1)) / rows
+    border = rgb(ColorUtils.generate_tinted_gray(theme["primary_hex"], 15, 88))
+
+    for i, item in enumerate(items):
+        r = i // cols
+        c = i % cols
+        left = pt(area['left']) + c * (card_w + gap)
+        top = pt(area['top']) + r * (card_h + gap)
+        out.shape(5, (left, top, card_w, card_h), fill=theme["light_gray"], line={"color": border},
+                  text=f"{item['title']}\r\n\r\n{item['desc']}", font=_font(theme, color=theme["body"]),
+                  align=2, autofit=True)
+
+def _pyramid_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["pyramidSlide"]
+    _header(slide, pos, theme, out)
+
+    area = pos["pyramidArea"]
+    levels = slide["levels"][:4]
+    if not levels:
+        return
+    n = len(levels)
+    colors = ColorUtils.generate_pyramid_colors(theme["primary_hex"], n)
+
+    level_h = pt(70)
+    gap = pt(2)
+    total_h = (level_h * n) + (gap * (n - 1))
+    start_y = pt(area['top']) + (pt(area['height']) - total_h) / 2
+    pyramid_w = pt(480)
+    center_x = pt(area['left']) + pyramid_w / 2
+    text_col_left = pt(area['left']) + pyramid_w + pt(30)
+    text_col_w = pt(400)
+    w_decrement = pyramid_w / n
+
+    for i, level in enumerate(levels):
+        level_w = pyramid_w - (w_decrement * (n - 1 - i))
+        level_y = start_y + i * (level_h + gap)
+        out.shape(5, (center_x - level_w / 2, level_y, level_w, level_h), fill=rgb(colors[i]), line=NO_LINE,
+                  text=level['title'], font=_font(theme, bold=True, color=WHITE), align=2)
+        # Description
+        out.textbox((text_col_left, level_y, text_col_w, level_h), level['description'],
+                    font=_font(theme, size=24, color=theme["body"]), autofit=True)
+
+def _compare_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["compareSlide"]
+    _header(slide, pos, theme, out)
+
+    sides = (
+        (pos["leftBox"], theme["light_gray"], slide['leftTitle'], slide["leftItems"]),
+        (pos["rightBox"], rgb(ColorUtils.generate_tinted_gray(theme["primary_hex"], 5, 98)), slide['rightTitle'], slide["rightItems"])
+    )
+    for box_rect, fill, title, items in sides:
+        left, top, width, height = rect(box_rect)
+        out.shape(1, (left, top, width, height), fill=fill, line=NO_LINE)
+        out.textbox((left, top, width, 40), title, font=_font(theme, bold=True), align=2)
+        out.textbox((left + 10, top + 40, width - 20, height - 50), "\n".join(items), font=_font(theme, size=24))
+
+DIAGRAM_SHAPES = {"oval": 9, "rounded_rect": 5} # anything else is a rectangle
+
+def _diagram_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["diagramSlide"]
+    _header(slide, pos, theme, out)
+    for shp in slide["shapes"]:
+        out.shape(DIAGRAM_SHAPES.get(shp["shapeType"], 1), (pt(shp["x"]), pt(shp["y"]), pt(shp["w"]), pt(shp["h"])),
+                  fill=theme["primary"], text=shp['label'], font=_font(theme, color=WHITE))
+
+def _flow_chart_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["flowChartSlide"]
+    _header(slide, pos, theme, out)
+    flows = slide["flows"]
+    if not flows or not flows[0]["steps"]:
+        return
+    steps = flows[0]["steps"]
+    n = len(steps)
+    area = pos["area"]
+    box_w = pt(150)
+    box_h = pt(60)
+    gap = pt(30)
+
+    # Center the flow chart
+    total_w = n * box_w + (n - 1) * gap
+    start_x = pt(area['left'] + area['width'] / 2) - total_w / 2
+    start_y = pt(area['top']) + pt(50)
+    arrow_fill = rgb(ColorUtils.generate_tinted_gray(theme["primary_hex"], 20, 80))
+
+    for i, step in enumerate(steps):
+        x = start_x + i * (box_w + gap)
+        out.shape(5, (x, start_y, box_w, box_h), fill=theme["primary"], text=step, font=_font(theme, color=WHITE))
+        if i < n - 1:
+            arrow_y = start_y + box_h / 2 - pt(5)
+            out.shape(33, (x + box_w, arrow_y, gap, pt(10)), fill=arrow_fill) # msoShapeRightArrow
+
+def _step_up_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["stepUpSlide"]
+    _header(slide, pos, theme, out)
+    steps = slide["steps"]
+    if not steps:
+        return
+    area = pos["area"]
+    step_w = pt(area['width']) / len(steps)
+    step_h = pt(50)
+    base_y = pt(area['top']) + pt(area['height'])
+
+    for i, step in enumerate(steps):
+        h = (i + 1) * step_h
+        x = pt(area['left']) + i * step_w
+        out.shape(1, (x, base_y - h, step_w, h), fill=lighten(theme["primary_hex"], 0.1 * i),
+                  text=step['label'], font=_font(theme, color=WHITE))
+
+def _image_text_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["imageTextSlide"]
+    _header(slide, pos, theme, out)
+    # Uploaded image or a placeholder (left), text (right)
+    size = parse_ref(slide["image"])
+    if size:
+        out.picture(fit_box(rect(pos["imageArea"]), *size), slide["image"])
+    else:
+        out.shape(1, rect(pos["imageArea"]), fill=(230, 230, 230), text=f"[IMAGE: {slide['imageDesc']}]",
+                  font=_font(theme))
+    out.textbox(rect(pos["textArea"]), slide['text'], font=_font(theme, size=PPTConfig.FONTS['sizes']['body']))
+
+def _table_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["tableSlide"]
+    _header(slide, pos, theme, out)
+    headers = slide["headers"]
+    if not headers:
+        return
+    rows = slide["rows"]
+    num_cols = len(headers)
+    area = pos["tableArea"]
+
+    cells = {}
+    header_font = _font(theme, color=WHITE)
+    for c, h in enumerate(headers):
+        cells[(1, c + 1)] = {"text": h, "font": header_font, "fill": theme["primary"]}
+    body_font = _font(theme)
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row[:num_cols]):
+            cells[(r + 2, c + 1)] = {"text": cell, "font": body_font}
+    out.table((pt(area['left']), pt(area['top']), pt(area['width']), pt(200)), len(rows) + 1, num_cols, cells)
+
+CHART_FONT_SIZE = 14
+
+def _progress_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["progressSlide"]
+    _header(slide, pos, theme, out)
+    items = slide["items"]
+    if not items:
+        return
+    # One bar per item on a 0-100% axis
+    out.chart(rect(pos["area"]), "bar", [item["label"] for item in items],
+              [{"name": "%", "values": [item["percent"] for item in items], "color": theme["primary"]}],
+              axis_max=100, legend=False, data_labels=True, font=_font(theme, size=CHART_FONT_SIZE))
+
+def _quote_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["quoteSlide"]
+    _header(slide, pos, theme, out)
+    out.textbox(rect(pos["quoteArea"]), f"“{slide['quote']}”", font=_font(theme, size=32, italic=True), align=2)
+    out.textbox(rect(pos["authorArea"]), f"— {slide['author']}", font=_font(theme), align=3)
+
+def _kpi_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["kpiSlide"]
+    _header(slide, pos, theme, out)
+    kpis = slide["kpis"]
+    if not kpis:
+        return
+    area = pos["area"]
+    cols = 3
+    gap = pt(20)
+    w = (pt(area['width']) - gap * (cols - 1)) / cols
+    h = pt(150)
+
+    for i, kpi in enumerate(kpis):
+        r = i // cols
+        c = i % cols
+        x = pt(area['left']) + c * (w + gap)
+        y = pt(area['top']) + r * (h + gap)
+        out.shape(5, (x, y, w, h), fill=(245, 245, 245))
+        out.textbox((x, y + 10, w, h/2), kpi['value'], font=_font(theme, size=36, bold=True, color=theme["primary"]), align=2)
+        out.textbox((x, y + h/2, w, h/2), kpi['label'], font=_font(theme), align=2)
+
+def _bullet_cards_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["bulletCardsSlide"]
+    _header(slide, pos, theme, out)
+    area = pos["area"]
+    cols = 2
+    gap = pt(20)
+    w = (pt(area['width']) - gap * (cols - 1)) / cols
+    h = pt(300)
+
+    for i, card in enumerate(slide["cards"][:2]): # Limit to 2 for simplicity
+        x = pt(area['left']) + i * (w + gap)
+        y = pt(area['top'])
+        out.shape(1, (x, y, w, h), fill=(250, 250, 250), line={"color": theme["primary"]})
+        out.textbox((x + 10, y + 10, w - 20, 40), card['title'], font=_font(theme, bold=True))
+        out.textbox((x + 10, y + 50, w - 20, h - 60), "\n".join("・" + p for p in card["points"]), font=_font(theme))
+
+def _faq_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["faqSlide"]
+    _header(slide, pos, theme, out)
+    area = pos["area"]
+    y = pt(area['top'])
+    w = pt(area['width'])
+
+    for item in slide["items"]:
+        out.textbox((pt(area['left']), y, w, 30), f"Q. {item['q']}", font=_font(theme, bold=True, color=theme["primary"]))
+        y += 30
+        out.textbox((pt(area['left']), y, w, 40), f"A. {item['a']}", font=_font(theme))
+        y += 50
+
+def _stats_compare_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["statsCompareSlide"]
+    _header(slide, pos, theme, out)
+    stats = slide["stats"]
+    if not stats:
+        return
+    lb = pos["leftBox"]
+    rb = pos["rightBox"]
+
+    out.textbox((pt(lb['left']), pt(lb['top']) - 30, pt(lb['width']), 30), slide['leftTitle'], font=_font(theme), align=2)
+    out.textbox((pt(rb['left']), pt(rb['top']) - 30, pt(rb['width']), 30), slide['rightTitle'], font=_font(theme), align=2)
+
+    y = pt(lb['top'])
+    h = pt(50)
+    for stat in stats:
+        out.textbox((pt(460), y, pt(200), h), stat['label'], font=_font(theme), align=2)
+        out.textbox((pt(lb['left']), y, pt(lb['width']), h), stat['leftValue'], font=_font(theme, bold=True), align=3)
+        out.textbox((pt(rb['left']), y, pt(rb['width']), h), stat['rightValue'], font=_font(theme, bold=True), align=1)
+        y += h + 10
+
+def _bar_compare_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["barCompareSlide"]
+    _header(slide, pos, theme, out)
+    items = slide["items"]
+    if not items:
+        return
+    # A pair of bars per item, A in the theme colour and B in gray, on an automatic axis
+    out.chart(rect(pos["area"]), "bar", [item["label"] for item in items],
+              [{"name": "A", "values": [item["valueA"] for item in items], "color": theme["primary"]},
+               {"name": "B", "values": [item["valueB"] for item in items], "color": (150, 150, 150)}],
+              legend=False, font=_font(theme, size=CHART_FONT_SIZE))
+
+def _chart_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["chartSlide"]
+    _header(slide, pos, theme, out)
+    chart_type = slide["chartType"].strip().lower()
+    chart_type = chart_type if chart_type in CHART_TYPES else "column"
+    series = [s for s in slide["series"] if s["values"]]
+    if chart_type == "pie":
+        series = series[:1]
+    if not series:
+        return
+    # Values without a category get a numbered one
+    categories = slide["categories"]
+    categories = categories + [str(i + 1) for i in range(len(categories), max(len(s["values"]) for s in series))]
+    data = []
+    for k, s in enumerate(series):
+        entry = {"name": s["name"] or f"Series {k + 1}", "values": s["values"]}
+        # A pie's slices get the application's palette; other series are shades of the theme colour
+        if chart_type != "pie":
+            entry["color"] = lighten(theme["primary_hex"], 0.6 * k / len(series))
+        data.append(entry)
+    out.chart(rect(pos["area"]), chart_type, categories, data,
+              legend=chart_type == "pie" or len(data) > 1, data_labels=chart_type == "pie",
+              font=_font(theme, size=CHART_FONT_SIZE))
+
+def _content_slide(slide, index, theme, out):
+    pos = PPTConfig.POS_PX["contentSlide"]
+    _header(slide, pos, theme, out)
+    if slide["points"]:
+        out.textbox(rect(pos["body"]), "\n".join("・" + p for p in slide["points"]),
+                    font=_font(theme, size=PPTConfig.FONTS['sizes']['body'], color=theme["body"]))
+
+LAYOUTS = {
+    "title": _title_slide,
+    "section": _section_slide,
+    "process": _process_slide,
+    "timeline": _timeline_slide,
+    "cycle": _cycle_slide,
+    "cards": _cards_slide,
+    "pyramid": _pyramid_slide,
+    "compare": _compare_slide,
+    "diagram": _diagram_slide,
+    "flowChart": _flow_chart_slide,
+    "stepUp": _step_up_slide,
+    "imageText": _image_text_slide,
+    "table": _table_slide,
+    "progress": _progress_slide,
+    "quote": _quote_slide,
+    "kpi": _kpi_slide,
+    "bulletCards": _bullet_cards_slide,
+    "faq": _faq_slide,
+    "statsCompare": _stats_compare_slide,
+    "barCompare": _bar_compare_slide,
+    "chart": _chart_slide,
+    "content": _content_slide,
+}
+
+def draw_slide(slide, index, theme, out):
+    """
+    Draws one normalized slide (see slide_schema.normalize_slide) on the canvas out.
+    index is the slide's 0-based position, used for section numbers.
+    """
+    LAYOUTS.get(slide["type"], _content_slide)(slide, index, theme, out)
+
+def layout_slide(slide, index, theme):
+    """One normalized slide as {"type", "background", "shapes", "notes"}, its shapes as primitive dicts."""
+    shapes = ShapeList()
+    draw_slide(slide, index, theme, shapes)
+    return {"type": slide["type"], "background": WHITE, "shapes": shapes, "notes": slide["notes"]}
+
+def layout_pages(slide, index, theme):
+    """A normalized slide as one or more laid-out slides (see pagination.py)."""
+    return [layout_slide(page, index, theme) for page in paginate_slide(slide)]
+
+def deck_pages(data):
+    """(index, page) for the normalized, paginated slides of a deck, one slide at a time."""
+    for i, slide in enumerate(data):
+        for page in paginate_slide(normalize_slide(slide)):
+            yield i, page
+
+def layout_deck(data, settings):
+    """Lays out slides one at a time, so a large deck is never held as shapes all at once."""
+    theme = theme_for(settings)
+    for i, page in deck_pages(data):
+        yield layout_slide(page, i, theme)
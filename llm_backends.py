@@ -0,0 +1,321 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from http_pool import PoolError, get_pool
+from text_preprocess import estimate_tokens
+
+# Backends for the text generation service used by generate_json_from_text.
+# The default talks to Gemini's REST API over pooled keep-alive connections
+# (http_pool); "gemini" uses the google-generativeai SDK instead. The stub
+# backend is the REST client pointed at a local replay server
+# (see benchmarks/llm_stub_server.py) so load and latency tests run offline.
+
+DEFAULT_TIMEOUT = 60
+GEMINI_API_URL = "https://generativelanguage.googleapis.com"
+
+class LLMError(Exception):
+    pass
+
+def prompt_key(contents):
+    """Stable key for a prompt, shared by the recorder and the stub server."""
+    h = hashlib.sha256()
+    for part in contents:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class ContextCache:
+    """
+    Provider-side cached contexts for static system prompts, shared by all
+    backend instances. One entry per (backend scope, model, prompt); a failed
+    creation (e.g. prompt below the provider's minimum size) is remembered for
+    the TTL too, so the prompt is sent inline without retrying every call.
+    Creation is a network call: it holds only that entry's lock, so callers
+    of the same prompt wait for one creation and other prompts go ahead.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, backend, model_name, system):
+        key = (backend.cache_scope, model_name, hashlib.sha256(system.encode("utf-8")).hexdigest())
+        ttl = int(os.environ.get("LLM_CONTEXT_CACHE_TTL", 3600))
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            try:
+                handle = backend.create_cache(model_name, system, ttl)
+                print(f"DEBUG: Cached system prompt for {model_name} ({estimate_tokens(system)} tokens)")
+            except Exception as e:
+                print(f"DEBUG: Context cache unavailable for {model_name}: {e}")
+                handle = None
+            # Renew a little before the provider expires it
+            self._entries[key] = (handle, time.monotonic() + ttl * 0.9)
+            return handle
+
+CONTEXT_CACHE = ContextCache()
+
+def _cache_enabled(system):
+    if os.environ.get("LLM_CONTEXT_CACHE", "1") != "1":
+        return False
+    return estimate_tokens(system) >= int(os.environ.get("LLM_CONTEXT_CACHE_MIN_TOKENS", 1024))
+
+class LLMBackend:
+    """Generates text for a list of prompt parts. Raises on failure."""
+    name = "base"
+    cache_scope = None # None: no provider-side context caching
+
+    def list_models(self):
+        return []
+
+    def generate(self, model_name, contents, generation_config=None, system=None, report=None):
+        """
+        system: static instructions sent ahead of contents, from a cached
+        context when the provider supports it (LLM_CONTEXT_CACHE).
+        report: optional dict; estimated prompt and cached tokens are added to it.
+        """
+        cached = None
+        if system and self.cache_scope and _cache_enabled(system):
+            cached = CONTEXT_CACHE.get(self, model_name, system)
+        if system and cached is None:
+            contents = [system] + list(contents)
+        if report is not None:
+            report["llm_calls"] = report.get("llm_calls", 0) + 1
+            report["prompt_tokens"] = report.get("prompt_tokens", 0) + sum(estimate_tokens(c) for c in contents)
+            if cached is not None:
+                report["cached_tokens"] = report.get("cached_tokens", 0) + estimate_tokens(system)
+        return self._generate(model_name, contents, generation_config, cached)
+
+    def create_cache(self, model_name, system, ttl):
+        raise NotImplementedError
+
+    def _generate(self, model_name, contents, generation_config, cached):
+        raise NotImplementedError
+
+_configured_key = None
+_configure_lock = threading.Lock()
+
+def _genai():
+    # Imported on first use: the SDK is heavy and only this backend needs it
+    import google.generativeai as genai
+    return genai
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, api_key, timeout=DEFAULT_TIMEOUT):
+        global _configured_key
+        genai = _genai()
+        # genai's configuration is process-global; only redo it when the key changes
+        with _configure_lock:
+            if _configured_key != api_key:
+                print(f"DEBUG: google-generativeai version: {genai.__version__}")
+                genai.configure(api_key=api_key)
+                _configured_key = api_key
+        self.timeout = timeout
+        # Cached contents belong to the key's project
+        self.cache_scope = "gemini:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def list_models(self):
+        return [m.name for m in _genai().list_models()]
+
+    def create_cache(self, model_name, system, ttl):
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=f"models/{model_name}",
+            system_instruction=system,
+            ttl=datetime.timedelta(seconds=ttl)
+        )
+
+    def _generate(self, model_name, contents, generation_config, cached):
+        genai = _genai()
+        if cached is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+        else:
+            model = genai.GenerativeModel(model_name)
+        response = model.generate_content(
+            contents=contents,
+            generation_config=generation_config,
+            request_options={"timeout": self.timeout}
+        )
+        return response.text
+
+class GeminiRestBackend(LLMBackend):
+    """
+    Gemini over its REST API on a pooled keep-alive connection (http_pool).
+    The key travels per request in a header, so users with different keys
+    can share the process-wide pool.
+    """
+    name = "rest"
+
+    def __init__(self, api_key, base_url=GEMINI_API_URL, timeout=DEFAULT_TIMEOUT, stream=False):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.stream = stream
+        self.pool = get_pool(self.base_url, timeout=timeout)
+        # Cached contents belong to the key's project
+        self.cache_scope = self.base_url + ":" + hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+    def list_models(self):
+        data = self._request("GET", "/v1beta/models?pageSize=1000")
+        return [m["name"] for m in data.get("models", [])]
+
+    def create_cache(self, model_name, system, ttl):
+        data = self._request("POST", "/v1beta/cachedContents", {
+            "model": f"models/{model_name}",
+            "systemInstruction": {"parts": [{"text": system}]},
+            "ttl": f"{ttl}s"
+        })
+        return data["name"]
+
+    def _generate(self, model_name, contents, generation_config, cached):
+        body = {
+            "contents": [{"role": "user", "parts": [{"text": part} for part in contents]}],
+            "generationConfig": {_camel(k): v for k, v in (generation_config or {}).items()}
+        }
+        if cached is not None:
+            body["cachedContent"] = cached
+        if self.stream:
+            return self._generate_stream(model_name, body)
+        data = self._request("POST", f"/v1beta/models/{model_name}:generateContent", body)
+        return _candidate_text(data)
+
+    def _generate_stream(self, model_name, body):
+        chunks = []
+        with self._open("POST", f"/v1beta/models/{model_name}:streamGenerateContent?alt=sse", body) as resp:
+            for raw in resp:
+                line = raw.decode("utf-8").strip()
+                if line.startswith("data:"):
+                    chunks.append(_candidate_text(json.loads(line[5:])))
+        return "".join(chunks)
+
+    @contextmanager
+    def _open(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["x-goog-api-key"] = self.api_key
+        try:
+            with self.pool.open(method, path, data, headers) as resp:
+                if resp.status >= 400:
+                    raise LLMError(f"{method} {path.split('?')[0]} failed with HTTP {resp.status}")
+                yield resp
+        except PoolError as e:
+            raise LLMError(str(e)) from e
+
+    def _request(self, method, path, body=None):
+        with self._open(method, path, body) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+class StubBackend(GeminiRestBackend):
+    """The REST client pointed at a Gemini-REST-compatible server, normally the local stub."""
+    name = "stub"
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT, stream=False):
+        super().__init__(None, base_url=base_url, timeout=timeout, stream=stream)
+
+class RecordingBackend(LLMBackend):
+    """Wraps another backend and appends every response to a JSONL file for replay."""
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.name = inner.name
+        self.path = path
+        self._lock = threading.Lock()
+
+    def list_models(self):
+        return self.inner.list_models()
+
+    def generate(self, model_name, contents, generation_config=None, system=None, report=None):
+        start = time.perf_counter()
+        text = self.inner.generate(model_name, contents, generation_config, system=system, report=report)
+        record = {
+            # Keyed as if the system prompt were sent inline, cached or not
+            "key": prompt_key(([system] if system else []) + list(contents)),
+            "model": model_name,
+            "latency_s": round(time.perf_counter() - start, 4),
+            "response": text
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return text
+
+def _camel(key):
+    head, *rest = key.split("_")
+    return head + "".join(word.title() for word in rest)
+
+def _candidate_text(data):
+    try:
+        return "".join(p.get("text", "") for p in data["candidates"][0]["content"]["parts"])
+    except (KeyError, IndexError, TypeError) as e:
+        raise LLMError(f"Unexpected response shape: {str(data)[:200]}") from e
+
+def get_backend(api_key):
+    """
+    Builds the backend selected by the environment:
+      LLM_BACKEND      rest (default, pooled REST) | gemini (SDK) | stub
+      LLM_API_URL      base URL for the rest backend (default GEMINI_API_URL)
+      LLM_STUB_URL     base URL of the stub server (default http://127.0.0.1:8765)
+      LLM_STUB_STREAM  1 to use the streaming endpoint
+      LLM_TIMEOUT      per-call timeout in seconds
+      LLM_POOL_*       connection pool settings, see http_pool
+      LLM_RECORD_PATH  if set, append every response to this JSONL file
+      LLM_CONTEXT_CACHE  0 to always send the system prompt inline (default 1)
+      LLM_CONTEXT_CACHE_MIN_TOKENS / LLM_CONTEXT_CACHE_TTL  cache only prompts this large, for this long
+    """
+    kind = os.environ.get("LLM_BACKEND", "rest")
+    timeout = float(os.environ.get("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+    if kind == "stub":
+        backend = StubBackend(_stub_url(),
+                              timeout=timeout,
+                              stream=os.environ.get("LLM_STUB_STREAM") == "1")
+    elif kind == "rest":
+        backend = GeminiRestBackend(api_key, base_url=os.environ.get("LLM_API_URL", GEMINI_API_URL),
+                                    timeout=timeout)
+    elif kind == "gemini":
+        backend = GeminiBackend(api_key, timeout=timeout)
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND: {kind}")
+
+    record_path = os.environ.get("LLM_RECORD_PATH")
+    if record_path:
+        backend = RecordingBackend(backend, record_path)
+    return backend
+
+def _stub_url():
+    return os.environ.get("LLM_STUB_URL", "http://127.0.0.1:8765")
+
+def warm_up():
+    """
+    Opens LLM_POOL_WARM pooled connections to the configured API so the first
+    requests a worker serves skip the handshakes. Called from gunicorn's
+    post_fork hook; failures are logged, never raised.
+    """
+    kind = os.environ.get("LLM_BACKEND", "rest")
+    if kind == "stub":
+        base_url = _stub_url()
+    elif kind == "rest":
+        base_url = os.environ.get("LLM_API_URL", GEMINI_API_URL)
+    else:
+        return 0
+    timeout = float(os.environ.get("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+    try:
+        n = get_pool(base_url.rstrip("/"), timeout=timeout).warm(int(os.environ.get("LLM_POOL_WARM", 2)))
+        print(f"DEBUG: Warmed {n} connections to {base_url}")
+        return n
+    except OSError as e:
+        print(f"DEBUG: Connection warm-up failed: {e}")
+        return 0
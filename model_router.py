@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Orders the candidate models for each call by how they have been doing
+# recently, instead of always walking MODELS_TO_TRY in the same order.
+#
+# Every attempt is recorded with its latency, whether the call succeeded and
+# whether the answer parsed as JSON. A model's score is its median latency
+# divided by its recent success rate, i.e. roughly the expected time to a
+# usable answer. Models without recent samples go first so each gets probed
+# once; samples older than ROUTER_MAX_AGE expire, so an unused model is
+# re-probed now and then and one that had an outage gets back in.
+#
+# Long inputs (LONG_INPUT_TOKENS and up) go to the models with the largest
+# output budget first, since a long document makes a long deck.
+
+# Maximum output tokens per model
+OUTPUT_LIMITS = {
+    'gemini-2.0-flash': 8192,
+    'gemini-flash-latest': 65536,
+    'gemini-1.5-flash': 8192,
+}
+DEFAULT_OUTPUT_LIMIT = 8192
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[k]
+
+class ModelRouter:
+    def __init__(self, models, window=None, max_age=None, long_input_tokens=None):
+        self.models = list(models)
+        self.window = window or int(os.environ.get("ROUTER_WINDOW", 100))
+        self.max_age = max_age or float(os.environ.get("ROUTER_MAX_AGE", 300))
+        self.long_input_tokens = long_input_tokens or int(os.environ.get("LONG_INPUT_TOKENS", 8000))
+        self.static = os.environ.get("MODEL_ROUTING", "adaptive") == "static"
+        # model -> deque of (timestamp, latency_s, ok, valid_json)
+        self._samples = {m: deque(maxlen=self.window) for m in self.models}
+        self._lock = threading.Lock()
+
+    def record(self, model_name, latency, ok, valid=None):
+        """ok: the call returned; valid: the answer parsed (None when the call failed)."""
+        with self._lock:
+            samples = self._samples.setdefault(model_name, deque(maxlen=self.window))
+            samples.append((time.monotonic(), latency, ok, bool(ok and valid)))
+
+    def _recent(self, model_name, now):
+        samples = self._samples.get(model_name, ())
+        while samples and now - samples[0][0] > self.max_age:
+            samples.popleft()
+        return list(samples)
+
+    def _stats(self, model_name, now):
+        samples = self._recent(model_name, now)
+        latencies = [s[1] for s in samples if s[2]]
+        calls = len(samples)
+        returned = sum(1 for s in samples if s[2])
+        valid = sum(1 for s in samples if s[3])
+        return {
+            "samples": calls,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "error_rate": (calls - returned) / calls if calls else None,
+            "json_valid_rate": valid / returned if returned else None,
+            "success_rate": valid / calls if calls else None,
+            "output_limit": OUTPUT_LIMITS.get(model_name, DEFAULT_OUTPUT_LIMIT)
+        }
+
+    def candidates(self, input_tokens=0):
+        """The models to try, best first."""
+        if self.static:
+            return list(self.models)
+        now = time.monotonic()
+        with self._lock:
+            stats = {m: self._stats(m, now) for m in self.models}
+
+        observed = [s["p50_s"] for s in stats.values() if s["p50_s"] is not None]
+        fallback = max(observed) if observed else 1.0
+        def score(m):
+            s = stats[m]
+            if not s["samples"]:
+                return 0.0
+            # A model that has only failed is scored from the slowest observed latency
+            latency = s["p50_s"] if s["p50_s"] is not None else fallback
+            return latency / max(s["success_rate"], 0.05)
+
+        order = {m: i for i, m in enumerate(self.models)}
+        if input_tokens >= self.long_input_tokens:
+            key = lambda m: (-stats[m]["output_limit"], score(m), order[m])
+        else:
+            key = lambda m: (score(m), order[m])
+        return sorted(self.models, key=key)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return {m: self._stats(m, now) for m in self._samples}
@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli # optional; without it responses are gzip-compressed
+except ImportError:
+    brotli = None
+
+# Rendered downloads (VBA macro, Apps Script) by content key, with their
+# compressed forms. The key changes exactly when the canonical slide JSON,
+# the settings or the output format change, so a repeat download is a cache
+# hit or a 304 without rendering anything. Each encoding gets its own strong
+# ETag (see etag_for).
+
+# Bumped when a renderer change alters the output for the same deck
+RENDER_VERSION = "2"
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def output_key(slides, settings, output_format):
+    payload = json.dumps([RENDER_VERSION, output_format, slides, settings],
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def etag_for(key, encoding):
+    return key if encoding is None else f"{key}-{encoding}"
+
+def _accepted(accept_encoding):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+def choose_encoding(accept_encoding):
+    """The Content-Encoding to send: "br", "gzip" or None for identity."""
+    accepted = _accepted(accept_encoding)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda c: accepted.get(c, accepted.get("*", 0)))
+    return best if accepted.get(best, accepted.get("*", 0)) > 0 else None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the bytes identical across workers and restarts
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class OutputCache:
+    """
+    Rendered outputs by output_key, least recently used dropped beyond max_bytes.
+    With a shared state backend (state_backend.py) outputs rendered on one
+    node are reused by the others; the backend is a second tier behind the
+    per-process cache, kept for shared_ttl seconds.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, shared=None, shared_ttl=3600):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self._entries = OrderedDict() # key -> {encoding or None: bytes}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0}
+
+    def _shared_get(self, key, encoding):
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get(f"out:{key}:{encoding or 'identity'}")
+        except Exception as e:
+            print(f"DEBUG: shared output cache unavailable: {e}")
+            return None
+
+    def _shared_set(self, key, encoding, data):
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(f"out:{key}:{encoding or 'identity'}", data, self.shared_ttl)
+        except Exception as e:
+            print(f"DEBUG: shared output cache unavailable: {e}")
+
+    def _store(self, key, encoding, body):
+        entry = self._entries.setdefault(key, {})
+        if encoding not in entry:
+            entry[encoding] = body
+            self._size += len(body)
+        self._entries.move_to_end(key)
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, dropped = self._entries.popitem(last=False)
+            self._size -= sum(len(b) for b in dropped.values())
+
+    def get(self, key, render, encoding=None):
+        """
+        The output for key in the given encoding. render() produces the text
+        (or bytes) on a miss; compressed forms are made from the cached output once.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and encoding in entry:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[encoding]
+            body = entry.get(None) if entry is not None else None
+        data = self._shared_get(key, encoding)
+        if data is not None:
+            with self._lock:
+                self.stats["shared_hits"] += 1
+                self._store(key, encoding, data)
+            return data
+        if body is None:
+            body = self._shared_get(key, None)
+        if body is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            body = render()
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self._shared_set(key, None, body)
+        data = body if encoding is None else compress(body, encoding)
+        if encoding is not None:
+            self._shared_set(key, encoding, data)
+        with self._lock:
+            self._store(key, None, body)
+            self._store(key, encoding, data)
+        return data
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._size)
@@ -0,0 +1,97 @@
+import math
+
+from config import PPTConfig
+from text_metrics import INSET_X, INSET_Y, LINE_SPACING, wrap_text
+
+# Splits slides whose content doesn't fit their layout into numbered
+# continuation slides ("Title (2/3)"), instead of the renderers silently
+# dropping or overflowing it. Runs on normalized slides, between the slide
+# JSON and layout.py, so no LLM call is needed to shorten a slide.
+#
+# Capacities follow the layout geometry in layout.py; see the comments on
+# each rule.
+
+# type -> (list field, items per slide)
+ITEM_CAPACITY = {
+    "process": ("steps", 4),        # the layout draws at most 4 steps
+    "cycle": ("items", 4),          # 4 positions around the cycle
+    "pyramid": ("levels", 4),       # 4 levels of 70px in the 360px area
+    "cards": ("items", 6),          # 3 x 2 grid; more rows squash the cards
+    "timeline": ("milestones", 9),  # 180px cards alternate sides; 10 would overlap
+    "kpi": ("kpis", 6),             # 2 rows of 150px in the 330px area
+    "bulletCards": ("cards", 2),    # 2 columns
+    "stepUp": ("steps", 6),         # steps rise 50px each in the 330px area
+    "faq": ("items", 3),            # 80pt per question in the 330px area
+    "statsCompare": ("stats", 6),   # 47.5pt per row
+    # progress, barCompare and chart are native charts (layout.chart) and take any number of items
+}
+FLOW_STEPS_PER_SLIDE = 5  # 150px boxes with 30px arrows across 910px
+TABLE_ROWS_PER_SLIDE = 8  # body rows; the header repeats on every page
+BODY_FONT_SIZE = PPTConfig.FONTS['sizes']['body']
+
+def _pt(px):
+    return PPTConfig.px_to_pt(px)
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)] or [[]]
+
+def _chunks_by_lines(items, width, height, size=BODY_FONT_SIZE):
+    """Groups list items so each group's wrapped lines fit a text box of width x height points."""
+    max_lines = max(1, math.floor((height - 2 * INSET_Y) / (size * LINE_SPACING)))
+    groups, current, used = [], [], 0
+    for item in items:
+        lines = len(wrap_text(item, width - 2 * INSET_X, size))
+        if current and used + lines > max_lines:
+            groups.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += lines
+    groups.append(current)
+    return groups
+
+def _pages(slide, pages):
+    """Copies of slide with each page's fields, titled "Title (k/n)"; notes stay on the first page."""
+    if len(pages) <= 1:
+        return [slide]
+    out = []
+    for k, fields in enumerate(pages):
+        page = dict(slide, **fields)
+        page["title"] = f"{slide['title']} ({k + 1}/{len(pages)})"
+        if k:
+            page["notes"] = ""
+        out.append(page)
+    return out
+
+def paginate_slide(slide):
+    """Returns a list of one or more slides for one normalized slide."""
+    slide_type = slide["type"]
+    if slide_type in ITEM_CAPACITY:
+        field, capacity = ITEM_CAPACITY[slide_type]
+        return _pages(slide, [{field: chunk} for chunk in _chunks(slide[field], capacity)])
+
+    if slide_type == "content":
+        body = PPTConfig.POS_PX["contentSlide"]["body"]
+        points = _chunks_by_lines(["・" + p for p in slide["points"]], _pt(body["width"]), _pt(body["height"]))
+        return _pages(slide, [{"points": [p[1:] for p in chunk]} for chunk in points])
+
+    if slide_type == "compare":
+        # Items sit below a 40pt title, inset 10pt, in each box (see layout._compare_slide)
+        box = PPTConfig.POS_PX["compareSlide"]["leftBox"]
+        width, height = _pt(box["width"]) - 20, _pt(box["height"]) - 50
+        left = _chunks_by_lines(slide["leftItems"], width, height)
+        right = _chunks_by_lines(slide["rightItems"], width, height)
+        n = max(len(left), len(right))
+        left += [[]] * (n - len(left))
+        right += [[]] * (n - len(right))
+        return _pages(slide, [{"leftItems": l, "rightItems": r} for l, r in zip(left, right)])
+
+    if slide_type == "flowChart":
+        # Only one flow is drawn per slide; later flows get their own slides
+        pages = [{"flows": [{"steps": chunk}]}
+                 for flow in slide["flows"] for chunk in _chunks(flow["steps"], FLOW_STEPS_PER_SLIDE)]
+        return _pages(slide, pages or [{}])
+
+    if slide_type == "table":
+        return _pages(slide, [{"rows": chunk} for chunk in _chunks(slide["rows"], TABLE_ROWS_PER_SLIDE)])
+
+    return [slide]
@@ -1,48 +1,171 @@
 import json
 import os
-import google.generativeai as genai
-from config import PPTConfig, ColorUtils
-
-# Re-use the system prompt from the original file, or import it if it was in a separate module.
-# Assuming prompts.py is in the parent or same directory. 
-# We will copy the essential parts or import if possible.
-try:
-    from prompts import SYSTEM_PROMPT
-except ImportError:
-    # Fallback if running from a different context
-    SYSTEM_PROMPT = """
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from config import PPTConfig
+from json_repair import clean_slides, extract_json, extract_slides
+from image_pipeline import parse_ref
+from layout import WHITE, chart, chart_table, deck_pages, draw_slide, theme_for
+from llm_backends import get_backend
+from model_router import ModelRouter
+from slide_schema import SLIDE_SCHEMAS, model_schema_for, normalize_slide
+from source_text import best_excerpt, map_sources, plan_update, split_paragraphs
+from text_preprocess import estimate_tokens
+
+def load_system_prompt():
+    """
+    The deck-generation system prompt, from SYSTEM_PROMPT_FILE if set, else
+    from an importable prompts module (prompts.SYSTEM_PROMPT), else a placeholder.
+    """
+    path = os.environ.get("SYSTEM_PROMPT_FILE")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    try:
+        from prompts import SYSTEM_PROMPT
+        return SYSTEM_PROMPT
+    except ImportError:
+        print("DEBUG: No SYSTEM_PROMPT_FILE or prompts module; using the placeholder prompt")
+        return """
     (Paste the full system prompt here if import fails, but for now we assume it exists or we pass it in)
     """
 
-def generate_json_from_text(text_input, api_key):
-    print(f"DEBUG: google-generativeai version: {genai.__version__}")
-    genai.configure(api_key=api_key)
-    
+SYSTEM_PROMPT = load_system_prompt()
+
+# List of models to try in order of preference
+# Based on available models from logs: gemini-2.0-flash, gemini-flash-latest
+MODELS_TO_TRY = ['gemini-2.0-flash', 'gemini-flash-latest', 'gemini-1.5-flash']
+
+# Reorders MODELS_TO_TRY per call from observed latency and failure rates (see /status)
+ROUTER = ModelRouter(MODELS_TO_TRY)
+
+# The provider's model list is only logged; it is fetched once per
+# MODEL_LIST_TTL seconds (default 3600) and backend kind, not on every request.
+MODEL_LIST_TTL = 3600
+_model_lists = {} # backend.name -> (expires, names)
+
+def available_models(backend):
+    """backend.list_models(), cached per process; None if it never succeeded."""
+    now = time.monotonic()
+    expires, names = _model_lists.get(backend.name, (0.0, None))
+    if now < expires:
+        return names
+    # Claimed before the call, so concurrent requests keep the old list instead of fetching too
+    _model_lists[backend.name] = (now + float(os.environ.get("MODEL_LIST_TTL", MODEL_LIST_TTL)), names)
     try:
         print("DEBUG: Listing available models...")
-        for m in genai.list_models():
-            print(f"DEBUG: Found model: {m.name}")
+        names = backend.list_models()
     except Exception as e:
         print(f"DEBUG: Failed to list models: {e}")
-
-    # List of models to try in order of preference
-    # Based on available models from logs: gemini-2.0-flash, gemini-flash-latest
-    models_to_try = ['gemini-2.0-flash', 'gemini-flash-latest', 'gemini-1.5-flash']
+        return names
+    for name in names:
+        print(f"DEBUG: Found model: {name}")
+    _model_lists[backend.name] = (_model_lists[backend.name][0], names)
+    return names
+
+# Prompt for regenerating a single slide. Only the slide's neighbourhood and the
+# matching part of the source are sent, not the whole document.
+SLIDE_PROMPT = """You are rewriting one slide of a presentation deck.
+Return a single JSON object (not an array) for a slide of type "{slide_type}".
+Besides "type" and "title" (and optionally "subhead" and "notes"), use these fields:
+{fields}
+Write in the same language as the source excerpt.
+
+Previous slide title: {prev_title}
+Next slide title: {next_title}
+Current slide title: {title}
+
+Source excerpt:
+{excerpt}
+"""
+
+# Two-stage generation: a short outline call, then one call per slide in parallel.
+# GENERATION_MODE=two_stage enables it; EXPAND_CONCURRENCY bounds the parallel calls.
+# Callers can pass slots, a function n -> context manager yielding how many of n
+# more calls they can afford at once (app.py: free admission slots).
+OUTLINE_PROMPT = """Plan a presentation deck for the numbered source paragraphs below.
+Return only a JSON array with one object per slide, in order:
+{{"type": "<slide type>", "title": "<slide title>", "paragraphs": [<numbers of the source paragraphs the slide covers>]}}
+Allowed types: {types}
+Start with a "title" slide and use "section" slides between major parts.
+Write titles in the same language as the source.
+
+Source paragraphs:
+{paragraphs}
+"""
+
+# Slide types fully described by the outline; they are not expanded.
+OUTLINE_ONLY_TYPES = {'title', 'section'}
+MAX_EXCERPT_CHARS = 3000
+
+def _attempt(backend, model_name, contents, parse, system=None, report=None):
+    """One model call plus parsing; the outcome is recorded with ROUTER. Raises on failure."""
+    start = time.perf_counter()
+    try:
+        text = backend.generate(
+            model_name,
+            contents,
+            generation_config={"response_mime_type": "application/json"},
+            system=system,
+            report=report
+        )
+    except Exception:
+        ROUTER.record(model_name, time.perf_counter() - start, ok=False)
+        raise
+    latency = time.perf_counter() - start
+    try:
+        result = parse(text)
+    except ValueError:
+        ROUTER.record(model_name, latency, ok=True, valid=False)
+        raise
+    ROUTER.record(model_name, latency, ok=True, valid=True)
+    return result
+
+@contextmanager
+def parallel_calls(calls, slots=None):
+    """Yields how many of calls LLM calls to run at once: up to EXPAND_CONCURRENCY, and what slots allows."""
+    workers = max(1, min(calls, int(os.environ.get("EXPAND_CONCURRENCY", 32))))
+    if slots is None:
+        yield workers
+        return
+    # The caller's own slot covers one call
+    with slots(workers - 1) as extra:
+        if 1 + extra < workers:
+            print(f"DEBUG: running {calls} calls {1 + extra} at a time (wanted {workers})")
+        yield 1 + extra
+
+def _one_at_a_time(n):
+    return nullcontext(0)
+
+def generate_json_from_text(text_input, api_key, backend=None, mode=None, report=None, source_map=None,
+                            slots=None):
+    """
+    report: optional dict that receives per-request usage (LLM calls and
+    estimated prompt/cached tokens).
+    source_map: optional list that receives, per slide, the indices of the
+    source paragraphs it was made from (see source_text.plan_update).
+    slots: optional limit on parallel calls (see parallel_calls).
+    """
+    if backend is None:
+        backend = get_backend(api_key)
+    if (mode or os.environ.get("GENERATION_MODE", "single")) == "two_stage":
+        return generate_two_stage(text_input, api_key, backend, report=report, source_map=source_map, slots=slots)
     
-    for model_name in models_to_try:
+    available_models(backend)
+
+    for model_name in ROUTER.candidates(estimate_tokens(text_input)):
         try:
-            print(f"DEBUG: Trying model {model_name}...")
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(
-                contents=[SYSTEM_PROMPT, f"Input Text:\n{text_input}"],
-                generation_config={"response_mime_type": "application/json"}
-            )
-            text = response.text
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0]
-            return json.loads(text)
+            print(f"DEBUG: Trying model {model_name} via {backend.name}...")
+            # The static system prompt is served from a cached context where possible
+            slides = _attempt(backend, model_name, [f"Input Text:\n{text_input}"], extract_slides,
+                              system=SYSTEM_PROMPT, report=report)
+            if source_map is not None:
+                source_map[:] = map_sources(slides, [p for _, _, p in split_paragraphs(text_input)],
+                                            OUTLINE_ONLY_TYPES)
+            return slides
         except Exception as e:
             print(f"Error with model {model_name}: {e}")
             continue # Try next model
@@ -50,31 +173,427 @@ def generate_json_from_text(text_input, api_key):
     print("Error: All models failed.")
     return None
 
-def escape_vba(text):
-    if not text:
-        return ""
-    return str(text).replace('"', '""').replace('\n', '" & vbCr & "')
+def generate_outline(paragraphs, backend, report=None):
+    """First stage: slide types, titles and the source paragraphs (0-based) each slide covers."""
+    prompt = OUTLINE_PROMPT.format(
+        types=", ".join(SLIDE_SCHEMAS),
+        paragraphs="\n\n".join(f"[{i + 1}] {p}" for i, p in enumerate(paragraphs))
+    )
+    for model_name in ROUTER.candidates(estimate_tokens(prompt)):
+        try:
+            print(f"DEBUG: Outlining with {model_name} via {backend.name}...")
+            data = _attempt(backend, model_name, [prompt], extract_json, report=report)
+            if not isinstance(data, list):
+                raise ValueError("expected a JSON array")
+            outline = []
+            for entry in data:
+                if not isinstance(entry, dict):
+                    continue
+                refs = entry.get('paragraphs') or []
+                outline.append({
+                    'type': entry.get('type') if entry.get('type') in SLIDE_SCHEMAS else 'content',
+                    'title': str(entry.get('title', '')),
+                    'paragraphs': [r - 1 for r in refs if isinstance(r, int) and 1 <= r <= len(paragraphs)]
+                })
+            if outline:
+                return outline
+            raise ValueError("empty outline")
+        except Exception as e:
+            print(f"Error with model {model_name}: {e}")
+            continue
+    return None
 
-def get_rgb_string(hex_color):
-    try:
-        r, g, b = ColorUtils.hex_to_rgb(hex_color)
-        return f"RGB({r}, {g}, {b})"
-    except:
-        return "RGB(0, 0, 0)"
+def _merge_usage(report, usage):
+    if report is not None:
+        for part in usage:
+            for key, value in part.items():
+                report[key] = report.get(key, 0) + value
+
+def expand_outline(outline, paragraphs, text_input, api_key, backend, report=None, slots=None):
+    """Second stage: one slide per outline entry, generated in parallel."""
+    # One usage dict per slide, merged afterwards, so the threads don't share one
+    usage = [{} for _ in outline]
+
+    def expand(i):
+        entry = outline[i]
+        if entry['type'] in OUTLINE_ONLY_TYPES:
+            slide = {'type': entry['type'], 'title': entry['title']}
+            if entry['type'] == 'section':
+                slide['sectionNo'] = str(sum(1 for e in outline[:i + 1] if e['type'] == 'section'))
+            return normalize_slide(slide)
+        if entry['paragraphs']:
+            excerpt = "\n\n".join(paragraphs[p] for p in entry['paragraphs'])[:MAX_EXCERPT_CHARS]
+        else:
+            excerpt = best_excerpt(text_input, entry['title'], MAX_EXCERPT_CHARS)
+        context = {
+            'title': entry['title'],
+            'prev_title': outline[i - 1]['title'] if i > 0 else '',
+            'next_title': outline[i + 1]['title'] if i + 1 < len(outline) else '',
+            'excerpt': excerpt
+        }
+        slide = generate_slide(context, entry['type'], api_key, backend, report=usage[i])
+        if slide is None:
+            # Keep the slide rather than dropping it from the deck
+            slide = normalize_slide({'type': 'content', 'title': entry['title'], 'points': [excerpt[:200]] if excerpt else []})
+        return slide
+
+    calls = sum(1 for entry in outline if entry['type'] not in OUTLINE_ONLY_TYPES)
+    with parallel_calls(calls, slots) as workers, ThreadPoolExecutor(max_workers=workers) as pool:
+        slides = list(pool.map(expand, range(len(outline))))
+    _merge_usage(report, usage)
+    return slides
+
+def generate_two_stage(text_input, api_key, backend, report=None, source_map=None, slots=None):
+    paragraphs = [p for _, _, p in split_paragraphs(text_input)]
+    outline = generate_outline(paragraphs, backend, report=report)
+    if not outline:
+        print("Error: Outline generation failed.")
+        return None
+    slides = expand_outline(outline, paragraphs, text_input, api_key, backend, report=report, slots=slots)
+    if source_map is not None:
+        source_map[:] = [[] if e['type'] in OUTLINE_ONLY_TYPES else e['paragraphs'] for e in outline]
+    return slides
+
+# Incremental regeneration: above this share of changed paragraphs the whole
+# deck is generated again instead (INCREMENTAL_MAX_CHANGE, 0-1).
+DEFAULT_MAX_CHANGE = 0.5
+
+def _renumber_sections(slides):
+    number = 0
+    for slide in slides:
+        if slide['type'] == 'section':
+            number += 1
+            if str(slide.get('sectionNo', '')).isdigit():
+                slide['sectionNo'] = str(number)
+
+def generate_incremental(old_text, old_slides, old_source_map, text_input, api_key,
+                         backend=None, report=None, source_map=None, slots=None):
+    """
+    Regenerates only what an edit of the source changed. The unchanged slides
+    of old_slides are kept, slides made from edited paragraphs are rewritten
+    with generate_slide, and text no slide covered gets new slides from a
+    small outline. Returns None when a full generation is the better option
+    (no usable source map, or too much changed); source_map receives the new map.
+    slots: optional limit on parallel calls (see parallel_calls).
+    """
+    if backend is None:
+        backend = get_backend(api_key)
+    old_paragraphs = [p for _, _, p in split_paragraphs(old_text)]
+    paragraphs = [p for _, _, p in split_paragraphs(text_input)]
+    if not paragraphs or not old_source_map or len(old_source_map) != len(old_slides):
+        return None
+    plan, changed = plan_update(old_paragraphs, paragraphs, old_source_map)
+    max_change = float(os.environ.get("INCREMENTAL_MAX_CHANGE", DEFAULT_MAX_CHANGE))
+    if changed > max_change * len(paragraphs):
+        print(f"DEBUG: {changed}/{len(paragraphs)} paragraphs changed; regenerating the whole deck")
+        return None
+    print(f"DEBUG: {changed}/{len(paragraphs)} paragraphs changed; "
+          f"{sum(1 for op in plan if op[0] != 'keep')} of {len(plan)} plan entries need the model")
+
+    usage = [{} for _ in plan]
+
+    def run(k):
+        op, i, refs = plan[k]
+        if op == "keep":
+            return [old_slides[i]], [refs]
+        excerpt = "\n\n".join(paragraphs[p] for p in refs)[:MAX_EXCERPT_CHARS]
+        if op == "regenerate":
+            old = old_slides[i]
+            context = {
+                'title': old.get('title', ''),
+                'prev_title': old_slides[i - 1].get('title', '') if i > 0 else '',
+                'next_title': old_slides[i + 1].get('title', '') if i + 1 < len(old_slides) else '',
+                'excerpt': excerpt
+            }
+            slide = generate_slide(context, old['type'], api_key, backend, report=usage[k])
+            if slide is None:
+                print(f"DEBUG: keeping slide {i + 1} unchanged; regenerating it failed")
+                slide = old_slides[i]
+            return [slide], [refs]
+        # New text: plan it like a small deck, minus another title slide
+        outline = generate_outline([paragraphs[p] for p in refs], backend, report=usage[k])
+        outline = [e for e in (outline or []) if e['type'] != 'title']
+        if not outline:
+            return [normalize_slide({'type': 'content', 'title': '', 'points': [excerpt[:200]]})], [refs]
+        # Sequential within an entry, so entries running in parallel stay within their share
+        slides = expand_outline(outline, [paragraphs[p] for p in refs], excerpt, api_key, backend,
+                                report=usage[k], slots=_one_at_a_time)
+        return slides, [[] if e['type'] in OUTLINE_ONLY_TYPES else [refs[p] for p in e['paragraphs']]
+                        for e in outline]
+
+    calls = sum(1 for op, _, _ in plan if op != "keep")
+    with parallel_calls(calls, slots) as workers, ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, range(len(plan))))
+    _merge_usage(report, usage)
+
+    slides, new_map = [], []
+    for part_slides, part_map in results:
+        slides.extend(part_slides)
+        new_map.extend(part_map)
+    if any(op == "insert" for op, _, _ in plan):
+        _renumber_sections(slides)
+    if source_map is not None:
+        source_map[:] = new_map
+    return slides
+
+def generate_slide(context, slide_type, api_key, backend=None, report=None):
+    """
+    Generates one replacement slide.
+    context: dict with 'title', 'prev_title', 'next_title' and 'excerpt' (the relevant source text).
+    """
+    if backend is None:
+        backend = get_backend(api_key)
+
+    prompt = SLIDE_PROMPT.format(
+        slide_type=slide_type,
+        fields=json.dumps(model_schema_for(slide_type), ensure_ascii=False),
+        prev_title=context.get('prev_title') or '-',
+        next_title=context.get('next_title') or '-',
+        title=context.get('title') or '-',
+        excerpt=context.get('excerpt') or ''
+    )
+    for model_name in ROUTER.candidates(estimate_tokens(prompt)):
+        try:
+            print(f"DEBUG: Regenerating {slide_type} slide with {model_name} via {backend.name}...")
+            data = _attempt(backend, model_name, [prompt], extract_json, report=report)
+            if isinstance(data, list):
+                data = data[0] if data else None
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
+            data['type'] = slide_type
+            slides, _ = clean_slides([data])
+            return slides[0]
+        except Exception as e:
+            print(f"Error with model {model_name}: {e}")
+            continue
+
+    print("Error: All models failed.")
+    return None
+
+LINE_BREAK = re.compile(r"(\r\n|\n)")
+
+def vba_string(text):
+    """A VBA string expression for text: "\n" becomes vbCr (new paragraph), "\r\n" vbCrLf."""
+    text = str(text)
+    if "\n" not in text:
+        return '"' + text.replace('"', '""') + '"'
+    parts = []
+    for piece in LINE_BREAK.split(text):
+        if piece == "\r\n":
+            parts.append("vbCrLf")
+        elif piece == "\n":
+            parts.append("vbCr")
+        elif piece:
+            parts.append('"' + piece.replace('"', '""') + '"')
+    return " & ".join(parts) or '""'
+
+@lru_cache(maxsize=256)
+def vba_rgb(color):
+    r, g, b = color
+    return f"RGB({r}, {g}, {b})"
+
+FONT_PROPS = (("name", "Name"), ("size", "Size"), ("bold", "Bold"), ("italic", "Italic"), ("color", "Color.RGB"))
+
+def _vba_font_value(key, value):
+    if key == "name":
+        return vba_string(value)
+    if key == "color":
+        return vba_rgb(value)
+    if key in ("bold", "italic"):
+        return "msoTrue" if value else "msoFalse"
+    return value
+
+# Slides repeat a handful of fonts, so their lines are built once per target
+@lru_cache(maxsize=256)
+def _vba_font_props(font):
+    """Font property assignments, each to be prefixed with the target's indented name."""
+    return tuple(f".TextFrame.TextRange.Font.{prop} = {_vba_font_value(key, value)}"
+                 for key, prop in FONT_PROPS for k, value in font if k == key)
+
+@lru_cache(maxsize=1024)
+def _vba_font_lines(target, font):
+    return "\n".join(f"    {target}{assignment}" for assignment in _vba_font_props(font))
+
+def _vba_style(vba, target, fill=None, line=None, text=None, font=None, align=None, autofit=None):
+    """Property lines for one shape (or table cell) addressed as target; arguments as in layout.py."""
+    if fill is not None:
+        vba.append(f"    {target}.Fill.ForeColor.RGB = {vba_rgb(fill)}")
+    if line:
+        if line.get("visible") is False:
+            vba.append(f"    {target}.Line.Visible = msoFalse")
+        if "color" in line:
+            vba.append(f"    {target}.Line.ForeColor.RGB = {vba_rgb(line['color'])}")
+        if "weight" in line:
+            vba.append(f"    {target}.Line.Weight = {line['weight']}")
+    if text is not None:
+        vba.append(f"    {target}.TextFrame.TextRange.Text = {vba_string(text)}")
+    if font:
+        vba.append(_vba_font_lines(target, tuple(font.items())))
+    if align is not None:
+        vba.append(f"    {target}.TextFrame.TextRange.ParagraphFormat.Alignment = {align}")
+    if autofit:
+        vba.append(f"    {target}.TextFrame2.AutoSize = 2 ' msoAutoSizeTextToFitShape")
+
+# AddChart2 chart types: xlBarClustered, xlColumnClustered, xlLine, xlPie
+XL_CHART_TYPES = {"bar": 57, "column": 51, "line": 4, "pie": 5}
+# Separators for chart data, the first two that no label contains
+CHART_SEPARATORS = "|~^`"
+CHART_DATA_LINE = 800 # characters of chart data per macro line (VBA allows 1023)
+
+def _chart_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.replace("\r", " ").replace("\n", " ")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _vba_chart_data(vba, rows):
+    """Sets chartData to the chart's rows as one string; returns (cell separator, row separator)."""
+    text = "".join(str(cell) for row in rows for cell in row)
+    cell_sep, row_sep = ([c for c in CHART_SEPARATORS if c not in text] + list(CHART_SEPARATORS))[:2]
+    data = row_sep.join(cell_sep.join(_chart_cell(cell).replace(cell_sep, " ").replace(row_sep, " ") for cell in row)
+                        for row in rows)
+    for start in range(0, len(data), CHART_DATA_LINE):
+        piece = vba_string(data[start:start + CHART_DATA_LINE])
+        vba.append(f"    chartData = {piece}" if start == 0 else f"    chartData = chartData & {piece}")
+    return cell_sep, row_sep
+
+def _vba_chart(vba, prim):
+    left, top, width, height = prim["box"]
+    vba.append(f"    Set pptShape = pptSlide.Shapes.AddChart2(-1, {XL_CHART_TYPES[prim['chart']]}, {left}, {top}, {width}, {height})")
+    cell_sep, row_sep = _vba_chart_data(vba, chart_table(prim))
+    vba.append(f"    FillChart pptShape.Chart, chartData, {vba_string(cell_sep)}, {vba_string(row_sep)}")
+    target = "pptShape.Chart"
+    vba.append(f"    {target}.HasTitle = False")
+    vba.append(f"    {target}.HasLegend = {'True' if prim.get('legend') else 'False'}")
+    if prim.get("legend"):
+        vba.append(f"    {target}.Legend.Position = -4107 ' xlLegendPositionBottom")
+    if prim["chart"] == "bar":
+        # First category on top, with the value axis kept at the bottom
+        vba.append(f"    {target}.Axes(1).ReversePlotOrder = True")
+        vba.append(f"    {target}.Axes(1).Crosses = 2 ' xlMaximum")
+    if "axis_max" in prim:
+        vba.append(f"    {target}.Axes(2).MinimumScale = 0")
+        vba.append(f"    {target}.Axes(2).MaximumScale = {prim['axis_max']}")
+    for k, series in enumerate(prim["series"], 1):
+        if "color" in series:
+            part = "Line" if prim["chart"] == "line" else "Fill"
+            vba.append(f"    {target}.SeriesCollection({k}).Format.{part}.ForeColor.RGB = {vba_rgb(series['color'])}")
+        if prim.get("data_labels"):
+            vba.append(f"    {target}.SeriesCollection({k}).HasDataLabels = True")
+    font = prim.get("font", {})
+    if "name" in font:
+        vba.append(f"    {target}.ChartArea.Format.TextFrame2.TextRange.Font.Name = {vba_string(font['name'])}")
+    if "size" in font:
+        vba.append(f"    {target}.ChartArea.Format.TextFrame2.TextRange.Font.Size = {font['size']}")
+
+class VbaCanvas:
+    """A layout canvas (see layout.py) that writes each shape as macro lines as it is drawn."""
+
+    def __init__(self, vba):
+        self.vba = vba
+        self.charts = False
+
+    def textbox(self, box, text, font=None, align=None, autofit=None):
+        left, top, width, height = box
+        self.vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {left}, {top}, {width}, {height})")
+        _vba_style(self.vba, "pptShape", text=text, font=font, align=align, autofit=autofit)
+
+    def shape(self, mso_shape, box, fill=None, line=None, text=None, font=None, align=None, autofit=None):
+        left, top, width, height = box
+        self.vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape({mso_shape}, {left}, {top}, {width}, {height})")
+        _vba_style(self.vba, "pptShape", fill, line, text, font, align, autofit)
+
+    def line(self, x1, y1, x2, y2, color, weight=None):
+        self.vba.append(f"    Set pptShape = pptSlide.Shapes.AddLine({x1}, {y1}, {x2}, {y2})")
+        self.vba.append(f"    pptShape.Line.ForeColor.RGB = {vba_rgb(color)}")
+        if weight is not None:
+            self.vba.append(f"    pptShape.Line.Weight = {weight}")
+
+    def table(self, box, rows, cols, cells):
+        left, top, width, height = box
+        self.vba.append(f"    Set pptShape = pptSlide.Shapes.AddTable({rows}, {cols}, {left}, {top}, {width}, {height})")
+        # Cells share font dicts (see layout._table_slide); each is rendered once per table
+        vba, fonts = self.vba, {}
+        for (r, c), cell in sorted(cells.items()):
+            target = f"    pptShape.Table.Cell({r}, {c}).Shape"
+            if "fill" in cell:
+                vba.append(f"{target}.Fill.ForeColor.RGB = {vba_rgb(cell['fill'])}")
+            if "text" in cell:
+                vba.append(f"{target}.TextFrame.TextRange.Text = {vba_string(cell['text'])}")
+            if "font" in cell:
+                font = cell["font"]
+                props = fonts.get(id(font))
+                if props is None:
+                    props = fonts[id(font)] = _vba_font_props(tuple(font.items()))
+                vba.extend([target + assignment for assignment in props])
+
+    def picture(self, box, image):
+        left, top, width, height = box
+        self.vba.append(f"    Set pptShape = pptSlide.Shapes.AddPicture(imageFolder & {vba_string(image)}, "
+                        f"msoFalse, msoTrue, {left}, {top}, {width}, {height})")
+
+    def chart(self, *args, **kwargs):
+        if not self.charts:
+            self.vba.append("    Dim chartData As String")
+            self.charts = True
+        # One per slide at most, so the primitive dict costs nothing worth avoiding
+        _vba_chart(self.vba, chart(*args, **kwargs))
+
+IMAGE_FOLDER_PROMPT = [
+    "    ' Images are files in the images folder of the downloaded zip",
+    "    Dim imageFolder As String",
+    "    imageFolder = InputBox(\"Folder with the images from the downloaded zip:\", \"Images\", CurDir & Application.PathSeparator & \"images\")",
+    "    If imageFolder = \"\" Then Exit Sub",
+    "    If Right(imageFolder, 1) <> Application.PathSeparator Then imageFolder = imageFolder & Application.PathSeparator",
+    "",
+]
+
+# Emitted after the main Sub when the deck has charts. The data arrives as one
+# string and goes into the chart's sheet in a single Range assignment, so a
+# chart costs the same few calls however many points it has.
+FILL_CHART_SUB = [
+    "Sub FillChart(ch As Object, data As String, cellSep As String, rowSep As String)",
+    "    Dim rowTexts() As String, cells() As String, values() As Variant",
+    "    Dim ws As Object, r As Long, c As Long, n As Long, m As Long",
+    "    rowTexts = Split(data, rowSep)",
+    "    n = UBound(rowTexts) + 1",
+    "    m = UBound(Split(rowTexts(0), cellSep)) + 1",
+    "    ReDim values(1 To n, 1 To m)",
+    "    For r = 1 To n",
+    "        cells = Split(rowTexts(r - 1), cellSep)",
+    "        For c = 1 To m",
+    "            If r = 1 Or c = 1 Then",
+    "                ' Kept as text, so labels like 2026 stay labels",
+    "                If cells(c - 1) <> \"\" Then values(r, c) = \"'\" & cells(c - 1)",
+    "            ElseIf cells(c - 1) <> \"\" Then",
+    "                values(r, c) = Val(cells(c - 1))",
+    "            End If",
+    "        Next c",
+    "    Next r",
+    "    ch.ChartData.Activate",
+    "    Set ws = ch.ChartData.Workbook.Worksheets(1)",
+    "    ws.Cells.ClearContents",
+    "    ws.Range(\"A1\").Resize(n, m).Value = values",
+    "    ch.SetSourceData \"='\" & ws.Name & \"'!\" & ws.Range(\"A1\").Resize(n, m).Address, 2 ' xlColumns",
+    "    ch.ChartData.Workbook.Close",
+    "End Sub",
+]
 
 def json_to_vba(data, settings):
     """
     Converts slideData JSON to VBA with custom styling and A4 size.
     settings: dict with keys 'primary_color', 'font_family', 'logo_path' (optional)
+    Shapes are drawn by layout.draw_slide, which the SVG thumbnails share.
+    Uploaded images are read from the images folder of the download's zip
+    (image_pipeline.sidecar_zip), which the macro asks for first. Charts are
+    filled by a FillChart helper Sub after the main one.
     """
     if not data:
         return ""
 
-    primary_color_rgb = get_rgb_string(settings.get('primary_color', '#4285F4'))
-    title_color_rgb = get_rgb_string(settings.get('title_color', '#333333'))
-    body_color_rgb = get_rgb_string(settings.get('body_color', '#333333'))
-    font_family = settings.get('font_family', 'Meiryo')
-    
     vba = []
     vba.append("Sub CreateCustomPresentation()")
     vba.append("    Dim pptApp As Object")
@@ -83,6 +602,9 @@ def json_to_vba(data, settings):
     vba.append("    Dim pptShape As Object")
     vba.append("    Dim slideIndex As Integer")
     vba.append("")
+    # Asked before anything is created, so cancelling leaves no half-built presentation
+    if any(isinstance(slide, dict) and slide.get("type") == "imageText" and parse_ref(slide.get("image")) for slide in data):
+        vba.extend(IMAGE_FOLDER_PROMPT)
     vba.append("    Set pptApp = CreateObject(\"PowerPoint.Application\")")
     vba.append("    pptApp.Visible = True")
     vba.append("    Set pptPres = pptApp.Presentations.Add")
@@ -94,762 +616,23 @@ def json_to_vba(data, settings):
     vba.append(f"    pptPres.PageSetup.SlideHeight = {PPTConfig.SLIDE_HEIGHT_PT}")
     vba.append("")
 
-    for i, slide in enumerate(data):
-        slide_type = slide.get("type", "content")
-        title = escape_vba(slide.get("title", ""))
-        subhead = escape_vba(slide.get("subhead", ""))
-        notes = escape_vba(slide.get("notes", ""))
-        
-        vba.append(f"    ' === Slide {i+1}: {slide_type} ===")
+    theme = theme_for(settings)
+    canvas = VbaCanvas(vba)
+    background = vba_rgb(WHITE)
+    for n, (i, page) in enumerate(deck_pages(data), 1):
+        vba.append(f"    ' === Slide {n}: {page['type']} ===")
         vba.append(f"    Set pptSlide = pptPres.Slides.Add(pptPres.Slides.Count + 1, 12) ' 12 = ppLayoutBlank")
-        
-        # --- Common Elements ---
         vba.append("    pptSlide.FollowMasterBackground = msoFalse")
-        vba.append("    pptSlide.Background.Fill.ForeColor.RGB = RGB(255, 255, 255)")
-        
-        if slide_type == "title":
-            pos = PPTConfig.POS_PX["titleSlide"]
-            t_rect = pos["title"]
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(t_rect['left'])}, {PPTConfig.px_to_pt(t_rect['top'])}, {PPTConfig.px_to_pt(t_rect['width'])}, {PPTConfig.px_to_pt(t_rect['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{title}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['title']}")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {title_color_rgb}")
-            vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2 ' Center")
-            vba.append(f"    pptShape.TextFrame2.AutoSize = 2 ' msoAutoSizeTextToFitShape")
-            
-            d_rect = pos["date"]
-            date_str = escape_vba(slide.get("date", ""))
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(d_rect['left'])}, {PPTConfig.px_to_pt(d_rect['top'])}, {PPTConfig.px_to_pt(d_rect['width'])}, {PPTConfig.px_to_pt(d_rect['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{date_str}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['date']}")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {body_color_rgb}")
-            
-        elif slide_type == "section":
-            pos = PPTConfig.POS_PX["sectionSlide"]
-            g_rect = pos["ghostNum"]
-            section_no = slide.get("sectionNo", i)
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(g_rect['left'])}, {PPTConfig.px_to_pt(g_rect['top'])}, {PPTConfig.px_to_pt(g_rect['width'])}, {PPTConfig.px_to_pt(g_rect['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{section_no}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 180")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(240, 240, 240)")
-            
-            t_rect = pos["title"]
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(t_rect['left'])}, {PPTConfig.px_to_pt(t_rect['top'])}, {PPTConfig.px_to_pt(t_rect['width'])}, {PPTConfig.px_to_pt(t_rect['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{title}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['sectionTitle']}")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {title_color_rgb}")
-            vba.append(f"    pptShape.TextFrame2.AutoSize = 2 ' msoAutoSizeTextToFitShape")
-            
-        elif slide_type == "process":
-            # --- Process Slide ---
-            pos = PPTConfig.POS_PX["processSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            area = pos["area"]
-            steps = slide.get("steps", [])[:4] # Max 4 steps
-            if steps:
-                n = len(steps)
-                colors = ColorUtils.generate_process_colors(settings['primary_color'], n)
-                
-                # Dimensions
-                box_h_px = 65 if n > 3 else (80 if n == 3 else 100)
-                arrow_h_px = 15 if n > 3 else (20 if n == 3 else 25)
-                font_size = 24 # Minimum 24pt
-                
-                box_h_pt = PPTConfig.px_to_pt(box_h_px)
-                arrow_h_pt = PPTConfig.px_to_pt(arrow_h_px)
-                header_w_pt = PPTConfig.px_to_pt(120)
-                
-                start_y = PPTConfig.px_to_pt(area['top'] + 10)
-                current_y = start_y
-                
-                body_left = PPTConfig.px_to_pt(area['left']) + header_w_pt
-                body_w_pt = PPTConfig.px_to_pt(area['width']) - header_w_pt
-                
-                for i, step in enumerate(steps):
-                    # Header (Step N)
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {PPTConfig.px_to_pt(area['left'])}, {current_y}, {header_w_pt}, {box_h_pt})") # msoShapeRectangle
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {colors[i]}")
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"STEP {i+1}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {font_size}")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2") # Center
-                    
-                    # Body
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {body_left}, {current_y}, {body_w_pt}, {box_h_pt})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {ColorUtils.generate_tinted_gray(settings['primary_color'], 10, 95)}") # Light gray
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    
-                    # Text
-                    text_shape_left = body_left + PPTConfig.px_to_pt(20)
-                    text_shape_w = body_w_pt - PPTConfig.px_to_pt(40)
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {text_shape_left}, {current_y}, {text_shape_w}, {box_h_pt})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(step)}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {font_size}")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {body_color_rgb}")
-                    vba.append(f"    pptShape.TextFrame2.AutoSize = 2")
-                    
-                    current_y += box_h_pt
-                    
-                    # Arrow
-                    if i < n - 1:
-                        arrow_left = PPTConfig.px_to_pt(area['left']) + header_w_pt / 2 - PPTConfig.px_to_pt(8)
-                        vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(66, {arrow_left}, {current_y}, {PPTConfig.px_to_pt(16)}, {arrow_h_pt})") # msoShapeDownArrow
-                        vba.append(f"    pptShape.Fill.ForeColor.RGB = {ColorUtils.generate_tinted_gray(settings['primary_color'], 38, 88)}") # Ghost gray
-                        vba.append(f"    pptShape.Line.Visible = msoFalse")
-                        current_y += arrow_h_pt
-
-        elif slide_type == "timeline":
-            # --- Timeline Slide ---
-            pos = PPTConfig.POS_PX["timelineSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            area = pos["area"]
-            milestones = slide.get("milestones", [])
-            if milestones:
-                n = len(milestones)
-                colors = ColorUtils.generate_timeline_colors(settings['primary_color'], n)
-                
-                base_y = PPTConfig.px_to_pt(area['top'] + area['height'] * 0.5)
-                inner_margin = PPTConfig.px_to_pt(80)
-                left_x = PPTConfig.px_to_pt(area['left']) + inner_margin
-                right_x = PPTConfig.px_to_pt(area['left'] + area['width']) - inner_margin
-                
-                # Main Line
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddLine({left_x}, {base_y}, {right_x}, {base_y})")
-                vba.append(f"    pptShape.Line.ForeColor.RGB = RGB(200, 200, 200)")
-                vba.append(f"    pptShape.Line.Weight = 2")
-                
-                gap = (right_x - left_x) / (n - 1) if n > 1 else 0
-                card_w = PPTConfig.px_to_pt(180)
-                v_offset = PPTConfig.px_to_pt(40)
-                header_h = PPTConfig.px_to_pt(28)
-                body_h = PPTConfig.px_to_pt(80)
-                
-                for i, m in enumerate(milestones):
-                    x = left_x + gap * i
-                    is_above = (i % 2 == 0)
-                    
-                    card_left = x - (card_w / 2)
-                    card_top = (base_y - v_offset - header_h - body_h) if is_above else (base_y + v_offset)
-                    
-                    # Connector
-                    conn_y1 = (card_top + header_h + body_h) if is_above else base_y
-                    conn_y2 = base_y if is_above else card_top
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddLine({x}, {conn_y1}, {x}, {conn_y2})")
-                    vba.append(f"    pptShape.Line.ForeColor.RGB = RGB(150, 150, 150)")
-                    
-                    # Dot
-                    dot_r = PPTConfig.px_to_pt(10)
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(9, {x - dot_r/2}, {base_y - dot_r/2}, {dot_r}, {dot_r})") # msoShapeOval
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(colors[i])}")
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    
-                    # Card Header
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {card_left}, {card_top}, {card_w}, {header_h})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(colors[i])}")
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(m.get('date', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    
-                    # Card Body
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {card_left}, {card_top + header_h}, {card_w}, {body_h})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(ColorUtils.generate_tinted_gray(settings['primary_color'], 10, 95))}")
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(m.get('label', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {body_color_rgb}")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 24")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    vba.append(f"    pptShape.TextFrame2.AutoSize = 2")
-
-        elif slide_type == "cycle":
-            # --- Cycle Slide ---
-            pos = PPTConfig.POS_PX["cycleSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            area = pos["body"]
-            items = slide.get("items", [])[:4]
-            if items:
-                center_x = PPTConfig.px_to_pt(area['left'] + area['width'] / 2)
-                center_y = PPTConfig.px_to_pt(area['top'] + area['height'] / 2)
-                radius_x = PPTConfig.px_to_pt(area['width'] / 3.2)
-                radius_y = PPTConfig.px_to_pt(area['height'] / 2.6)
-                
-                card_w = PPTConfig.px_to_pt(200)
-                card_h = PPTConfig.px_to_pt(90)
-                
-                positions = [
-                    (center_x + radius_x, center_y),
-                    (center_x, center_y + radius_y),
-                    (center_x - radius_x, center_y),
-                    (center_x, center_y - radius_y)
-                ]
-                
-                for i, item in enumerate(items):
-                    if i >= 4: break
-                    pos_x, pos_y = positions[i]
-                    card_left = pos_x - card_w / 2
-                    card_top = pos_y - card_h / 2
-                    
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {card_left}, {card_top}, {card_w}, {card_h})") # msoShapeRoundedRectangle
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {primary_color_rgb}")
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    
-                    label = item.get("label", "")
-                    sub = item.get("subLabel", f"Phase {i+1}")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{sub}\" & vbCrLf & \"{label}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    vba.append(f"    pptShape.TextFrame2.AutoSize = 2")
-
-        elif slide_type == "cards":
-            # --- Cards Slide ---
-            pos = PPTConfig.POS_PX["cardsSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            area = pos["gridArea"]
-            items = slide.get("items", [])
-            if items:
-                cols = 3 if len(items) > 4 else 2
-                rows = (len(items) + cols - 1) // cols
-                gap = PPTConfig.px_to_pt(16)
-                
-                area_w = PPTConfig.px_to_pt(area['width'])
-                area_h = PPTConfig.px_to_pt(area['height'])
-                card_w = (area_w - gap * (cols - 1)) / cols
-                card_h = (area_h - gap * (rows - 1)) / rows
-                
-                for i, item in enumerate(items):
-                    r = i // cols
-                    c = i % cols
-                    left = PPTConfig.px_to_pt(area['left']) + c * (card_w + gap)
-                    top = PPTConfig.px_to_pt(area['top']) + r * (card_h + gap)
-                    
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {left}, {top}, {card_w}, {card_h})") # msoShapeRoundedRectangle
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(ColorUtils.generate_tinted_gray(settings['primary_color'], 10, 95))}")
-                    vba.append(f"    pptShape.Line.ForeColor.RGB = {get_rgb_string(ColorUtils.generate_tinted_gray(settings['primary_color'], 15, 88))}")
-                    
-                    title = item.get("title", "")
-                    desc = item.get("desc", "")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{title}\" & vbCrLf & vbCrLf & \"{desc}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {body_color_rgb}")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    vba.append(f"    pptShape.TextFrame2.AutoSize = 2")
-
-        elif slide_type == "pyramid":
-            # --- Pyramid Slide ---
-            pos = PPTConfig.POS_PX["pyramidSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            area = pos["pyramidArea"]
-            levels = slide.get("levels", [])[:4]
-            if levels:
-                n = len(levels)
-                colors = ColorUtils.generate_pyramid_colors(settings['primary_color'], n)
-                
-                level_h = PPTConfig.px_to_pt(70)
-                gap = PPTConfig.px_to_pt(2)
-                total_h = (level_h * n) + (gap * (n - 1))
-                
-                start_y = PPTConfig.px_to_pt(area['top']) + (PPTConfig.px_to_pt(area['height']) - total_h) / 2
-                pyramid_w = PPTConfig.px_to_pt(480)
-                center_x = PPTConfig.px_to_pt(area['left']) + pyramid_w / 2
-                
-                text_col_left = PPTConfig.px_to_pt(area['left']) + pyramid_w + PPTConfig.px_to_pt(30)
-                text_col_w = PPTConfig.px_to_pt(400)
-                
-                base_w = pyramid_w
-                w_decrement = base_w / n
-                
-                for i, level in enumerate(levels):
-                    level_w = base_w - (w_decrement * (n - 1 - i))
-                    level_x = center_x - level_w / 2
-                    level_y = start_y + i * (level_h + gap)
-                    
-                    # Pyramid Level
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {level_x}, {level_y}, {level_w}, {level_h})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(colors[i])}")
-                    vba.append(f"    pptShape.Line.Visible = msoFalse")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{level.get('title', '')}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    
-                    # Description
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {text_col_left}, {level_y}, {text_col_w}, {level_h})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{level.get('description', '')}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 24")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {body_color_rgb}")
-                    vba.append(f"    pptShape.TextFrame2.AutoSize = 2")
-
-        elif slide_type == "compare":
-            # --- Compare Slide ---
-            pos = PPTConfig.POS_PX["compareSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            l_rect = pos["leftBox"]
-            r_rect = pos["rightBox"]
-            
-            # Left Box
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {PPTConfig.px_to_pt(l_rect['left'])}, {PPTConfig.px_to_pt(l_rect['top'])}, {PPTConfig.px_to_pt(l_rect['width'])}, {PPTConfig.px_to_pt(l_rect['height'])})")
-            vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(ColorUtils.generate_tinted_gray(settings['primary_color'], 10, 95))}")
-            vba.append(f"    pptShape.Line.Visible = msoFalse")
-            
-            # Left Title
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(l_rect['left'])}, {PPTConfig.px_to_pt(l_rect['top'])}, {PPTConfig.px_to_pt(l_rect['width'])}, 40)")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{slide.get('leftTitle', 'Option A')}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-            vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-            
-            # Left Items
-            l_items = "\\r".join(slide.get("leftItems", []))
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(l_rect['left']) + 10}, {PPTConfig.px_to_pt(l_rect['top']) + 40}, {PPTConfig.px_to_pt(l_rect['width']) - 20}, {PPTConfig.px_to_pt(l_rect['height']) - 50})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(l_items.replace('\\r', '\n'))}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 24")
-            
-            # Right Box
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {PPTConfig.px_to_pt(r_rect['left'])}, {PPTConfig.px_to_pt(r_rect['top'])}, {PPTConfig.px_to_pt(r_rect['width'])}, {PPTConfig.px_to_pt(r_rect['height'])})")
-            vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(ColorUtils.generate_tinted_gray(settings['primary_color'], 5, 98))}")
-            vba.append(f"    pptShape.Line.Visible = msoFalse")
-            
-            # Right Title
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(r_rect['left'])}, {PPTConfig.px_to_pt(r_rect['top'])}, {PPTConfig.px_to_pt(r_rect['width'])}, 40)")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{slide.get('rightTitle', 'Option B')}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-            vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-            
-            # Right Items
-            r_items = "\\r".join(slide.get("rightItems", []))
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(r_rect['left']) + 10}, {PPTConfig.px_to_pt(r_rect['top']) + 40}, {PPTConfig.px_to_pt(r_rect['width']) - 20}, {PPTConfig.px_to_pt(r_rect['height']) - 50})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(r_items.replace('\\r', '\n'))}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 24")
-
-        elif slide_type == "diagram":
-            pos = PPTConfig.POS_PX["diagramSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            shapes = slide.get("shapes", [])
-            for shp in shapes:
-                # Basic shape mapping
-                st = shp.get("shapeType", "rect")
-                mso_shape = 1 # msoShapeRectangle
-                if st == "oval": mso_shape = 9 # msoShapeOval
-                elif st == "rounded_rect": mso_shape = 5 # msoShapeRoundedRectangle
-                
-                x = PPTConfig.px_to_pt(shp.get("x", 100))
-                y = PPTConfig.px_to_pt(shp.get("y", 100))
-                w = PPTConfig.px_to_pt(shp.get("w", 100))
-                h = PPTConfig.px_to_pt(shp.get("h", 50))
-                
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape({mso_shape}, {x}, {y}, {w}, {h})")
-                vba.append(f"    pptShape.Fill.ForeColor.RGB = {primary_color_rgb}")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(shp.get('label', ''))}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-
-        elif slide_type == "flowChart":
-            pos = PPTConfig.POS_PX["flowChartSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            flows = slide.get("flows", [])
-            if flows:
-                steps = flows[0].get("steps", [])
-                n = len(steps)
-                if n > 0:
-                    area = pos["area"]
-                    box_w = PPTConfig.px_to_pt(150)
-                    box_h = PPTConfig.px_to_pt(60)
-                    gap = PPTConfig.px_to_pt(30)
-                    
-                    # Center the flow chart
-                    total_w = n * box_w + (n - 1) * gap
-                    center_x = PPTConfig.px_to_pt(area['left'] + area['width'] / 2)
-                    start_x = center_x - total_w / 2
-                    
-                    start_y = PPTConfig.px_to_pt(area['top']) + PPTConfig.px_to_pt(50)
-                    
-                    for i, step in enumerate(steps):
-                        x = start_x + i * (box_w + gap)
-                        vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {x}, {start_y}, {box_w}, {box_h})")
-                        vba.append(f"    pptShape.Fill.ForeColor.RGB = {primary_color_rgb}")
-                        vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(step)}\"")
-                        vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                        vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-                        
-                        if i < n - 1:
-                            arrow_x = x + box_w
-                            arrow_y = start_y + box_h / 2 - PPTConfig.px_to_pt(5)
-                            vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(33, {arrow_x}, {arrow_y}, {gap}, {PPTConfig.px_to_pt(10)})") # msoShapeRightArrow
-                            vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(ColorUtils.generate_tinted_gray(settings['primary_color'], 20, 80))}")
-
-        elif slide_type == "stepUp":
-            pos = PPTConfig.POS_PX["stepUpSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            steps = slide.get("steps", [])
-            n = len(steps)
-            if n > 0:
-                area = pos["area"]
-                step_w = PPTConfig.px_to_pt(area['width']) / n
-                step_h = PPTConfig.px_to_pt(50)
-                base_y = PPTConfig.px_to_pt(area['top']) + PPTConfig.px_to_pt(area['height'])
-                
-                for i, step in enumerate(steps):
-                    h = (i + 1) * step_h
-                    x = PPTConfig.px_to_pt(area['left']) + i * step_w
-                    y = base_y - h
-                    
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {x}, {y}, {step_w}, {h})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {get_rgb_string(ColorUtils.lighten_color(settings['primary_color'], 0.1 * i))}")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(step.get('label', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-
-        elif slide_type == "imageText":
-            pos = PPTConfig.POS_PX["imageTextSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            # Image Placeholder (Left)
-            ia = pos["imageArea"]
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {PPTConfig.px_to_pt(ia['left'])}, {PPTConfig.px_to_pt(ia['top'])}, {PPTConfig.px_to_pt(ia['width'])}, {PPTConfig.px_to_pt(ia['height'])})")
-            vba.append(f"    pptShape.Fill.ForeColor.RGB = RGB(230, 230, 230)")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"[IMAGE: {escape_vba(slide.get('imageDesc', ''))}]\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            
-            # Text (Right)
-            ta = pos["textArea"]
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(ta['left'])}, {PPTConfig.px_to_pt(ta['top'])}, {PPTConfig.px_to_pt(ta['width'])}, {PPTConfig.px_to_pt(ta['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(slide.get('text', ''))}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['body']}")
-
-        elif slide_type == "table":
-            pos = PPTConfig.POS_PX["tableSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            headers = slide.get("headers", [])
-            rows = slide.get("rows", [])
-            if headers:
-                num_rows = len(rows) + 1
-                num_cols = len(headers)
-                area = pos["tableArea"]
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTable({num_rows}, {num_cols}, {PPTConfig.px_to_pt(area['left'])}, {PPTConfig.px_to_pt(area['top'])}, {PPTConfig.px_to_pt(area['width'])}, {PPTConfig.px_to_pt(200)})")
-                
-                # Headers
-                for c, h in enumerate(headers):
-                    vba.append(f"    pptShape.Table.Cell(1, {c+1}).Shape.TextFrame.TextRange.Text = \"{escape_vba(h)}\"")
-                    vba.append(f"    pptShape.Table.Cell(1, {c+1}).Shape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.Table.Cell(1, {c+1}).Shape.Fill.ForeColor.RGB = {primary_color_rgb}")
-                    vba.append(f"    pptShape.Table.Cell(1, {c+1}).Shape.TextFrame.TextRange.Font.Color.RGB = RGB(255, 255, 255)")
-                
-                # Rows
-                for r, row in enumerate(rows):
-                    for c, cell in enumerate(row):
-                        if c < num_cols:
-                            vba.append(f"    pptShape.Table.Cell({r+2}, {c+1}).Shape.TextFrame.TextRange.Text = \"{escape_vba(cell)}\"")
-                            vba.append(f"    pptShape.Table.Cell({r+2}, {c+1}).Shape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-
-        elif slide_type == "progress":
-            pos = PPTConfig.POS_PX["progressSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            items = slide.get("items", [])
-            area = pos["area"]
-            bar_h = PPTConfig.px_to_pt(30)
-            gap = PPTConfig.px_to_pt(20)
-            start_y = PPTConfig.px_to_pt(area['top'])
-            
-            for i, item in enumerate(items):
-                y = start_y + i * (bar_h + gap + 30) # +30 for label
-                
-                # Label
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(area['left'])}, {y}, {PPTConfig.px_to_pt(300)}, 20)")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(item.get('label', ''))}\"")
-                
-                # Track
-                y_bar = y + 25
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {PPTConfig.px_to_pt(area['left'])}, {y_bar}, {PPTConfig.px_to_pt(area['width'])}, {bar_h})")
-                vba.append(f"    pptShape.Fill.ForeColor.RGB = RGB(230, 230, 230)")
-                
-                # Fill
-                pct = item.get("percent", 0)
-                fill_w = PPTConfig.px_to_pt(area['width']) * (pct / 100.0)
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {PPTConfig.px_to_pt(area['left'])}, {y_bar}, {fill_w}, {bar_h})")
-                vba.append(f"    pptShape.Fill.ForeColor.RGB = {primary_color_rgb}")
-
-        elif slide_type == "quote":
-            pos = PPTConfig.POS_PX["quoteSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            qa = pos["quoteArea"]
-            aa = pos["authorArea"]
-            
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(qa['left'])}, {PPTConfig.px_to_pt(qa['top'])}, {PPTConfig.px_to_pt(qa['width'])}, {PPTConfig.px_to_pt(qa['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"“{escape_vba(slide.get('quote', ''))}”\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 32")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Italic = msoTrue")
-            vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2") # Center
-            
-            vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(aa['left'])}, {PPTConfig.px_to_pt(aa['top'])}, {PPTConfig.px_to_pt(aa['width'])}, {PPTConfig.px_to_pt(aa['height'])})")
-            vba.append(f"    pptShape.TextFrame.TextRange.Text = \"— {escape_vba(slide.get('author', ''))}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-            vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 3") # Right
-
-        elif slide_type == "kpi":
-            pos = PPTConfig.POS_PX["kpiSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            kpis = slide.get("kpis", [])
-            if kpis:
-                area = pos["area"]
-                cols = 3
-                rows = (len(kpis) + cols - 1) // cols
-                gap = PPTConfig.px_to_pt(20)
-                w = (PPTConfig.px_to_pt(area['width']) - gap * (cols - 1)) / cols
-                h = PPTConfig.px_to_pt(150)
-                
-                for i, kpi in enumerate(kpis):
-                    r = i // cols
-                    c = i % cols
-                    x = PPTConfig.px_to_pt(area['left']) + c * (w + gap)
-                    y = PPTConfig.px_to_pt(area['top']) + r * (h + gap)
-                    
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(5, {x}, {y}, {w}, {h})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = RGB(245, 245, 245)")
-                    
-                    # Value
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {x}, {y + 10}, {w}, {h/2})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(kpi.get('value', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = 36")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {primary_color_rgb}")
-                    
-                    # Label
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {x}, {y + h/2}, {w}, {h/2})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(kpi.get('label', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-
-        elif slide_type == "bulletCards":
-            pos = PPTConfig.POS_PX["bulletCardsSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            cards = slide.get("cards", [])
-            if cards:
-                area = pos["area"]
-                cols = 2
-                gap = PPTConfig.px_to_pt(20)
-                w = (PPTConfig.px_to_pt(area['width']) - gap * (cols - 1)) / cols
-                h = PPTConfig.px_to_pt(300)
-                
-                for i, card in enumerate(cards):
-                    if i >= 2: break # Limit to 2 for simplicity
-                    x = PPTConfig.px_to_pt(area['left']) + i * (w + gap)
-                    y = PPTConfig.px_to_pt(area['top'])
-                    
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {x}, {y}, {w}, {h})")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = RGB(250, 250, 250)")
-                    vba.append(f"    pptShape.Line.ForeColor.RGB = {primary_color_rgb}")
-                    
-                    # Title
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {x + 10}, {y + 10}, {w - 20}, 40)")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(card.get('title', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    
-                    # Points
-                    points = "\\r".join(["・" + p for p in card.get("points", [])])
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {x + 10}, {y + 50}, {w - 20}, {h - 60})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(points.replace('\\r', '\n'))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-
-        elif slide_type == "faq":
-            pos = PPTConfig.POS_PX["faqSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            items = slide.get("items", [])
-            area = pos["area"]
-            y = PPTConfig.px_to_pt(area['top'])
-            w = PPTConfig.px_to_pt(area['width'])
-            
-            for item in items:
-                # Q
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(area['left'])}, {y}, {w}, 30)")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"Q. {escape_vba(item.get('q', ''))}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {primary_color_rgb}")
-                y += 30
-                
-                # A
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(area['left'])}, {y}, {w}, 40)")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"A. {escape_vba(item.get('a', ''))}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                y += 50
-
-        elif slide_type == "statsCompare":
-            pos = PPTConfig.POS_PX["statsCompareSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            stats = slide.get("stats", [])
-            if stats:
-                lb = pos["leftBox"]
-                rb = pos["rightBox"]
-                
-                # Titles
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(lb['left'])}, {PPTConfig.px_to_pt(lb['top']) - 30}, {PPTConfig.px_to_pt(lb['width'])}, 30)")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(slide.get('leftTitle', ''))}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(rb['left'])}, {PPTConfig.px_to_pt(rb['top']) - 30}, {PPTConfig.px_to_pt(rb['width'])}, 30)")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(slide.get('rightTitle', ''))}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                
-                y = PPTConfig.px_to_pt(lb['top'])
-                h = PPTConfig.px_to_pt(50)
-                
-                for stat in stats:
-                    # Label (Center)
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(460)}, {y}, {PPTConfig.px_to_pt(200)}, {h})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(stat.get('label', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2")
-                    
-                    # Left Value
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(lb['left'])}, {y}, {PPTConfig.px_to_pt(lb['width'])}, {h})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(stat.get('leftValue', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 3") # Right
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    
-                    # Right Value
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(rb['left'])}, {y}, {PPTConfig.px_to_pt(rb['width'])}, {h})")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(stat.get('rightValue', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 1") # Left
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-                    
-                    y += h + 10
-
-        elif slide_type == "barCompare":
-            pos = PPTConfig.POS_PX["barCompareSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            items = slide.get("items", [])
-            if items:
-                area = pos["area"]
-                y = PPTConfig.px_to_pt(area['top'])
-                max_val = 100 # Assumed max
-                w_base = PPTConfig.px_to_pt(300)
-                
-                for item in items:
-                    valA = item.get("valueA", 0)
-                    valB = item.get("valueB", 0)
-                    
-                    # Label
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(area['left'])}, {y}, {PPTConfig.px_to_pt(area['width'])}, 20)")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{escape_vba(item.get('label', ''))}\"")
-                    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                    y += 25
-                    
-                    # Bar A
-                    wa = w_base * (valA / max_val)
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {PPTConfig.px_to_pt(area['left'])}, {y}, {wa}, 20)")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = {primary_color_rgb}")
-                    
-                    # Bar B
-                    wb = w_base * (valB / max_val)
-                    vba.append(f"    Set pptShape = pptSlide.Shapes.AddShape(1, {PPTConfig.px_to_pt(area['left'])}, {y + 25}, {wb}, 20)")
-                    vba.append(f"    pptShape.Fill.ForeColor.RGB = RGB(150, 150, 150)")
-                    
-                    y += 60
-
-        else:
-            # --- Standard Content Slide (Fallback) ---
-            pos = PPTConfig.POS_PX["contentSlide"]
-            draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type)
-            
-            b_rect = pos["body"]
-            content_text = ""
-            if "points" in slide:
-                # Manual bullets
-                content_text = "・" + "\\r・".join(slide["points"])
-            elif "items" in slide:
-                items = slide["items"]
-                if items and isinstance(items[0], str):
-                    content_text = "・" + "\\r・".join(items)
-                elif items and isinstance(items[0], dict):
-                     content_text = "・" + "\\r・".join([f"{item.get('title','')}: {item.get('desc','')}" for item in items])
-            elif "steps" in slide:
-                content_text = "・" + "\\r・".join(slide["steps"])
-            
-            if content_text:
-                content_text = escape_vba(content_text.replace("\\r", "\n"))
-                vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(b_rect['left'])}, {PPTConfig.px_to_pt(b_rect['top'])}, {PPTConfig.px_to_pt(b_rect['width'])}, {PPTConfig.px_to_pt(b_rect['height'])})")
-                vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{content_text}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['body']}")
-                vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {body_color_rgb}")
-                # Removed automatic bullet type assignment
+        vba.append(f"    pptSlide.Background.Fill.ForeColor.RGB = {background}")
+        draw_slide(page, i, theme, canvas)
+        if page["notes"]:
+            vba.append(f"    pptSlide.NotesPage.Shapes.Placeholders(2).TextFrame.TextRange.Text = {vba_string(page['notes'])}")
+        vba.append("")
 
     vba.append("    MsgBox \"Presentation Created!\", vbInformation")
     vba.append("End Sub")
+    if canvas.charts:
+        vba.append("")
+        vba.extend(FILL_CHART_SUB)
     
     return "\n".join(vba)
-
-def draw_common_header(vba, slide, pos, font_family, title_color_rgb, primary_color_rgb, slide_type):
-    title = escape_vba(slide.get("title", ""))
-    subhead = escape_vba(slide.get("subhead", ""))
-    
-    t_rect = pos["title"]
-    vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(t_rect['left'])}, {PPTConfig.px_to_pt(t_rect['top'])}, {PPTConfig.px_to_pt(t_rect['width'])}, {PPTConfig.px_to_pt(t_rect['height'])})")
-    vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{title}\"")
-    vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-    vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['contentTitle']}")
-    vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-    vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {primary_color_rgb}")
-    vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2") # Center
-    vba.append(f"    pptShape.TextFrame2.AutoSize = 2")
-    
-    u_rect = pos["titleUnderline"]
-    line_start_x = PPTConfig.px_to_pt(u_rect['left'])
-    line_start_y = PPTConfig.px_to_pt(u_rect['top'])
-    line_end_x = line_start_x + PPTConfig.px_to_pt(u_rect['width'])
-    vba.append(f"    Set pptShape = pptSlide.Shapes.AddLine({line_start_x}, {line_start_y}, {line_end_x}, {line_start_y})")
-    vba.append(f"    pptShape.Line.ForeColor.RGB = {primary_color_rgb}")
-    vba.append(f"    pptShape.Line.Weight = 2")
-
-    if subhead:
-        s_rect = pos["subhead"]
-        vba.append(f"    Set pptShape = pptSlide.Shapes.AddTextbox(1, {PPTConfig.px_to_pt(s_rect['left'])}, {PPTConfig.px_to_pt(s_rect['top'])}, {PPTConfig.px_to_pt(s_rect['width'])}, {PPTConfig.px_to_pt(s_rect['height'])})")
-        vba.append(f"    pptShape.TextFrame.TextRange.Text = \"{subhead}\"")
-        vba.append(f"    pptShape.TextFrame.TextRange.Font.Name = \"{font_family}\"")
-        vba.append(f"    pptShape.TextFrame.TextRange.Font.Size = {PPTConfig.FONTS['sizes']['subhead']}")
-        vba.append(f"    pptShape.TextFrame.TextRange.Font.Bold = msoTrue")
-        vba.append(f"    pptShape.TextFrame.TextRange.Font.Color.RGB = {title_color_rgb}")
-        vba.append(f"    pptShape.TextFrame.TextRange.ParagraphFormat.Alignment = 2") # Center
-
-    
-    # Notes
-    notes = escape_vba(slide.get("notes", ""))
-    if notes:
-         vba.append(f"    pptSlide.NotesPage.Shapes.Placeholders(2).TextFrame.TextRange.Text = \"{notes}\"")
-
-    vba.append("")
-
-
@@ -0,0 +1,229 @@
+import hmac
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from xml.sax.saxutils import escape
+
+# On-demand request profiling, for finding out in production why one deck's
+# /preview or /download is slow. A profiled request is sampled by a
+# background thread that records the request thread's Python stack every few
+# milliseconds; when the request ends its samples are written to
+# PROFILE_DIR as
+#   <name>.folded  collapsed stacks ("a;b;c 12" per line), for flamegraph.pl,
+#                  speedscope or inferno
+#   <name>.svg     a flamegraph of the same stacks
+#   <name>.txt     the request, its wall time and the top functions
+# and the response carries the name in an X-Profile header.
+#
+# A request is profiled when it sends X-Profile-Token matching PROFILE_TOKEN,
+# or as every PROFILE_SAMPLE_RATE-th matching request of a process. With
+# neither set the app isn't wrapped at all (see create_app), so profiling
+# costs nothing when it is off.
+#
+# Configuration (environment):
+#   PROFILE_TOKEN        secret that profiles a request sending it as X-Profile-Token
+#   PROFILE_SAMPLE_RATE  profile 1 in N requests (default 0, off)
+#   PROFILE_DIR          where profiles are written (default ./profiles)
+#   PROFILE_PATHS        regex of the paths that may be profiled
+#                        (default /preview, /download and /decks/<id>/download)
+#   PROFILE_INTERVAL_MS  time between stack samples (default 5; CPython switches
+#                        threads every 5 ms, so shorter intervals gain little)
+#   PROFILE_TOP          functions in the summary (default 30)
+
+DEFAULT_PATHS = r"^/(preview|download|decks/[^/]+/download)$"
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_TOP = 30
+TOKEN_HEADER = "HTTP_X_PROFILE_TOKEN"
+
+FLAME_WIDTH = 1200
+FLAME_ROW = 16
+FLAME_MIN_WIDTH = 0.5 # px; narrower frames are left out
+
+_code_names = {}
+
+def _frame_name(frame):
+    code = frame.f_code
+    name = _code_names.get(code)
+    if name is None:
+        # "json_to_vba (ppt_generator_web:520)"; ";" separates frames in the collapsed format
+        module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+        name = f"{getattr(code, 'co_qualname', code.co_name)} ({module}:{code.co_firstlineno})".replace(";", ",")
+        _code_names[code] = name
+    return name
+
+class _Sampler(threading.Thread):
+    """Samples one thread's stack, from the root frame down, until stopped; then calls on_stop(stacks)."""
+
+    def __init__(self, thread_id, root, interval, on_stop):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.on_stop = on_stop
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                if frame is self.root:
+                    # Samples taken after the request left the root frame don't reach it
+                    self.stacks[";".join(reversed(stack))] += 1
+                    break
+                frame = frame.f_back
+        self.root = None
+        self.on_stop(self.stacks)
+
+def top_functions(stacks, n):
+    """[(function, own samples, total samples)] for the n functions with the most own samples."""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        # A recursive function counts once per stack
+        for frame in set(frames):
+            total[frame] += count
+    return [(name, samples, total[name]) for name, samples in own.most_common(n)]
+
+def flamegraph_svg(stacks, title):
+    """A flamegraph of collapsed stacks: one box per frame, as wide as its samples, callers below callees."""
+    root = {"samples": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["samples"] += count
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"samples": 0, "children": {}})
+            node["samples"] += count
+    depth = 0
+    boxes = []
+    scale = FLAME_WIDTH / max(1, root["samples"])
+
+    def place(children, x, level):
+        nonlocal depth
+        for name, node in sorted(children.items()):
+            width = node["samples"] * scale
+            if width >= FLAME_MIN_WIDTH:
+                depth = max(depth, level + 1)
+                boxes.append((name, node["samples"], x, level, width))
+                place(node["children"], x, level + 1)
+            x += width
+
+    place(root["children"], 0, 0)
+    height = (depth + 2) * FLAME_ROW
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{height}" '
+           f'font-family="monospace" font-size="11">',
+           f'<text x="4" y="12">{escape(title)}</text>']
+    for name, samples, x, level, width in boxes:
+        y = height - (level + 1) * FLAME_ROW
+        # Warm colours, stable per function
+        hue = zlib.crc32(name.encode("utf-8")) % 50
+        chars = int((width - 4) / 6.6)
+        label = name if len(name) <= chars else name[:chars - 2] + ".." if chars > 4 else ""
+        out.append(f'<g><title>{escape(name)}: {samples} samples ({samples * 100 / root["samples"]:.1f}%)</title>'
+                   f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FLAME_ROW - 1}" fill="hsl({hue},80%,60%)"/>'
+                   f'<text x="{x + 2:.1f}" y="{y + 11}">{escape(label)}</text></g>')
+    out.append("</svg>")
+    return "\n".join(out)
+
+class Profiler:
+    """WSGI middleware profiling the requests selected by token or sampling (see the module comment)."""
+
+    def __init__(self, directory, token=None, sample_rate=0, paths=DEFAULT_PATHS,
+                 interval_ms=DEFAULT_INTERVAL_MS, top=DEFAULT_TOP):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.paths = re.compile(paths)
+        self.interval = interval_ms / 1000
+        self.top = top
+        self._requests = itertools.count(1)
+        self._profiles = itertools.count(1)
+
+    def _reason(self, environ):
+        """Why this request is profiled ("token" or "sampled"), or None."""
+        if not self.paths.match(environ.get("PATH_INFO", "")):
+            return None
+        sent = environ.get(TOKEN_HEADER)
+        if self.token and sent and hmac.compare_digest(sent.encode("utf-8"), self.token.encode("utf-8")):
+            return "token"
+        if self.sample_rate and next(self._requests) % self.sample_rate == 0:
+            return "sampled"
+        return None
+
+    def wrap(self, wsgi_app):
+        def profiled_app(environ, start_response):
+            reason = self._reason(environ)
+            if reason is None:
+                return wsgi_app(environ, start_response)
+            return self._profile(wsgi_app, environ, start_response, reason)
+        return profiled_app
+
+    def _profile(self, wsgi_app, environ, start_response, reason):
+        path = environ.get("PATH_INFO", "")
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.getpid()}-{next(self._profiles)}"
+        status = []
+        info = {"reason": reason}
+
+        def profiled_start_response(response_status, headers, exc_info=None):
+            status.append(response_status)
+            return start_response(response_status, headers + [("X-Profile", name)], exc_info)
+
+        # The files are written by the sampler's thread once it stops, not by the request
+        sampler = _Sampler(threading.get_ident(), sys._getframe(), self.interval,
+                           lambda stacks: self._write(name, stacks, **info))
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            result = wsgi_app(environ, profiled_start_response)
+            try:
+                # Consumed here so a streamed body is profiled too
+                body = list(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        finally:
+            info["wall"] = time.perf_counter() - start
+            info["request_line"] = f"{environ.get('REQUEST_METHOD', '')} {path} {status[0] if status else '-'}"
+            sampler.stopped.set()
+        return body
+
+    def _write(self, name, stacks, request_line, wall, reason):
+        samples = sum(stacks.values())
+        summary = [f"{request_line}  wall {wall * 1000:.0f} ms  {samples} samples every "
+                   f"{self.interval * 1000:g} ms  ({reason})", "",
+                   f"Top {self.top} functions by own samples:",
+                   f"{'own':>7} {'own%':>6} {'total%':>7}  function"]
+        for function, own, total in top_functions(stacks, self.top):
+            summary.append(f"{own:>7} {own * 100 / max(1, samples):>5.1f}% {total * 100 / max(1, samples):>6.1f}%  {function}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, name)
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+            with open(base + ".svg", "w", encoding="utf-8") as f:
+                f.write(flamegraph_svg(stacks, f"{request_line}  {wall * 1000:.0f} ms  {samples} samples"))
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(summary) + "\n")
+            print(f"DEBUG: profiled {request_line} in {wall * 1000:.0f} ms ({reason}): {base}.svg")
+        except OSError as e:
+            print(f"DEBUG: writing profile {name} failed: {e}")
+
+def get_profiler():
+    """A Profiler from the environment, or None when profiling is off."""
+    token = os.environ.get("PROFILE_TOKEN") or None
+    sample_rate = int(os.environ.get("PROFILE_SAMPLE_RATE") or 0)
+    if not token and sample_rate <= 0:
+        return None
+    return Profiler(os.environ.get("PROFILE_DIR") or "profiles", token=token, sample_rate=max(0, sample_rate),
+                    paths=os.environ.get("PROFILE_PATHS") or DEFAULT_PATHS,
+                    interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS") or DEFAULT_INTERVAL_MS),
+                    top=int(os.environ.get("PROFILE_TOP") or DEFAULT_TOP))
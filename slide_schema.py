@@ -0,0 +1,243 @@
+# Field schemas per slide type, shared by the editor and the /download validation.
+#
+# A field spec is one of:
+#   "str"                     a string
+#   "num"                     a number (int or float)
+#   ["str"]                   a list of strings
+#   [["str"]]                 a list of rows of strings (table rows)
+#   [{"key": spec, ...}]      a list of objects
+#   {"key": spec, ...}        an object
+
+import math
+import re
+import unicodedata
+
+COMMON_FIELDS = {
+    "type": "str",
+    "title": "str",
+    "subhead": "str",
+    "notes": "str"
+}
+
+SLIDE_SCHEMAS = {
+    "title": {"date": "str"},
+    "section": {"sectionNo": "str"},
+    "content": {"points": ["str"]},
+    "process": {"steps": ["str"]},
+    "timeline": {"milestones": [{"date": "str", "label": "str"}]},
+    "cycle": {"items": [{"subLabel": "str", "label": "str"}]},
+    "cards": {"items": [{"title": "str", "desc": "str"}]},
+    "pyramid": {"levels": [{"title": "str", "description": "str"}]},
+    "compare": {"leftTitle": "str", "leftItems": ["str"], "rightTitle": "str", "rightItems": ["str"]},
+    "diagram": {"shapes": [{"label": "str", "shapeType": "str", "x": "num", "y": "num", "w": "num", "h": "num"}]},
+    "flowChart": {"flows": [{"steps": ["str"]}]},
+    "stepUp": {"steps": [{"label": "str"}]},
+    "imageText": {"imageDesc": "str", "text": "str", "image": "str"},
+    "table": {"headers": ["str"], "rows": [["str"]]},
+    "progress": {"items": [{"label": "str", "percent": "num"}]},
+    "quote": {"quote": "str", "author": "str"},
+    "kpi": {"kpis": [{"label": "str", "value": "str", "change": "str"}]},
+    "bulletCards": {"cards": [{"title": "str", "points": ["str"]}]},
+    "faq": {"items": [{"q": "str", "a": "str"}]},
+    "statsCompare": {"leftTitle": "str", "rightTitle": "str", "stats": [{"label": "str", "leftValue": "str", "rightValue": "str"}]},
+    "barCompare": {"items": [{"label": "str", "valueA": "num", "valueB": "num"}]},
+    "chart": {"chartType": "str", "categories": ["str"], "series": [{"name": "str", "values": ["num"]}]},
+}
+
+# Fields only the editor sets: "image" is a reference to an uploaded image
+# (image_pipeline.py). The model isn't asked for them, and what it returns
+# in them is dropped.
+EDITOR_FIELDS = {"image"}
+
+def schema_for(slide_type):
+    """Content fields for a slide type. Unknown types are treated as content slides."""
+    return SLIDE_SCHEMAS.get(slide_type, SLIDE_SCHEMAS["content"])
+
+def model_schema_for(slide_type):
+    """schema_for without EDITOR_FIELDS, for prompts."""
+    return {key: spec for key, spec in schema_for(slide_type).items() if key not in EDITOR_FIELDS}
+
+def _check(value, spec, path, errors):
+    if spec == "str":
+        # Numbers are accepted and normalized to their digits (e.g. sectionNo 3 -> "3")
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            errors.append(f"{path}: expected a string")
+    elif spec == "num":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append(f"{path}: expected a number")
+    elif isinstance(spec, list):
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected a list")
+            return
+        for i, item in enumerate(value):
+            _check(item, spec[0], f"{path}[{i}]", errors)
+    elif isinstance(spec, dict):
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected an object")
+            return
+        for key, sub_spec in spec.items():
+            if key in value:
+                _check(value[key], sub_spec, f"{path}.{key}", errors)
+
+def validate_slide(slide):
+    """Returns a list of error messages; an empty list means the slide is valid."""
+    if not isinstance(slide, dict):
+        return ["expected an object"]
+    errors = []
+    if not isinstance(slide.get("type"), str):
+        errors.append("type: expected a string")
+        return errors
+    for key, spec in COMMON_FIELDS.items():
+        if key in slide and slide[key] is not None:
+            _check(slide[key], spec, key, errors)
+    for key, spec in schema_for(slide["type"]).items():
+        if key in slide:
+            _check(slide[key], spec, key, errors)
+    return errors
+
+# --- Normalization ---
+# Model output and editor input are coerced into the schema once, so renderers
+# can index fields directly. Each type's spec is compiled into a tree of small
+# closures at import time; normalizing a slide is then a single walk.
+
+MAX_LIST_ITEMS = 50
+# Chart data is drawn as one native chart however long it is (see layout.chart)
+MAX_CHART_POINTS = 1000
+MAX_CHART_SERIES = 12
+# Lists that pagination.py splits across continuation slides keep every item
+MAX_PAGINATED_ITEMS = 1000
+
+# Lists with their own length limit, keyed like DEFAULTS
+LIST_LIMITS = {
+    ("content", "points"): MAX_PAGINATED_ITEMS,
+    ("process", "steps"): MAX_PAGINATED_ITEMS,
+    ("timeline", "milestones"): MAX_PAGINATED_ITEMS,
+    ("cycle", "items"): MAX_PAGINATED_ITEMS,
+    ("cards", "items"): MAX_PAGINATED_ITEMS,
+    ("pyramid", "levels"): MAX_PAGINATED_ITEMS,
+    ("compare", "leftItems"): MAX_PAGINATED_ITEMS,
+    ("compare", "rightItems"): MAX_PAGINATED_ITEMS,
+    ("flowChart", "flows"): MAX_PAGINATED_ITEMS,
+    ("flowChart", "flows", "steps"): MAX_PAGINATED_ITEMS,
+    ("stepUp", "steps"): MAX_PAGINATED_ITEMS,
+    ("table", "rows"): MAX_PAGINATED_ITEMS,
+    ("kpi", "kpis"): MAX_PAGINATED_ITEMS,
+    ("bulletCards", "cards"): MAX_PAGINATED_ITEMS,
+    ("faq", "items"): MAX_PAGINATED_ITEMS,
+    ("statsCompare", "stats"): MAX_PAGINATED_ITEMS,
+    ("progress", "items"): MAX_CHART_POINTS,
+    ("barCompare", "items"): MAX_CHART_POINTS,
+    ("chart", "categories"): MAX_CHART_POINTS,
+    ("chart", "series"): MAX_CHART_SERIES,
+    ("chart", "series", "values"): MAX_CHART_POINTS,
+}
+
+# Non-empty defaults, keyed by (type, field, [sub-field]). Everything else
+# defaults to "", 0 or [].
+DEFAULTS = {
+    ("chart", "chartType"): "column",
+    ("compare", "leftTitle"): "Option A",
+    ("compare", "rightTitle"): "Option B",
+    ("diagram", "shapes", "shapeType"): "rect",
+    ("diagram", "shapes", "x"): 100,
+    ("diagram", "shapes", "y"): 100,
+    ("diagram", "shapes", "w"): 100,
+    ("diagram", "shapes", "h"): 50,
+}
+
+# Numeric fields with a valid range
+RANGES = {
+    ("progress", "items", "percent"): (0, 100),
+}
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+def _to_str(value, default):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool) or value is None:
+        return default
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, list):
+        return ", ".join(_to_str(v, "") for v in value if not isinstance(v, (list, dict)))
+    return default
+
+def _to_num(value, default):
+    if type(value) is int:
+        return value
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return value if math.isfinite(value) else default
+    if isinstance(value, str):
+        # "85%", "1,200", "１２０" and "約30" all carry a usable number
+        m = _NUMBER.search(unicodedata.normalize("NFKC", value).replace(",", ""))
+        if m:
+            number = float(m.group(0))
+            return int(number) if number.is_integer() else number
+    return default
+
+def _compile(spec, path):
+    """Returns a function value -> normalized value for a field spec."""
+    default = DEFAULTS.get(path)
+    if spec == "str":
+        default = "" if default is None else default
+        return lambda value: _to_str(value, default)
+    if spec == "num":
+        default = 0 if default is None else default
+        if path not in RANGES:
+            return lambda value: _to_num(value, default)
+        lo, hi = RANGES[path]
+        return lambda value: min(hi, max(lo, _to_num(value, default)))
+    if isinstance(spec, list):
+        item = _compile(spec[0], path)
+        limit = LIST_LIMITS.get(path, MAX_LIST_ITEMS)
+        def normalize_list(value):
+            if value is None:
+                return []
+            if not isinstance(value, list):
+                value = [value]
+            return [item(v) for v in value[:limit] if v is not None]
+        return normalize_list
+    fields = [(key, _compile(sub_spec, path + (key,))) for key, sub_spec in spec.items()]
+    first_str = next((key for key, sub_spec in spec.items() if sub_spec == "str"), None)
+    def normalize_object(value):
+        if not isinstance(value, dict):
+            # A bare string where an object belongs becomes its first text field
+            value = {first_str: value} if first_str and isinstance(value, (str, int, float)) else {}
+        return {key: fn(value.get(key)) for key, fn in fields}
+    return normalize_object
+
+_NORMALIZERS = {
+    slide_type: _compile({**COMMON_FIELDS, **fields}, (slide_type,))
+    for slide_type, fields in SLIDE_SCHEMAS.items()
+}
+
+def _as_points(slide):
+    # Unknown types fall back to a content slide; keep whatever list they had
+    for key in ("points", "items", "steps"):
+        value = slide.get(key)
+        if isinstance(value, list) and value:
+            return [
+                f"{v.get('title', '')}: {v.get('desc', '')}" if isinstance(v, dict) else v
+                for v in value
+            ]
+    return []
+
+def normalize_slide(slide):
+    """
+    Returns a copy of slide with every schema field present and of the right
+    type: numbers parsed from strings, lists clamped to MAX_LIST_ITEMS or their
+    LIST_LIMITS entry (lists that pagination splits are kept whole, up to
+    MAX_PAGINATED_ITEMS), missing fields filled with defaults and unknown
+    fields dropped. Unknown slide types become content slides.
+    """
+    if not isinstance(slide, dict):
+        slide = {"points": [slide]} if isinstance(slide, str) else {}
+    slide_type = slide.get("type")
+    if slide_type not in _NORMALIZERS:
+        slide = dict(slide, type="content", points=_as_points(slide))
+    return _NORMALIZERS[slide["type"]](slide)
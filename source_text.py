@@ -0,0 +1,151 @@
+import difflib
+import re
+
+# Helpers for relating slides back to the source text they were generated from.
+
+def split_paragraphs(text):
+    """Splits text on blank lines. Returns [(start, end, paragraph)] with character offsets into text."""
+    paragraphs = []
+    for m in re.finditer(r"\S(?:.*?\S)?(?=\n\s*\n|\s*\Z)", text, re.S):
+        paragraphs.append((m.start(), m.end(), m.group(0)))
+    return paragraphs
+
+def slide_text(slide):
+    """All text in a slide, for matching it against the source."""
+    parts = []
+    def walk(value):
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for key, v in value.items():
+                if key != "type":
+                    walk(v)
+        elif isinstance(value, list):
+            for v in value:
+                walk(v)
+    walk(slide)
+    return " ".join(parts)
+
+def _bigrams(text):
+    # Character bigrams work for Japanese as well as space-separated languages
+    text = re.sub(r"\s+", "", text.lower())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def similarity(a_grams, b_grams):
+    if not a_grams or not b_grams:
+        return 0.0
+    return len(a_grams & b_grams) / (len(a_grams) * len(b_grams)) ** 0.5
+
+def best_excerpt(source, query, max_chars=1500):
+    """The paragraph of source most similar to query, widened with its neighbours up to max_chars."""
+    paragraphs = [p for _, _, p in split_paragraphs(source)]
+    if not paragraphs:
+        return ""
+    q = _bigrams(query)
+    scores = [similarity(q, _bigrams(p)) for p in paragraphs]
+    best = max(range(len(paragraphs)), key=lambda i: scores[i])
+
+    lo = hi = best
+    size = len(paragraphs[best])
+    while True:
+        grown = False
+        for j in (lo - 1, hi + 1):
+            if 0 <= j < len(paragraphs) and size + len(paragraphs[j]) <= max_chars:
+                size += len(paragraphs[j])
+                lo, hi = min(lo, j), max(hi, j)
+                grown = True
+        if not grown:
+            break
+    return "\n\n".join(paragraphs[lo:hi + 1])[:max_chars]
+
+# Incremental regeneration: when the source is edited and resubmitted, only
+# the slides made from changed paragraphs go back to the model. A deck keeps
+# a source map, one list of paragraph indices per slide.
+
+def paragraph_key(paragraph):
+    # Reflowed whitespace or a changed case alone doesn't count as an edit
+    return re.sub(r"\s+", "", paragraph).lower()
+
+def map_sources(slides, paragraphs, skip_types=()):
+    """
+    Source map for slides generated in one call: each paragraph goes to the
+    most similar slide, and a slide left without one gets its best paragraph.
+    Slides of skip_types (title, section) cover no paragraphs.
+    """
+    mapped = [i for i, s in enumerate(slides) if s.get("type") not in skip_types]
+    source_map = [[] for _ in slides]
+    if not mapped or not paragraphs:
+        return source_map
+    slide_grams = {i: _bigrams(slide_text(slides[i])) for i in mapped}
+    scores = []
+    for p, paragraph in enumerate(paragraphs):
+        grams = _bigrams(paragraph)
+        row = {i: similarity(grams, slide_grams[i]) for i in mapped}
+        scores.append(row)
+        best = max(mapped, key=row.get)
+        if row[best] > 0:
+            source_map[best].append(p)
+    for i in mapped:
+        if not source_map[i]:
+            source_map[i].append(max(range(len(paragraphs)), key=lambda p: scores[p][i]))
+    return source_map
+
+def plan_update(old_paragraphs, new_paragraphs, source_map):
+    """
+    Works out which slides an edit to the source affects. Returns (plan, changed)
+    where changed is the number of new paragraphs that differ, and plan lists
+    the new deck in order:
+      ("keep", i, paragraphs)        old slide i as is
+      ("regenerate", i, paragraphs)  old slide i rebuilt from these new paragraphs
+      ("insert", None, paragraphs)   new slides for text no slide covered
+    Paragraphs are indices into new_paragraphs. Old slides whose paragraphs
+    were all deleted are left out.
+    """
+    matcher = difflib.SequenceMatcher(None, [paragraph_key(p) for p in old_paragraphs],
+                                      [paragraph_key(p) for p in new_paragraphs], autojunk=False)
+    old_to_new = {}
+    regions = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            old_to_new.update(zip(range(i1, i2), range(j1, j2)))
+        else:
+            regions.append((i1, i2, j1, j2))
+
+    covered_by = {}
+    for s, refs in enumerate(source_map):
+        for p in refs:
+            covered_by.setdefault(p, []).append(s)
+    assigned = [[] for _ in source_map]
+    inserts = {} # slide to insert after (-1: before the first covered slide) -> [paragraph groups]
+    for i1, i2, j1, j2 in regions:
+        affected = sorted({s for p in range(i1, i2) for s in covered_by.get(p, [])})
+        if not affected:
+            if j1 < j2:
+                before = [s for p in range(i1) for s in covered_by.get(p, [])]
+                inserts.setdefault(max(before, default=-1), []).append(list(range(j1, j2)))
+            continue
+        # Rewritten paragraphs go to the slide whose old text they resemble most
+        old_grams = {s: _bigrams(" ".join(old_paragraphs[p] for p in source_map[s] if i1 <= p < i2)) for s in affected}
+        for j in range(j1, j2):
+            grams = _bigrams(new_paragraphs[j])
+            assigned[max(affected, key=lambda s: similarity(grams, old_grams[s]))].append(j)
+
+    plan = []
+    def add_inserts(anchor):
+        for group in inserts.get(anchor, []):
+            plan.append(("insert", None, group))
+
+    first_covered = next((s for s, refs in enumerate(source_map) if refs), len(source_map))
+    for s, refs in enumerate(source_map):
+        if s == first_covered:
+            add_inserts(-1)
+        kept = [old_to_new[p] for p in refs if p in old_to_new]
+        if len(kept) == len(refs) and not assigned[s]:
+            plan.append(("keep", s, kept))
+        elif kept or assigned[s]:
+            plan.append(("regenerate", s, sorted(kept + assigned[s])))
+        add_inserts(s)
+    if first_covered == len(source_map):
+        add_inserts(-1)
+    changed = sum(j2 - j1 for _, _, j1, j2 in regions)
+    return plan, changed
@@ -0,0 +1,229 @@
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+# Key-value state shared by every process that serves the app. With the
+# default in-memory backend each worker has its own; with a Redis-protocol
+# server (Redis, Valkey, KeyDB, ...) all workers on all nodes see the same
+# decks and rendered downloads, so any node can serve any step of
+# /preview -> edit -> /download behind a load balancer.
+#
+# Values are bytes; every key can have a time to live. Only GET, SET (PX),
+# DEL, PEXPIRE and PING are used, so any RESP2 server will do.
+#
+#   STATE_BACKEND       memory (default) | redis://[:password@]host:port/db
+#   STATE_TIMEOUT       socket timeout in seconds for the redis backend (default 2)
+#   STATE_POOL_SIZE     idle connections kept per process (default 8)
+#   STATE_MEMORY_MAX    entries kept by the memory backend (default 4096)
+
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MEMORY_MAX = 4096
+
+class StateError(Exception):
+    """The shared state server failed or could not be reached."""
+
+class MemoryState:
+    """Per-process state: an LRU dict with expiry."""
+    shared = False
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_MAX):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def expire(self, key, ttl):
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                self._entries[key] = (time.monotonic() + ttl, entry[1])
+
+    def ping(self):
+        return True
+
+def _encode_command(args):
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif isinstance(arg, (int, float)):
+            arg = str(arg).encode("ascii")
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+class _Connection:
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _line(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the state server")
+        return line[:-2]
+
+    def read_reply(self):
+        line = self._line()
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise StateError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            if len(data) != n + 2:
+                raise ConnectionError("connection closed by the state server")
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self.read_reply() for _ in range(n)]
+        raise ValueError(f"unexpected reply from the state server: {line[:40]!r}")
+
+    def call(self, *args):
+        self.sock.sendall(_encode_command(args))
+        return self.read_reply()
+
+class RespState:
+    """State on a Redis-protocol (RESP2) server, with a small pool of keep-alive connections."""
+    shared = True
+
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, prefix="slides:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.prefix = prefix
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = _Connection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.call("AUTH", self.password)
+            if self.db:
+                conn.call("SELECT", self.db)
+        except ValueError as e:
+            conn.close()
+            raise StateError(f"state server {self.host}:{self.port}: malformed reply: {e}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _call_on(self, conn, args):
+        """Runs one command on conn. An error reply keeps conn; a broken or malformed one closes it."""
+        try:
+            reply = conn.call(*args)
+        except StateError:
+            self._release(conn)
+            raise
+        except OSError:
+            conn.close()
+            raise
+        except ValueError as e:
+            # The reply can't be parsed, so the stream is out of step: the connection is unusable
+            conn.close()
+            raise StateError(f"state server {self.host}:{self.port}: malformed reply: {e}")
+        self._release(conn)
+        return reply
+
+    def _call(self, *args):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            try:
+                return self._call_on(conn, args)
+            except OSError:
+                pass # The server closed an idle connection; retry once on a new one
+        try:
+            conn = self._connect()
+        except OSError as e:
+            raise StateError(f"state server {self.host}:{self.port}: {e}")
+        try:
+            return self._call_on(conn, args)
+        except OSError as e:
+            raise StateError(f"state server {self.host}:{self.port}: {e}")
+
+    def get(self, key):
+        return self._call("GET", self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self._call("SET", self.prefix + key, value, "PX", max(1, int(ttl * 1000)))
+        else:
+            self._call("SET", self.prefix + key, value)
+
+    def delete(self, key):
+        self._call("DEL", self.prefix + key)
+
+    def expire(self, key, ttl):
+        self._call("PEXPIRE", self.prefix + key, max(1, int(ttl * 1000)))
+
+    def ping(self):
+        return self._call("PING") == "PONG"
+
+def get_state_backend():
+    """Builds the backend selected by STATE_BACKEND (see the top of this module)."""
+    spec = os.environ.get("STATE_BACKEND", "memory")
+    if spec == "memory":
+        return MemoryState(int(os.environ.get("STATE_MEMORY_MAX", DEFAULT_MEMORY_MAX)))
+    if spec.startswith(("redis://", "resp://")):
+        return RespState(spec,
+                         timeout=float(os.environ.get("STATE_TIMEOUT", DEFAULT_TIMEOUT)),
+                         pool_size=int(os.environ.get("STATE_POOL_SIZE", DEFAULT_POOL_SIZE)))
+    raise ValueError(f"Unknown STATE_BACKEND: {spec}")
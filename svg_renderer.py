@@ -0,0 +1,305 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
+
+from config import PPTConfig
+from layout import (DEFAULT_FONT_SIZE, DEFAULT_SHAPE_FILL, DEFAULT_SHAPE_LINE, DEFAULT_SHAPE_TEXT, DEFAULT_TEXT,
+                    layout_pages, theme_for)
+from slide_schema import normalize_slide
+from text_metrics import INSET_X, INSET_Y, LINE_SPACING, wrap_text
+
+# Slide thumbnails as SVG, drawn from the same layout as the VBA macro
+# (layout.py), so the editor can show each slide without a PowerPoint round
+# trip. This is a preview, not a PowerPoint emulator: text is wrapped with a
+# character-width estimate, and shapes without an explicit style get
+# PowerPoint's default theme colours.
+
+TABLE_BAND = ((207, 213, 234), (233, 235, 245))
+MIN_AUTOFIT_SCALE = 0.4
+# Office theme accents, which a pie's slices and uncoloured series get
+CHART_PALETTE = ((68, 114, 196), (237, 125, 49), (165, 165, 165), (255, 192, 0), (91, 155, 213), (112, 173, 71))
+CHART_TEXT = (89, 89, 89)
+CHART_GRID = (217, 217, 217)
+CHART_MAX_LABELS = 30 # category labels drawn; with more, every n-th
+
+def _n(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+def _color(color):
+    return "#%02x%02x%02x" % tuple(color)
+
+def _text_block(out, box, prim, anchor_middle, default_color):
+    text = prim.get("text")
+    if not text:
+        return
+    left, top, width, height = box
+    font = prim.get("font", {})
+    size = font.get("size", DEFAULT_FONT_SIZE)
+    inner_w = max(width - 2 * INSET_X, 1)
+    inner_h = max(height - 2 * INSET_Y, 1)
+    lines = wrap_text(text, inner_w, size)
+    if prim.get("autofit"):
+        # msoAutoSizeTextToFitShape: shrink until the text fits
+        while len(lines) * size * LINE_SPACING > inner_h and size > font.get("size", DEFAULT_FONT_SIZE) * MIN_AUTOFIT_SCALE:
+            size *= 0.9
+            lines = wrap_text(text, inner_w, size)
+
+    align = prim.get("align", 2 if anchor_middle else 1)
+    x, text_anchor = {1: (INSET_X, "start"), 2: (width / 2, "middle"), 3: (width - INSET_X, "end")}.get(align, (INSET_X, "start"))
+    block_h = len(lines) * size * LINE_SPACING
+    y = (height - block_h) / 2 if anchor_middle else INSET_Y
+    style = [f'font-size="{_n(size)}"', f'fill="{_color(font.get("color", default_color))}"']
+    if font.get("bold"):
+        style.append('font-weight="bold"')
+    if font.get("italic"):
+        style.append('font-style="italic"')
+
+    # A nested viewport clips text that overflows its box, as PowerPoint's thumbnails do
+    out.append(f'<svg x="{_n(left)}" y="{_n(top)}" width="{_n(width)}" height="{_n(height)}">')
+    out.append(f'<text text-anchor="{text_anchor}" {" ".join(style)}>')
+    for i, text_line in enumerate(lines):
+        baseline = y + (i + 0.8) * size * LINE_SPACING
+        out.append(f'<tspan x="{_n(x)}" y="{_n(baseline)}">{escape(text_line)}</tspan>')
+    out.append('</text></svg>')
+
+def _outline(prim, default):
+    line = prim.get("line", {})
+    if line.get("visible") is False:
+        return 'stroke="none"'
+    color = line.get("color", default)
+    if color is None:
+        return 'stroke="none"'
+    return f'stroke="{_color(color)}" stroke-width="{_n(line.get("weight", 0.75))}"'
+
+def _geometry(mso_shape, left, top, width, height, paint):
+    if mso_shape == 9: # oval
+        return f'<ellipse cx="{_n(left + width / 2)}" cy="{_n(top + height / 2)}" rx="{_n(width / 2)}" ry="{_n(height / 2)}" {paint}/>'
+    if mso_shape == 33: # right arrow: shaft half the height, head as long as half the height
+        head = min(height / 2, width)
+        points = [(0, height / 4), (width - head, height / 4), (width - head, 0), (width, height / 2),
+                  (width - head, height), (width - head, height * 3 / 4), (0, height * 3 / 4)]
+    elif mso_shape == 66: # down arrow
+        head = min(width / 2, height)
+        points = [(width / 4, 0), (width * 3 / 4, 0), (width * 3 / 4, height - head), (width, height - head),
+                  (width / 2, height), (0, height - head), (width / 4, height - head)]
+    else:
+        radius = min(width, height) / 6 if mso_shape == 5 else 0 # rounded rectangle
+        return (f'<rect x="{_n(left)}" y="{_n(top)}" width="{_n(width)}" height="{_n(height)}" '
+                f'rx="{_n(radius)}" {paint}/>')
+    path = " ".join(f"{_n(left + x)},{_n(top + y)}" for x, y in points)
+    return f'<polygon points="{path}" {paint}/>'
+
+def _nice_max(value):
+    """An axis maximum above value, roughly as PowerPoint picks it: 1, 2, 2.5 or 5 times a power of ten."""
+    if value <= 0:
+        return 1
+    power = 10 ** math.floor(math.log10(value))
+    return next(step * power for step in (1, 2, 2.5, 5, 10) if value <= step * power)
+
+def _chart_label(out, x, y, text, size, anchor="middle"):
+    out.append(f'<text x="{_n(x)}" y="{_n(y)}" font-size="{_n(size)}" fill="{_color(CHART_TEXT)}" '
+               f'text-anchor="{anchor}">{escape(str(text))}</text>')
+
+def _render_chart(out, prim):
+    left, top, width, height = prim["box"]
+    kind, categories, series = prim["chart"], prim["categories"], prim["series"]
+    size = prim.get("font", {}).get("size", DEFAULT_FONT_SIZE) * 0.8
+    colors = [s.get("color", CHART_PALETTE[k % len(CHART_PALETTE)]) for k, s in enumerate(series)]
+    if prim.get("legend"):
+        names = categories if kind == "pie" else [s["name"] for s in series]
+        step = width / max(1, len(names))
+        for k, name in enumerate(names[:CHART_MAX_LABELS]):
+            x = left + step * k + step / 2
+            color = CHART_PALETTE[k % len(CHART_PALETTE)] if kind == "pie" else colors[k]
+            out.append(f'<rect x="{_n(x - size * 1.2)}" y="{_n(top + height - size)}" width="{_n(size * 0.8)}" '
+                       f'height="{_n(size * 0.8)}" fill="{_color(color)}"/>')
+            _chart_label(out, x, top + height - size * 0.2, name, size, "start")
+        height -= size * 2
+
+    if kind == "pie":
+        values = [max(0, v or 0) for v in series[0]["values"]]
+        total = sum(values)
+        r = min(width, height) / 2 * 0.9
+        cx, cy = left + width / 2, top + height / 2
+        angle = -math.pi / 2
+        for k, value in enumerate(values):
+            if not total or not value:
+                continue
+            end = angle + 2 * math.pi * value / total
+            color = _color(CHART_PALETTE[k % len(CHART_PALETTE)])
+            if value == total:
+                out.append(f'<circle cx="{_n(cx)}" cy="{_n(cy)}" r="{_n(r)}" fill="{color}"/>')
+            else:
+                out.append(f'<path d="M{_n(cx)},{_n(cy)} L{_n(cx + r * math.cos(angle))},{_n(cy + r * math.sin(angle))} '
+                           f'A{_n(r)},{_n(r)} 0 {1 if end - angle > math.pi else 0} 1 '
+                           f'{_n(cx + r * math.cos(end))},{_n(cy + r * math.sin(end))} Z" fill="{color}" stroke="#ffffff"/>')
+            angle = end
+        return
+
+    values = [v for s in series for v in s["values"] if v is not None] or [0]
+    hi = prim.get("axis_max") or _nice_max(max(values))
+    lo = 0 if min(values) >= 0 or "axis_max" in prim else -_nice_max(-min(values))
+    n = max(1, len(categories))
+    every = math.ceil(n / CHART_MAX_LABELS)
+    horizontal = kind == "bar"
+    if horizontal:
+        gutter = min(width / 4, max((len(str(c)) for c in categories), default=1) * size * 0.6 + size)
+        px, py, pw, ph = left + gutter, top, width - gutter, height - size * 1.6
+    else:
+        px, py, pw, ph = left + size * 3, top, width - size * 3, height - size * 1.6
+    value_len = pw if horizontal else ph
+
+    def at(value):
+        """Distance of value from the start of the value axis."""
+        return (min(hi, max(lo, value)) - lo) / (hi - lo) * value_len
+
+    # Gridlines with their values, then the data
+    for k in range(5):
+        value = lo + (hi - lo) * k / 4
+        if horizontal:
+            x = px + at(value)
+            out.append(f'<line x1="{_n(x)}" y1="{_n(py)}" x2="{_n(x)}" y2="{_n(py + ph)}" stroke="{_color(CHART_GRID)}"/>')
+            _chart_label(out, x, py + ph + size * 1.2, _n(value), size)
+        else:
+            y = py + ph - at(value)
+            out.append(f'<line x1="{_n(px)}" y1="{_n(y)}" x2="{_n(px + pw)}" y2="{_n(y)}" stroke="{_color(CHART_GRID)}"/>')
+            _chart_label(out, px - size * 0.4, y + size * 0.35, _n(value), size, "end")
+    band = (ph if horizontal else pw) / n
+    bar = band * 0.7 / len(series)
+    zero = at(0)
+    for k, s in enumerate(series):
+        color = _color(colors[k])
+        if kind == "line":
+            points = " ".join(f"{_n(px + band * (i + 0.5))},{_n(py + ph - at(v))}"
+                              for i, v in enumerate(s["values"]) if v is not None)
+            out.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2"/>')
+            continue
+        for i, v in enumerate(s["values"]):
+            if v is None:
+                continue
+            start = band * i + band * 0.15 + bar * k
+            a, b = sorted((zero, at(v)))
+            if horizontal:
+                out.append(f'<rect x="{_n(px + a)}" y="{_n(py + start)}" width="{_n(b - a)}" height="{_n(bar)}" fill="{color}"/>')
+            else:
+                out.append(f'<rect x="{_n(px + start)}" y="{_n(py + ph - b)}" width="{_n(bar)}" height="{_n(b - a)}" fill="{color}"/>')
+            if prim.get("data_labels") and n <= CHART_MAX_LABELS:
+                if horizontal:
+                    _chart_label(out, px + b + size * 0.3, py + start + bar / 2 + size * 0.35, _n(v), size, "start")
+                else:
+                    _chart_label(out, px + start + bar / 2, py + ph - b - size * 0.3, _n(v), size)
+    for i, category in enumerate(categories):
+        if i % every:
+            continue
+        if horizontal:
+            _chart_label(out, px - size * 0.4, py + band * (i + 0.5) + size * 0.35, category, size, "end")
+        else:
+            _chart_label(out, px + band * (i + 0.5), py + ph + size * 1.2, category, size)
+
+def _render_shape(out, prim):
+    kind = prim["kind"]
+    if kind == "line":
+        x1, y1, x2, y2 = prim["points"]
+        out.append(f'<line x1="{_n(x1)}" y1="{_n(y1)}" x2="{_n(x2)}" y2="{_n(y2)}" {_outline(prim, DEFAULT_SHAPE_FILL)}/>')
+    elif kind == "textbox":
+        _text_block(out, prim["box"], prim, False, DEFAULT_TEXT)
+    elif kind == "shape":
+        left, top, width, height = prim["box"]
+        if width <= 0 or height <= 0:
+            return
+        paint = f'fill="{_color(prim.get("fill", DEFAULT_SHAPE_FILL))}" {_outline(prim, DEFAULT_SHAPE_LINE)}'
+        out.append(_geometry(prim["shape"], left, top, width, height, paint))
+        _text_block(out, prim["box"], prim, True, DEFAULT_SHAPE_TEXT)
+    elif kind == "picture":
+        # Thumbnails are loaded as <img>, which can't fetch the image; its frame shows where it goes
+        left, top, width, height = prim["box"]
+        out.append(f'<rect x="{_n(left)}" y="{_n(top)}" width="{_n(width)}" height="{_n(height)}" '
+                   f'fill="#eef1f5" stroke="#9aa5b4" stroke-dasharray="6 4"/>')
+        s = min(width, height) / 4
+        cx, cy = left + width / 2, top + height / 2
+        out.append(f'<polygon points="{_n(cx - s)},{_n(cy + s / 2)} {_n(cx - s / 3)},{_n(cy - s / 2)} '
+                   f'{_n(cx + s / 6)},{_n(cy + s / 6)} {_n(cx + s / 2)},{_n(cy - s / 6)} {_n(cx + s)},{_n(cy + s / 2)}" '
+                   f'fill="#9aa5b4"/>')
+        out.append(f'<circle cx="{_n(cx + s / 2)}" cy="{_n(cy - s / 2)}" r="{_n(s / 6)}" fill="#9aa5b4"/>')
+    elif kind == "chart":
+        _render_chart(out, prim)
+    elif kind == "table":
+        left, top, width, height = prim["box"]
+        cell_w = width / prim["cols"]
+        cell_h = height / prim["rows"]
+        for r in range(1, prim["rows"] + 1):
+            for c in range(1, prim["cols"] + 1):
+                cell = prim["cells"].get((r, c), {})
+                default_fill = DEFAULT_SHAPE_FILL if r == 1 else TABLE_BAND[r % 2]
+                box = (left + (c - 1) * cell_w, top + (r - 1) * cell_h, cell_w, cell_h)
+                out.append(f'<rect x="{_n(box[0])}" y="{_n(box[1])}" width="{_n(cell_w)}" height="{_n(cell_h)}" '
+                           f'fill="{_color(cell.get("fill", default_fill))}" stroke="#ffffff"/>')
+                _text_block(out, box, cell, False, DEFAULT_SHAPE_TEXT if r == 1 else DEFAULT_TEXT)
+
+PAGE_GAP = 24 # points between continuation pages in one thumbnail
+
+def render_svg(pages, font_family, width=None):
+    """
+    Slides from layout.layout_pages as one SVG document, continuation pages
+    stacked top to bottom; width is the rendered size in px.
+    """
+    vw, ph = PPTConfig.SLIDE_WIDTH_PT, PPTConfig.SLIDE_HEIGHT_PT
+    vh = len(pages) * ph + (len(pages) - 1) * PAGE_GAP
+    size = f' width="{width}" height="{round(width * vh / vw)}"' if width else ""
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {vw} {_n(vh)}"{size} '
+           f'font-family={quoteattr(font_family + ", sans-serif")}>']
+    for k, page in enumerate(pages):
+        out.append(f'<g transform="translate(0 {_n(k * (ph + PAGE_GAP))})">')
+        out.append(f'<rect width="{vw}" height="{ph}" fill="{_color(page["background"])}"/>')
+        for prim in page["shapes"]:
+            _render_shape(out, prim)
+        out.append("</g>")
+    out.append("</svg>")
+    return "\n".join(out)
+
+def thumbnail_key(slide, settings, index=0):
+    """Identifies a rendered thumbnail: the slide content, the deck settings and the position."""
+    payload = json.dumps([slide, settings, index], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def render_thumbnail(slide, settings, index=0, width=None):
+    theme = theme_for(settings)
+    return render_svg(layout_pages(normalize_slide(slide), index, theme), theme["font"], width)
+
+class ThumbnailCache:
+    """Rendered SVGs by thumbnail_key, least recently used dropped beyond max_entries."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            svg = self._entries.get(key)
+            if svg is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return svg
+
+    def put(self, key, svg):
+        with self._lock:
+            self._entries[key] = svg
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def render(self, slide, settings, index=0):
+        """Returns (key, svg), rendering only on a miss."""
+        key = thumbnail_key(slide, settings, index)
+        svg = self.get(key)
+        if svg is None:
+            svg = render_thumbnail(slide, settings, index)
+            self.put(key, svg)
+        return key, svg
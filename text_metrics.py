@@ -0,0 +1,67 @@
+import unicodedata
+from functools import reduce
+from operator import add
+
+# Rough text measurement shared by the thumbnail renderer and pagination.
+# There are no font metrics server-side, so widths are estimated per
+# character: full-width (CJK) characters are 1em, others about half that.
+
+LINE_SPACING = 1.2
+# Text frame insets in points (PowerPoint's defaults)
+INSET_X = 7.2
+INSET_Y = 3.6
+
+def char_width(ch):
+    """Approximate advance of one character, in ems."""
+    if ch == " ":
+        return 0.3
+    if unicodedata.east_asian_width(ch) in ("W", "F"):
+        return 1.0
+    return 0.55
+
+class _Widths(dict):
+    """
+    Cached char_width as a dict, so wrap_text can map() over a paragraph
+    without a call per character. Bounded like an lru_cache, without eviction.
+    """
+    def __missing__(self, ch):
+        width = char_width(ch)
+        if len(self) < 4096:
+            self[ch] = width
+        return width
+
+_widths = _Widths()
+
+def wrap_text(text, width, size):
+    """Splits text into the lines PowerPoint would roughly show in a box of width points."""
+    lines = []
+    limit = max(width / size, 1.0) # in ems
+    for paragraph in text.replace("\r\n", "\n").split("\n"):
+        widths = list(map(_widths.__getitem__, paragraph))
+        # A paragraph that fits needs no break search. Added up in order, as
+        # used += w does below; sum() compensates rounding and could disagree at the limit
+        if reduce(add, widths, 0.0) <= limit:
+            lines.append(paragraph)
+            continue
+        # The current line is paragraph[start:i]; last_space is an index into paragraph
+        start, used, last_space = 0, 0.0, -1
+        for i, w in enumerate(widths):
+            ch = paragraph[i]
+            if used + w > limit and i > start:
+                if ch != " " and last_space > start:
+                    # Break at the last space, carrying the partial word over
+                    lines.append(paragraph[start:last_space])
+                    start = last_space + 1
+                else:
+                    lines.append(paragraph[start:i])
+                    start = i
+                used = sum(widths[start:i])
+                last_space = -1
+                if ch == " " and start == i:
+                    start = i + 1
+                    continue
+            if ch == " ":
+                last_space = i
+            used += w
+        lines.append(paragraph[start:])
+    return lines
@@ -0,0 +1,173 @@
+import os
+import re
+from collections import Counter
+
+# Input cleanup before the text is sent to the model. Pasted documents carry
+# runs of whitespace, repeated page headers/footers and duplicated paragraphs;
+# all of it costs input tokens (and time to first token) without changing the
+# deck. A local estimator keeps the input within INPUT_TOKEN_BUDGET.
+#
+# Only page furniture is removed from the text itself: running headers and
+# footers where the pages are known (ingest.py separates PDF pages with
+# PAGE_BREAK), and lines that are only a page number. Short lines that merely
+# repeat, such as "Pros" / "Cons" labels under each section, are content;
+# DROP_REPEATED_LINES=1 drops them anyway, for pasted text full of headers.
+
+DEFAULT_TOKEN_BUDGET = 30000
+PAGE_BREAK = "\f"
+
+# Kana, CJK ideographs, Hangul and full-width forms: roughly one token each
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]")
+_SPACES = re.compile(r"[ \t 　​﻿]+")
+
+def estimate_tokens(text):
+    """Rough token count: one per CJK character, one per four other characters."""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def normalize_whitespace(text):
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [_SPACES.sub(" ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def _block_key(block):
+    return re.sub(r"\s+", "", block).lower()
+
+def _furniture_key(line):
+    # Running footers often differ only in the page number at their end ("Confidential 3")
+    return re.sub(r"(^\d+\s+)|(\s+\d+$)", "#", line)
+
+def drop_page_furniture(pages, min_repeats=3, max_chars=80):
+    """
+    Drops running headers and footers: short lines that are the first or last
+    line of at least half the pages (and min_repeats), compared up to a leading
+    or trailing page number. Returns the pages and the number of lines dropped.
+    """
+    edges = []
+    for page in pages:
+        lines = [line for line in normalize_whitespace(page).split("\n") if line]
+        edges.append({_furniture_key(line) for line in lines[:1] + lines[-1:] if len(line) <= max_chars})
+    counts = Counter(key for keys in edges for key in keys)
+    needed = max(min_repeats, len(pages) // 2)
+    furniture = {key for key, n in counts.items() if n >= needed}
+    if not furniture:
+        return pages, 0
+    dropped = 0
+    kept = []
+    for page in pages:
+        lines = normalize_whitespace(page).split("\n")
+        content = [i for i, line in enumerate(lines) if line]
+        edge = set(content[:1] + content[-1:])
+        drop = {i for i in edge if _furniture_key(lines[i]) in furniture}
+        dropped += len(drop)
+        kept.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return kept, dropped
+
+_PAGE_NUMBER = re.compile(
+    r"(?:page|p\.)\s*\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?"  # Page 3, p. 3, Page 3 of 10
+    r"|[-–—]\s*\d{1,4}\s*[-–—]"                           # - 3 -
+    r"|\d{1,4}\s*(?:/|of)\s*\d{1,4}"                       # 3 / 10
+    r"|\d{1,4}\s*(?:ページ|頁)"                             # 3ページ
+    r"|\d{1,4}",
+    re.IGNORECASE)
+
+def drop_page_numbers(blocks, min_repeats=3):
+    """
+    Drops lines that are only a page number, once there are min_repeats of
+    them. A bare number counts only as a paragraph of its own.
+    """
+    def is_page_number(line, alone):
+        return bool(_PAGE_NUMBER.fullmatch(line)) and (alone or not line.isdigit())
+    marked = [[is_page_number(line, "\n" not in block) for line in block.split("\n")] for block in blocks]
+    dropped = sum(sum(flags) for flags in marked)
+    if dropped < min_repeats:
+        return blocks, 0
+    kept = []
+    for block, flags in zip(blocks, marked):
+        lines = [line for line, flag in zip(block.split("\n"), flags) if not flag]
+        if lines:
+            kept.append("\n".join(lines))
+    return kept, dropped
+
+def drop_repeated_lines(blocks, min_repeats=3, max_chars=80):
+    """Drops short lines repeated across distinct blocks. Opt-in: it also removes repeated labels."""
+    counts = Counter(line for block in blocks for line in set(block.split("\n")) if len(line) <= max_chars)
+    repeated = {line for line, n in counts.items() if n >= min_repeats}
+    dropped = 0
+    kept = []
+    for block in blocks:
+        lines = [line for line in block.split("\n") if line not in repeated]
+        dropped += block.count("\n") + 1 - len(lines)
+        if lines:
+            kept.append("\n".join(lines))
+    return kept, dropped
+
+def drop_duplicate_blocks(blocks):
+    seen = set()
+    kept = []
+    for block in blocks:
+        key = _block_key(block)
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append(block)
+    return kept, len(blocks) - len(kept)
+
+def enforce_budget(blocks, max_tokens):
+    """Keeps blocks in order until the budget is spent; the last one is cut to fit."""
+    kept = []
+    used = 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if used + tokens <= max_tokens:
+            kept.append(block)
+            used += tokens
+            continue
+        remaining = max_tokens - used
+        if remaining > 0:
+            # Shrink proportionally, then trim until the estimate fits
+            cut = block[:max(1, len(block) * remaining // tokens)]
+            while cut and estimate_tokens(cut) > remaining:
+                cut = cut[:-max(1, len(cut) // 20)]
+            if cut:
+                kept.append(cut)
+        return kept, True
+    return kept, False
+
+def preprocess(text, max_tokens=None):
+    """
+    Cleans text for the model. Returns (text, stats) where stats has the
+    estimated tokens before and after, and what was dropped.
+    max_tokens defaults to INPUT_TOKEN_BUDGET (0 disables the budget).
+    """
+    if max_tokens is None:
+        max_tokens = int(os.environ.get("INPUT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    tokens_in = estimate_tokens(text)
+
+    pages = text.split(PAGE_BREAK)
+    furniture = 0
+    if len(pages) > 1:
+        pages, furniture = drop_page_furniture(pages)
+    blocks = [b for b in normalize_whitespace("\n\n".join(pages)).split("\n\n") if b]
+    blocks, duplicates = drop_duplicate_blocks(blocks)
+    blocks, page_numbers = drop_page_numbers(blocks)
+    repeated = 0
+    if os.environ.get("DROP_REPEATED_LINES") == "1":
+        blocks, repeated = drop_repeated_lines(blocks)
+    truncated = False
+    if max_tokens:
+        blocks, truncated = enforce_budget(blocks, max_tokens)
+    cleaned = "\n\n".join(blocks)
+
+    stats = {
+        "input_tokens": tokens_in,
+        "sent_tokens": estimate_tokens(cleaned),
+        "page_furniture_lines": furniture + page_numbers,
+        "repeated_lines": repeated,
+        "duplicate_blocks": duplicates,
+        "truncated": truncated
+    }
+    return cleaned, stats